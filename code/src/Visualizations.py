@@ -1,70 +1,173 @@
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg")
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-import os
 
-# Load the synthetic login metadata
-df = pd.read_excel("code/src/synthetic_login_metadata.xlsx")
+import instrumentation
+from baseline_store import load_or_build
+from instrumentation import span
+from log_store import drop_unused_categories, load_table, table_version
+from user_index import UserIndex
+
+OUTPUT_DIR = "fraud_profiles"
+MANIFEST_FILE = "manifest.json"
+PLOT_COLUMNS = ['login_hour', 'device_type', 'login_method', 'channel']
 
-# Convert timestamp to datetime
-df['timestamp'] = pd.to_datetime(df['timestamp'])
-df['login_hour'] = df['timestamp'].dt.hour
+# One figure per worker process, cleared and redrawn for every user
+_figure = None
 
-# Create output directory
-os.makedirs("fraud_profiles", exist_ok=True)
 
-# Group by user_id
-users = df['user_id'].unique()
+def _get_axes():
+    global _figure
+    if _figure is None:
+        fig, axes = plt.subplots(2, 2, figsize=(14, 8))
+        _figure = (fig, axes.ravel())
+    fig, axes = _figure
+    for ax in axes:
+        ax.clear()
+    return fig, axes
 
-for user in users:
-    user_df = df[df['user_id'] == user]
 
-    # Profile Summary (Text)
-    profile = {
-        "user_id": user,
-        "total_logins": len(user_df),
-        "device_type": user_df['device_type'].mode()[0],
-        "os_browser": user_df['os_browser'].mode()[0],
-        "screen_resolution": user_df['screen_resolution'].mode()[0],
-        "city": user_df['city'].mode()[0],
-        "frequent_login_hours": user_df['login_hour'].value_counts().head(3).index.tolist(),
-        "most_used_login_method": user_df['login_method'].mode()[0],
-        "preferred_channel": user_df['channel'].mode()[0]
-    }
+def data_fingerprint(user_df):
+    hashed = pd.util.hash_pandas_object(user_df[PLOT_COLUMNS].astype(str), index=False)
+    return hashlib.sha1(hashed.to_numpy().tobytes()).hexdigest()
 
-    print(f"\nFraud Profile for {user}")
-    for k, v in profile.items():
-        print(f"{k}: {v}")
 
-    # ---- VISUALIZATIONS ----
-    plt.figure(figsize=(14, 8))
+def render_profile(user, user_df, path):
+    fig, (ax1, ax2, ax3, ax4) = _get_axes()
 
     # Login Hours Histogram
-    plt.subplot(2, 2, 1)
-    sns.histplot(user_df['login_hour'], bins=24, kde=False, color='skyblue')
-    plt.title("Login Hour Distribution")
-    plt.xlabel("Hour of Day")
-    plt.ylabel("Login Count")
+    sns.histplot(user_df['login_hour'], bins=24, kde=False, color='skyblue', ax=ax1)
+    ax1.set_title("Login Hour Distribution")
+    ax1.set_xlabel("Hour of Day")
+    ax1.set_ylabel("Login Count")
 
     # Device Type Pie
-    plt.subplot(2, 2, 2)
-    user_df['device_type'].value_counts().plot.pie(autopct='%1.1f%%', startangle=90)
-    plt.title("Device Type Usage")
-    plt.ylabel('')
+    user_df['device_type'].value_counts().plot.pie(autopct='%1.1f%%', startangle=90, ax=ax2)
+    ax2.set_title("Device Type Usage")
+    ax2.set_ylabel('')
 
     # Login Method Count
-    plt.subplot(2, 2, 3)
-    sns.countplot(data=user_df, x='login_method', palette='viridis')
-    plt.title("Login Method Usage")
+    sns.countplot(data=user_df, x='login_method', hue='login_method', palette='viridis', legend=False, dodge=False, ax=ax3)
+    ax3.set_title("Login Method Usage")
 
     # Channel Usage
-    plt.subplot(2, 2, 4)
-    sns.countplot(data=user_df, x='channel', palette='Set2')
-    plt.title("Channel Usage")
+    sns.countplot(data=user_df, x='channel', hue='channel', palette='Set2', legend=False, dodge=False, ax=ax4)
+    ax4.set_title("Channel Usage")
 
-    plt.suptitle(f"Fraud Profile Visuals - {user}", fontsize=16)
-    plt.tight_layout(rect=[0, 0, 1, 0.95])
+    fig.suptitle(f"Fraud Profile Visuals - {user}", fontsize=16)
+    fig.tight_layout(rect=[0, 0, 1, 0.95])
 
     # Save the image
-    plt.savefig(f"fraud_profiles/{user}_profile.png")
-    plt.close()
\ No newline at end of file
+    fig.savefig(path)
+    return path
+
+
+def _render_task(task):
+    user, user_df, path = task
+    return user, render_profile(user, user_df, path)
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(manifest, output_dir):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def render_all(df, baselines, output_dir=OUTPUT_DIR, fmt="png", workers=None, users=None, force=False, verbose=True):
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+
+    # Index by user_id once and walk the users in a single pass
+    with span("index", rows=len(df)):
+        login_index = UserIndex(df)
+    wanted = set(users) if users else None
+
+    tasks = []
+    fingerprints = {}
+    for user, user_df in login_index.groups():
+        if wanted is not None and user not in wanted:
+            continue
+        user_df = drop_unused_categories(user_df)
+
+        # Profile Summary (Text)
+        if verbose:
+            print(f"\nFraud Profile for {user}")
+            for k, v in baselines.summary(user).items():
+                print(f"{k}: {v}")
+
+        # Skip users whose data hasn't changed since their last image
+        path = os.path.join(output_dir, f"{user}_profile.{fmt}")
+        fingerprint = data_fingerprint(user_df)
+        if not force and manifest.get(f"{user}.{fmt}") == fingerprint and os.path.exists(path):
+            continue
+        fingerprints[f"{user}.{fmt}"] = fingerprint
+        tasks.append((user, user_df, path))
+
+    with span("render", rows=len(tasks)):
+        if workers == 1:
+            results = map(_render_task, tasks)
+            rendered = [user for user, _ in results]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                rendered = [user for user, _ in pool.map(_render_task, tasks, chunksize=16)]
+
+    manifest.update(fingerprints)
+    save_manifest(manifest, output_dir)
+    return rendered
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Render per-user fraud profile figures")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (1 renders inline)")
+    parser.add_argument("--format", default="png", choices=["png", "svg", "pdf", "jpg"], help="image format")
+    parser.add_argument("--users", nargs="+", help="only render these user_ids")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--force", action="store_true", help="re-render even if the user's data is unchanged")
+    parser.add_argument("--quiet", action="store_true", help="don't print the text profiles")
+    parser.add_argument("--metrics", action="store_true", help="record stage timings to the metrics file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.metrics:
+        instrumentation.enable()
+    instrumentation.begin_run()
+
+    # Load the synthetic login metadata
+    with span("load_table") as timing:
+        login_version = table_version("login")
+        df = load_table("login")
+        df['login_hour'] = df['timestamp'].dt.hour
+        timing.rows = len(df)
+
+    # Per-user attribute counters, so the profile summary doesn't rescan each history
+    with span("baselines", rows=len(df)):
+        baselines = load_or_build(df, login_version)
+
+    with span("render_all"):
+        rendered = render_all(
+            df, baselines, output_dir=args.output_dir, fmt=args.format, workers=args.workers,
+            users=args.users, force=args.force, verbose=not args.quiet,
+        )
+    print(f"\nRendered {len(rendered)} profile images into {args.output_dir}")
+    if instrumentation.enabled():
+        instrumentation.flush()
+        print(instrumentation.summary().to_string(index=False))
@@ -0,0 +1,170 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from geo_velocity import SPEED_THRESHOLD_KMH, compute_geo_velocity, haversine_km_point
+
+# Rule-based login anomaly scoring.
+#   score_batch(df)     - scores every login of every user from per-user baselines (modes)
+#   score_event(event)  - scores one login against the cached baselines from load_baselines()
+
+RULES = [
+    # (reason, login column, baseline column, weight)
+    ("Unusual Device", 'device_type', 'mode_device', 0.25),
+    ("Unusual Method", 'login_method', 'mode_method', 0.25),
+    ("Unusual Channel", 'channel', 'mode_channel', 0.2),
+]
+ODD_HOUR_REASON = "Odd Login Hour"
+ODD_HOUR_WEIGHT = 0.2
+ODD_HOUR_GAP = 3
+GEO_VELOCITY_REASON = "High GeoVelocity"
+GEO_VELOCITY_WEIGHT = 0.3
+
+MAX_SCORE = 1.0
+RISK_MEDIUM = 0.4
+RISK_HIGH = 0.7
+
+BASELINE_COLUMNS = {
+    'mode_device': 'device_type',
+    'mode_method': 'login_method',
+    'mode_channel': 'channel',
+    'mode_hour': 'login_hour',
+}
+
+# Cached state for score_event
+_baselines = {}
+_last_login = {}
+
+
+def group_mode(df, column, key='user_id'):
+    # Per-user mode; ties resolve to the smallest value like Series.mode()[0]
+    counts = df.groupby([key, column], observed=True).size().rename('count').reset_index()
+    counts = counts.sort_values([key, 'count', column], ascending=[True, False, True], kind='stable')
+    return counts.drop_duplicates(key).set_index(key)[column]
+
+
+def compute_baselines(df, key='user_id'):
+    df = _with_login_hour(df)
+    baselines = pd.DataFrame({name: group_mode(df, column, key) for name, column in BASELINE_COLUMNS.items()})
+    baselines.index = baselines.index.astype(str)
+    return baselines
+
+
+def _with_login_hour(df):
+    if 'login_hour' not in df.columns:
+        df = df.assign(login_hour=df['timestamp'].dt.hour)
+    return df
+
+
+def _differs(column, expected):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Compare integer codes; baseline values outside the vocabulary become -1
+        expected_codes = pd.Categorical(expected, categories=column.cat.categories).codes
+        return column.cat.codes.to_numpy() != expected_codes
+    return column.to_numpy() != expected
+
+
+def _baseline_positions(users, baselines):
+    if isinstance(users.dtype, pd.CategoricalDtype):
+        # Look up each category once and broadcast through the integer codes
+        by_category = baselines.index.get_indexer(users.cat.categories.astype(str))
+        return by_category[users.cat.codes.to_numpy()]
+    return baselines.index.get_indexer(users.astype(str))
+
+
+def score_batch(df, baselines=None, method="haversine", key='user_id'):
+    df = _with_login_hour(df).copy()
+    if baselines is None:
+        baselines = compute_baselines(df, key)
+
+    positions = _baseline_positions(df[key], baselines)
+    has_baseline = positions >= 0
+    positions = np.where(has_baseline, positions, 0)
+
+    score = np.zeros(len(df))
+    reason = pd.Series("", index=df.index, dtype=object)
+
+    def apply(mask, name, weight):
+        nonlocal score
+        mask = np.asarray(mask) & has_baseline
+        score = score + mask * weight
+        reason[mask] = reason[mask] + "; " + name
+
+    for name, column, baseline_column, weight in RULES:
+        expected = baselines[baseline_column].astype(object).to_numpy()[positions]
+        apply(_differs(df[column], expected), name, weight)
+
+    mode_hour = baselines['mode_hour'].to_numpy()[positions]
+    apply(np.abs(df['login_hour'].to_numpy() - mode_hour) > ODD_HOUR_GAP, ODD_HOUR_REASON, ODD_HOUR_WEIGHT)
+
+    high_velocity = compute_geo_velocity(df, method=method, key=key)['high_geovelocity'].to_numpy()
+    score = score + high_velocity * GEO_VELOCITY_WEIGHT
+    reason[high_velocity] = reason[high_velocity] + "; " + GEO_VELOCITY_REASON
+
+    df['anomaly_reason'] = reason.str.removeprefix("; ")
+    df['anomaly_score'] = np.clip(score, None, MAX_SCORE)
+    return df
+
+
+def load_baselines(df, baselines=None, key='user_id'):
+    # Cache per-user modes and each user's latest login for score_event
+    if baselines is None:
+        baselines = compute_baselines(df, key)
+    _baselines.clear()
+    _baselines.update(baselines.to_dict(orient='index'))
+
+    latest = df.sort_values([key, 'timestamp'], kind='stable').drop_duplicates(key, keep='last')
+    _last_login.clear()
+    for user, ts, lat, lon in zip(latest[key].astype(str), latest['timestamp'], latest['lat'], latest['lon']):
+        _last_login[user] = (ts, lat, lon)
+    return baselines
+
+
+def score_event(event, baselines=None, last_login=None):
+    # event: mapping with user_id, timestamp, device_type, login_method, channel, lat, lon.
+    # baselines / last_login default to the module cache filled by load_baselines()
+    baselines = _baselines if baselines is None else baselines
+    last_login = _last_login if last_login is None else last_login
+    user = str(event['user_id'])
+    timestamp = event['timestamp']
+    if not isinstance(timestamp, datetime):
+        timestamp = pd.Timestamp(timestamp)
+    login_hour = event.get('login_hour', timestamp.hour)
+
+    score = 0.0
+    reasons = []
+    baseline = baselines.get(user)
+    if baseline is not None:
+        for name, column, baseline_column, weight in RULES:
+            if event[column] != baseline[baseline_column]:
+                score += weight
+                reasons.append(name)
+        if abs(login_hour - baseline['mode_hour']) > ODD_HOUR_GAP:
+            score += ODD_HOUR_WEIGHT
+            reasons.append(ODD_HOUR_REASON)
+
+    previous = last_login.get(user)
+    if previous is not None:
+        prev_ts, prev_lat, prev_lon = previous
+        time_diff_hr = (timestamp - prev_ts).total_seconds() / 3600
+        if time_diff_hr > 0:
+            speed = haversine_km_point(prev_lat, prev_lon, event['lat'], event['lon']) / time_diff_hr
+            if speed > SPEED_THRESHOLD_KMH:
+                score += GEO_VELOCITY_WEIGHT
+                reasons.append(GEO_VELOCITY_REASON)
+    if previous is None or timestamp >= previous[0]:
+        last_login[user] = (timestamp, event['lat'], event['lon'])
+
+    return {
+        'anomaly_score': min(score, MAX_SCORE),
+        'anomaly_reason': "; ".join(reasons),
+    }
+
+
+def risk_level(score):
+    if score > RISK_HIGH:
+        return "high"
+    if score > RISK_MEDIUM:
+        return "medium"
+    return "low"
@@ -0,0 +1,266 @@
+import os
+import shutil
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import log_store
+
+# Persistent per-user login baselines.
+# Keeps a frequency counter per profile attribute (and a 24-bin hour histogram) for every user,
+# updated incrementally as logins arrive, so modes / top hours / summaries are lookups instead
+# of a rescan of the user's history. With half_life_days set, counts decay exponentially so
+# stale behaviour ages out without a rebuild. The saved state records the login table version
+# (log_store.table_version) it covers, so a regenerated table is never served stale baselines.
+
+BASELINE_SUBDIR = "baselines"
+
+PROFILE_COLUMNS = ['device_type', 'os_browser', 'screen_resolution', 'city', 'login_method', 'channel', 'login_hour']
+
+# Baseline names used by anomaly_scoring
+MODE_COLUMNS = {
+    'mode_device': 'device_type',
+    'mode_method': 'login_method',
+    'mode_channel': 'channel',
+    'mode_hour': 'login_hour',
+}
+
+
+def baseline_dir():
+    # Follows log_store.use_store()
+    return os.path.join(log_store.STORE_DIR, BASELINE_SUBDIR)
+
+
+def _codes(column):
+    # (int64 codes, values as Python scalars); a categorical's own codes, anything else factorized
+    # in sorted order. Missing values get -1
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy().astype(np.int64), column.cat.categories.tolist()
+    codes, values = pd.factorize(column, sort=True)
+    return codes.astype(np.int64), pd.Index(values).tolist()
+
+
+def _best(counter):
+    # Highest weight wins; ties go to the smallest value like Series.mode()[0]
+    return min(counter.items(), key=lambda item: (-item[1], item[0]))[0]
+
+
+class BaselineStore:
+    def __init__(self, half_life_days=None):
+        self.half_life_days = half_life_days
+        self.counters = defaultdict(lambda: {col: defaultdict(float) for col in PROFILE_COLUMNS})
+        self.modes = defaultdict(dict)
+        self.total_logins = defaultdict(int)
+        self.last_update = {}
+        # Login table version the counters cover, when known
+        self.version = None
+
+    # --- decay --- #
+
+    def _decay_factor(self, elapsed):
+        if not self.half_life_days or elapsed <= pd.Timedelta(0):
+            return 1.0
+        return 0.5 ** (elapsed / pd.Timedelta(days=self.half_life_days))
+
+    def _advance(self, user, timestamp):
+        # Bring a user's counters forward to `timestamp`; scaling every value by the
+        # same factor never changes the mode, so cached modes stay valid
+        previous = self.last_update.get(user)
+        if previous is None or timestamp > previous:
+            factor = 1.0 if previous is None else self._decay_factor(timestamp - previous)
+            if factor != 1.0:
+                for counter in self.counters[user].values():
+                    for value in counter:
+                        counter[value] *= factor
+            self.last_update[user] = timestamp
+        return self.last_update[user]
+
+    # --- updates --- #
+
+    def update(self, event):
+        # Single login (mapping with user_id, timestamp and the profile columns)
+        user = str(event['user_id'])
+        timestamp = event['timestamp']
+        if not isinstance(timestamp, datetime):
+            timestamp = pd.Timestamp(timestamp)
+        reference = self._advance(user, timestamp)
+        weight = 1.0 if timestamp >= reference else self._decay_factor(reference - timestamp)
+
+        counters = self.counters[user]
+        modes = self.modes[user]
+        for col in PROFILE_COLUMNS:
+            value = event[col] if col != 'login_hour' else event.get('login_hour', timestamp.hour)
+            counter = counters[col]
+            counter[value] += weight
+            # Only `value` grew, so it is the only candidate to take over the mode
+            current = modes.get(col)
+            if current is None:
+                modes[col] = value
+            elif value != current and (counter[value], current) >= (counter[current], value):
+                modes[col] = value
+        self.total_logins[user] += 1
+
+    def update_frame(self, df, refresh=True):
+        # Bulk update: one grouped aggregation per attribute instead of a per-row loop, keyed on
+        # integer codes (user code * values + value code), never on the strings themselves.
+        # refresh=False leaves the modes stale until refresh_modes(), for many updates in a row
+        if df.empty:
+            return []
+        if 'login_hour' not in df.columns:
+            df = df.assign(login_hour=df['timestamp'].dt.hour)
+        users, names = _codes(df['user_id'])
+        names = [str(user) for user in names]
+
+        latest = df['timestamp'].groupby(users).max()
+        reference = {names[code]: self._advance(names[code], timestamp) for code, timestamp in latest.items()}
+
+        if self.half_life_days:
+            by_code = pd.Series([reference[names[code]] for code in latest.index], index=latest.index)
+            elapsed = by_code.reindex(users).values - df['timestamp'].values
+            weights = 0.5 ** (elapsed / pd.Timedelta(days=self.half_life_days).to_timedelta64())
+        else:
+            weights = np.ones(len(df))
+
+        for col in PROFILE_COLUMNS:
+            codes, values = _codes(df[col])
+            present = codes >= 0
+            keys = users[present] * len(values) + codes[present]
+            sums = pd.Series(weights[present]).groupby(keys).sum()
+            for key, weight in zip(sums.index.tolist(), sums.tolist()):
+                user, value = divmod(key, len(values))
+                self.counters[names[user]][col][values[value]] += weight
+
+        for code, count in enumerate(np.bincount(users, minlength=len(names)).tolist()):
+            if count:
+                self.total_logins[names[code]] += count
+        touched = list(reference)
+        if refresh:
+            self.refresh_modes(touched)
+        return touched
+
+    def refresh_modes(self, users=None):
+        for user in self.total_logins if users is None else users:
+            self.modes[user] = {col: _best(counter) for col, counter in self.counters[user].items() if counter}
+
+    # --- lookups --- #
+
+    def __contains__(self, user):
+        return user in self.total_logins
+
+    def users(self):
+        return sorted(self.total_logins)
+
+    def _counter(self, user, column):
+        return self.counters[user][column] if user in self.counters else {}
+
+    def mode(self, user, column):
+        return self.modes.get(user, {}).get(column)
+
+    def counts(self, user, column):
+        counter = self._counter(user, column)
+        return pd.Series(counter, dtype=float).sort_values(ascending=False) if counter else pd.Series(dtype=float)
+
+    def hour_histogram(self, user):
+        hours = self._counter(user, 'login_hour')
+        return pd.Series([hours.get(h, 0.0) for h in range(24)], index=range(24), dtype=float)
+
+    def top_hours(self, user, n=3):
+        hours = self._counter(user, 'login_hour')
+        return [h for h, _ in sorted(hours.items(), key=lambda item: (-item[1], item[0]))[:n]]
+
+    def summary(self, user):
+        modes = self.modes.get(user, {})
+        return {
+            "user_id": user,
+            "total_logins": self.total_logins.get(user, 0),
+            "device_type": modes.get('device_type'),
+            "os_browser": modes.get('os_browser'),
+            "screen_resolution": modes.get('screen_resolution'),
+            "city": modes.get('city'),
+            "frequent_login_hours": self.top_hours(user),
+            "most_used_login_method": modes.get('login_method'),
+            "preferred_channel": modes.get('channel'),
+        }
+
+    def modes_frame(self):
+        # Same layout as anomaly_scoring.compute_baselines
+        return pd.DataFrame(
+            {name: {user: self.modes[user].get(col) for user in self.total_logins} for name, col in MODE_COLUMNS.items()}
+        ).sort_index()
+
+    # --- persistence --- #
+
+    def save(self, path=None):
+        path = path or baseline_dir()
+        counts = [
+            (user, col, str(value), weight)
+            for user, columns in self.counters.items()
+            for col, counter in columns.items()
+            for value, weight in counter.items()
+        ]
+        counts_df = pd.DataFrame(counts, columns=['user_id', 'attribute', 'value', 'weight'])
+        users_df = pd.DataFrame({
+            'user_id': list(self.total_logins),
+            'total_logins': list(self.total_logins.values()),
+            'last_update': [self.last_update.get(user) for user in self.total_logins],
+        })
+        meta_df = pd.DataFrame({
+            'half_life_days': pd.Series([self.half_life_days], dtype=float),
+            'version': pd.Series([self.version], dtype=object),
+        })
+
+        staging = path + f".staging-{uuid.uuid4().hex}"
+        os.makedirs(staging)
+        counts_df.to_parquet(os.path.join(staging, "counts.parquet"), index=False)
+        users_df.to_parquet(os.path.join(staging, "users.parquet"), index=False)
+        meta_df.to_parquet(os.path.join(staging, "meta.parquet"), index=False)
+        if os.path.isdir(path):
+            retired = path + f".old-{uuid.uuid4().hex}"
+            os.replace(path, retired)
+            os.replace(staging, path)
+            shutil.rmtree(retired, ignore_errors=True)
+        else:
+            os.replace(staging, path)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or baseline_dir()
+        meta_df = pd.read_parquet(os.path.join(path, "meta.parquet"))
+        half_life = meta_df['half_life_days'].iloc[0]
+        store = cls(half_life_days=None if pd.isna(half_life) else float(half_life))
+        if 'version' in meta_df.columns and pd.notna(meta_df['version'].iloc[0]):
+            store.version = str(meta_df['version'].iloc[0])
+
+        users_df = pd.read_parquet(os.path.join(path, "users.parquet"))
+        for user, total, last in zip(users_df['user_id'], users_df['total_logins'], users_df['last_update']):
+            store.total_logins[user] = int(total)
+            if pd.notna(last):
+                store.last_update[user] = last
+
+        counts_df = pd.read_parquet(os.path.join(path, "counts.parquet"))
+        for user, col, value, weight in counts_df.itertuples(index=False):
+            store.counters[user][col][int(value) if col == 'login_hour' else value] = weight
+        store.refresh_modes()
+        return store
+
+    @classmethod
+    def build(cls, df, half_life_days=None):
+        store = cls(half_life_days=half_life_days)
+        store.update_frame(df)
+        return store
+
+
+def load_or_build(login_df, version, path=None, half_life_days=None):
+    path = path or baseline_dir()
+    # Reuse the baselines saved for this login table version, otherwise rebuild once and save
+    if os.path.isdir(path):
+        store = BaselineStore.load(path)
+        if store.version == version:
+            return store
+    store = BaselineStore.build(login_df, half_life_days=half_life_days)
+    store.version = version
+    store.save(path)
+    return store
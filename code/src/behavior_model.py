@@ -0,0 +1,221 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import log_store
+from schema import VOCABULARIES
+from scoring_utils import reason_labels
+
+# Per-user probabilistic login profile, next to the rule score.
+# For every user: smoothed categorical likelihoods of device, method, channel, city and
+# os_browser, and a circular density over the login hour (a von Mises kernel on the 24-hour
+# clock, so 23:00 is next to 01:00 and a user who logs in at 9 and at 21 has two modes).
+# The model is plain count arrays: (users x values) per attribute and (users x 24) for hours,
+# indexed by user code and by category code in the shared vocabulary. Training is one
+# bincount per attribute over all users; scoring is a gather from those arrays. Each user's
+# counts are smoothed towards the population's. A login is judged by how much less likely its
+# value is than the user's most likely one, so a user alternating between two devices (or
+# two login hours) is ordinary on both, a user with no habit is never surprising, and a value
+# the user has never used scores by how rare it is. model_score combines the attributes'
+# surprise with a noisy-OR into [0, 1], on the same scale (and with the same RISK_MEDIUM /
+# RISK_HIGH bands) as anomaly_score. The saved model records the login table version it was
+# trained on.
+
+MODEL_FILE = "behavior_model.npz"
+
+MODEL_ATTRIBUTES = {
+    # column: reason
+    'device_type': "Unlikely Device",
+    'login_method': "Unlikely Method",
+    'channel': "Unlikely Channel",
+    'city': "Unlikely City",
+    'os_browser': "Unlikely Browser",
+}
+HOUR_REASON = "Unlikely Hour"
+
+# Population logins mixed into each user's distribution
+SMOOTHING = 2.0
+# von Mises concentration over the 24-hour circle (about 2 hours either side)
+HOUR_KAPPA = 4.0
+# Relative to the user's most likely value: at least this likely is ordinary, at most this fully surprising
+USUAL_RATIO = 0.25
+RARE_RATIO = 0.01
+# An attribute this surprising (0-1) is named in the reason
+REASON_SURPRISE = 0.5
+
+
+def model_path():
+    # Follows log_store.use_store()
+    return os.path.join(log_store.STORE_DIR, MODEL_FILE)
+
+
+def hour_kernel(kappa=HOUR_KAPPA):
+    # (24, 24) circulant von Mises weights, rows sum to one
+    angle = 2 * np.pi * (np.arange(24)[:, None] - np.arange(24)[None, :]) / 24
+    weights = np.exp(kappa * np.cos(angle))
+    return weights / weights.sum(axis=1, keepdims=True)
+
+
+def _surprise(ratio):
+    # 0 at USUAL_RATIO or above, 1 at RARE_RATIO or below, linear in log-probability
+    scale = np.log(USUAL_RATIO) - np.log(RARE_RATIO)
+    return np.clip((np.log(USUAL_RATIO) - np.log(np.maximum(ratio, 1e-12))) / scale, 0.0, 1.0)
+
+
+def _positions(column, index):
+    # Position of every row's value in `index` (-1 when absent), looked up once per category
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        by_category = index.get_indexer(column.cat.categories.astype(str))
+        codes = column.cat.codes.to_numpy()
+        return np.where(codes >= 0, by_category[codes], -1)
+    return index.get_indexer(column.astype(str))
+
+
+def _distinct(column):
+    # Distinct values present in the column, as strings; a categorical's are read off its codes
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = np.unique(column.cat.codes.to_numpy())
+        return pd.Index(column.cat.categories[codes[codes >= 0]].astype(str))
+    return pd.Index(pd.unique(column.astype(str)))
+
+
+class BehaviorModel:
+    def __init__(self, users=(), vocabularies=None, counts=None, hours=None):
+        self.users = pd.Index(np.asarray(users, dtype=str))
+        self.vocabularies = {
+            col: pd.Index(np.asarray(values, dtype=str))
+            for col, values in (vocabularies or {col: VOCABULARIES[col] for col in MODEL_ATTRIBUTES}).items()
+        }
+        n_users = len(self.users)
+        self.counts = counts or {
+            col: np.zeros((n_users, len(values)), dtype=np.float32) for col, values in self.vocabularies.items()
+        }
+        self.hours = hours if hours is not None else np.zeros((n_users, 24), dtype=np.float32)
+        self._kernel = hour_kernel()
+        # Login table version the counts cover, when known
+        self.version = None
+
+    @property
+    def total_logins(self):
+        return int(self.hours.sum(dtype=np.float64))
+
+    # --- training --- #
+
+    def _grow(self, df):
+        # Room for users and values not seen before; existing codes never move
+        new_users = _distinct(df['user_id']).difference(self.users)
+        if len(new_users):
+            self.users = self.users.append(new_users)
+            pad = ((0, len(new_users)), (0, 0))
+            self.counts = {col: np.pad(counts, pad) for col, counts in self.counts.items()}
+            self.hours = np.pad(self.hours, pad)
+        for col, vocabulary in self.vocabularies.items():
+            new_values = _distinct(df[col]).difference(vocabulary)
+            if len(new_values):
+                self.vocabularies[col] = vocabulary.append(new_values)
+                self.counts[col] = np.pad(self.counts[col], ((0, 0), (0, len(new_values))))
+
+    def update(self, df):
+        # Add logins (user_id, timestamp and the model attributes); one bincount per attribute
+        if df.empty:
+            return self
+        self._grow(df)
+        n_users = len(self.users)
+        users = _positions(df['user_id'], self.users)
+        for col, counts in self.counts.items():
+            values = _positions(df[col], self.vocabularies[col])
+            width = counts.shape[1]
+            counts += np.bincount(users * width + values, minlength=n_users * width).reshape(n_users, width)
+        hours = df['timestamp'].dt.hour.to_numpy()
+        self.hours += np.bincount(users * 24 + hours, minlength=n_users * 24).reshape(n_users, 24)
+        return self
+
+    @classmethod
+    def build(cls, df):
+        return cls(users=_distinct(df['user_id']).sort_values()).update(df)
+
+    # --- scoring --- #
+
+    def _tables(self):
+        # attribute -> (per-user counts, population prior, a login's own weight at its value)
+        # Add-one over the vocabulary, plus one slot for values nobody has used
+        tables = {}
+        for col, counts in self.counts.items():
+            population = counts.sum(axis=0, dtype=np.float64) + 1
+            tables[col] = (counts, population / (population.sum() + 1), 1.0)
+        # Hours: counts spread over the circle by the kernel
+        density = self.hours @ self._kernel
+        population = density.sum(axis=0, dtype=np.float64) + 1
+        tables['login_hour'] = (density, population / population.sum(), self._kernel[0, 0])
+        return tables
+
+    def likelihoods(self, df, leave_one_out=False):
+        # Per attribute: each login's smoothed probability under its user's profile, divided by
+        # that of the user's most likely value.
+        # leave_one_out: the logins are part of the training data; take each out of its own counts
+        users = _positions(df['user_id'], self.users)
+        known = users >= 0
+        rows = np.where(known, users, 0)
+        hours = df['timestamp'].dt.hour.to_numpy()
+        result = {}
+        for col, (counts, prior, weight) in self._tables().items():
+            values = hours if col == 'login_hour' else _positions(df[col], self.vocabularies[col])
+            seen = values >= 0
+            columns = np.where(seen, values, 0)
+            totals = counts.sum(axis=1, dtype=np.float64)
+            count = np.where(known & seen, counts[rows, columns] - weight * leave_one_out, 0.0)
+            total = np.where(known, totals[rows] - leave_one_out, 0.0)
+            probability = (count + SMOOTHING * np.where(seen, prior[columns], 1 - prior.sum())) / (total + SMOOTHING)
+            best = (counts + SMOOTHING * prior).max(axis=1) / (totals + SMOOTHING)
+            result[col] = probability / np.where(known, best[rows], prior.max())
+        return result
+
+    def score(self, df, leave_one_out=False):
+        # (model_score, model_reason) per login
+        surprise = [_surprise(ratio) for ratio in self.likelihoods(df, leave_one_out).values()]
+        score = 1.0 - np.prod([1.0 - s for s in surprise], axis=0) if len(df) else np.zeros(0)
+        names = [*MODEL_ATTRIBUTES.values(), HOUR_REASON]
+        return score, reason_labels([s >= REASON_SURPRISE for s in surprise], names)
+
+    # --- persistence --- #
+
+    def save(self, path=None):
+        path = path or model_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {'users': self.users.to_numpy(dtype=str), 'hours': self.hours}
+        if self.version is not None:
+            arrays['version'] = np.array(self.version)
+        for col in self.counts:
+            arrays[f'vocabulary:{col}'] = self.vocabularies[col].to_numpy(dtype=str)
+            arrays[f'counts:{col}'] = self.counts[col]
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or model_path()
+        with np.load(path) as arrays:
+            model = cls(
+                users=arrays['users'],
+                vocabularies={col: arrays[f'vocabulary:{col}'] for col in MODEL_ATTRIBUTES},
+                counts={col: arrays[f'counts:{col}'] for col in MODEL_ATTRIBUTES},
+                hours=arrays['hours'],
+            )
+            if 'version' in arrays.files:
+                model.version = str(arrays['version'])
+        return model
+
+
+def load_or_build(login_df, version, path=None):
+    path = path or model_path()
+    # Reuse the model saved for this login table version, otherwise train once and save
+    if os.path.exists(path):
+        model = BehaviorModel.load(path)
+        if model.version == version:
+            return model
+    model = BehaviorModel.build(login_df)
+    model.version = version
+    model.save(path)
+    return model
@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import log_store
+from anomaly_scoring import compute_baselines, score_batch
+from baseline_store import BaselineStore
+from geo_velocity import compute_geo_velocity
+from log_store import drop_unused_categories, load_table, use_store, write_table
+from synthetic_generator import generate_logins
+from user_index import UserIndex
+
+# Reproducible benchmarks for the hot paths, on generated data at fixed scale tiers.
+# Each stage is timed on its own (best and median of --repeat runs) with its peak traced
+# memory from a separate tracemalloc run. Results are written as JSON so runs on the same
+# machine can be compared across commits.
+#
+#   python code/src/benchmarks.py --tiers 10k 1M --output bench.json
+
+TIERS = {
+    "10k": 10_000,
+    "1M": 1_000_000,
+    "10M": 10_000_000,
+}
+LOGINS_PER_USER = 100
+SEED = 42
+SAMPLE_USERS = 100
+RENDER_USERS = 10
+BENCH_DIR = os.path.join(log_store.LOG_DIR, "bench")
+
+
+def _max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(fn, repeat=3):
+    # tracemalloc sees Python and NumPy allocations but not Arrow's pool, so also record
+    # how much the process high-water mark grew during the first run
+    rss_before = _max_rss_mb()
+    tracemalloc.start()
+    try:
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    stats = {
+        "best_s": round(min(timings), 6),
+        "median_s": round(float(np.median(timings)), 6),
+        "peak_traced_mb": round(peak / 2 ** 20, 2),
+        "max_rss_growth_mb": round(_max_rss_mb() - rss_before, 2),
+    }
+    return result, stats
+
+
+def prepare_tier(name, n_logins, rebuild=False):
+    # Generated once per tier and seed, then reused so every run reads identical data
+    store_dir = os.path.join(BENCH_DIR, f"{name}-seed{SEED}")
+    use_store(store_dir)
+    if rebuild or not log_store.table_exists("login"):
+        n_users = max(10, n_logins // LOGINS_PER_USER)
+        end_time = pd.Timestamp("2025-06-01", tz="UTC")
+        for i, (logins, _) in enumerate(generate_logins(n_logins, n_users, seed=SEED, end_time=end_time)):
+            (write_table if i == 0 else log_store.append_table)(logins, "login")
+    return store_dir
+
+
+def run_tier(name, n_logins, repeat, render_users, rebuild=False):
+    prepare_tier(name, n_logins, rebuild)
+    stages = {}
+
+    df, stages['table_load'] = measure(lambda: load_table("login"), repeat)
+    rows = len(df)
+
+    iso = df['timestamp'].dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    _, stages['timestamp_parse'] = measure(lambda: pd.to_datetime(iso, utc=True, format="ISO8601"), repeat)
+    del iso
+    df['login_hour'] = df['timestamp'].dt.hour
+
+    rng = np.random.default_rng(SEED)
+    users = rng.choice(df['user_id'].cat.categories, min(SAMPLE_USERS, df['user_id'].nunique()), replace=False)
+
+    _, stages['per_user_filter_mask'] = measure(
+        lambda: [df[df['user_id'] == user] for user in users], repeat
+    )
+    index, stages['user_index_build'] = measure(lambda: UserIndex(df), repeat)
+    _, stages['per_user_filter_index'] = measure(lambda: [index.get(user) for user in users], repeat)
+
+    baselines, stages['profile_modes'] = measure(lambda: compute_baselines(df), repeat)
+    _, stages['baseline_store_build'] = measure(lambda: BaselineStore.build(df), repeat)
+    _, stages['geo_velocity'] = measure(lambda: compute_geo_velocity(df), repeat)
+    _, stages['anomaly_scoring'] = measure(lambda: score_batch(df, baselines=baselines), repeat)
+
+    if render_users:
+        import Visualizations
+
+        slices = [drop_unused_categories(index.get(user)) for user in users[:render_users]]
+        out_dir = os.path.join(BENCH_DIR, "render")
+        os.makedirs(out_dir, exist_ok=True)
+        _, stages['figure_render'] = measure(
+            lambda: [Visualizations.render_profile(user, s, os.path.join(out_dir, f"{user}.png"))
+                     for user, s in zip(users, slices)],
+            repeat,
+        )
+        stages['figure_render']['users'] = len(slices)
+
+    for stage in ('per_user_filter_mask', 'per_user_filter_index'):
+        stages[stage]['users'] = len(users)
+    return {"rows": rows, "users": int(df['user_id'].nunique()), "stages": stages}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark load, filter, scoring and render hot paths")
+    parser.add_argument("--tiers", nargs="+", default=["10k", "1M"], choices=list(TIERS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--render-users", type=int, default=RENDER_USERS, help="users to render per tier (0 skips)")
+    parser.add_argument("--rebuild", action="store_true", help="regenerate the tier data")
+    parser.add_argument("--output", help="JSON file to write (default: stdout)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+        },
+        "seed": SEED,
+        "repeat": args.repeat,
+        "tiers": {},
+    }
+    for tier in args.tiers:
+        report["tiers"][tier] = run_tier(tier, TIERS[tier], args.repeat, args.render_users, args.rebuild)
+    report["max_rss_mb"] = round(_max_rss_mb(), 2)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
@@ -0,0 +1,398 @@
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from anomaly_scoring import RISK_MEDIUM, score_batch
+from baseline_store import BaselineStore, load_or_build
+from behavior_model import load_or_build as load_or_build_model
+from geo_aggregation import GeoGrid
+from instrumentation import count, span
+from linkage_index import load_or_build as load_or_build_linkage
+from log_store import TABLES, drop_unused_categories
+from risk_aggregates import RiskAggregates, risk_aggregate_path, load_or_build as load_or_build_aggregates
+from session_paths import score_paths
+from snapshot import current_or_publish, manifest, read_table
+from time_index import TimeIndex
+from timeline import LOGIN_CONTEXT_COLUMNS, attribute_to_logins, user_timeline, with_post_login_activity
+from transaction_risk import load_or_score
+from user_index import UserIndex
+
+# Two-level Streamlit cache for the dashboards.
+#   1. Raw tables and the derived full-table state, keyed by the published snapshot version (snapshot.py).
+#      Tables are memory-mapped from the snapshot and every session shares one copy; a publish is a new
+#      key, never a change under a reader. Each concern is its own entry, built on first use: baselines,
+#      rule-scored logins, behaviour model scores, session path scores, transaction scores, the binned
+#      map layers, the population risk rollup and the cross-user linkage index. A view only builds the
+#      entries it reads, e.g. Account Links never scores a login.
+#      A version published by a login sync in this process (apply_sync) starts each login, session and
+#      transaction entry from the previous version's and replaces only the synced users' rows.
+#   2. Per-user artifacts (summary, hour histogram, anomaly table, table slices),
+#      keyed by (user_id, data version, time window) with a bounded LRU. Without a window the
+#      summaries are lookups in the full-history baselines; with one they are built from the
+#      window's rows, which the user / time indexes slice out with binary searches.
+# Superseded versions age out of the LRUs; nothing is ever cleared under a reader.
+
+MAX_TABLE_VERSIONS = 2
+MAX_USER_ENTRIES = 256
+
+# Columns score_batch adds to a login
+SCORE_COLUMNS = ['anomaly_reason', 'anomaly_score']
+
+# Login syncs published from this process: new version -> (previous version, the sync's rescored logins)
+_synced = {}
+# (entry, version) pairs built in this process; a merge only starts from an entry that was
+_built = set()
+
+
+def data_version():
+    # One small file read per rerun; the first call publishes a snapshot if there is none yet
+    return current_or_publish()
+
+
+@st.cache_resource(max_entries=MAX_TABLE_VERSIONS * len(TABLES), show_spinner=False)
+def _load_table(table, version):
+    with span(f"load_table:{table}") as s:
+        df = read_table(table, version)
+        if table == "login":
+            df['login_hour'] = df['timestamp'].dt.hour
+        s.rows = len(df)
+    return df
+
+
+def cached_table(table, version=None):
+    # Shared, read-only object: callers must not mutate it
+    return _load_table(table, version or data_version())
+
+
+def apply_sync(previous, version, scores):
+    # Called once a login sync is published: `scores` is score_batch over the full history of every
+    # synced user. Building `version` then reuses `previous`'s state for everyone else
+    if previous and previous != version and len(scores):
+        _synced[version] = (previous, scores)
+        for stale in list(_synced)[:-MAX_TABLE_VERSIONS]:
+            del _synced[stale]
+
+
+def _only_logins_changed(previous, version):
+    try:
+        before, after = manifest(previous), manifest(version)
+    except FileNotFoundError:
+        return False
+    return before.keys() == after.keys() and all(before[t] == after[t] for t in after if t != "login")
+
+
+def _apply_scores(logins, scores, baselines):
+    # The sync scored these users' logins in store order, which the snapshot keeps; copy its columns
+    # over when the rows line up, otherwise score just these logins again
+    aligned = (
+        len(scores) == len(logins)
+        and np.array_equal(scores['timestamp'].values, logins['timestamp'].values)
+        and np.array_equal(scores['user_id'].astype(str).to_numpy(), logins['user_id'].astype(str).to_numpy())
+    )
+    if not aligned:
+        return score_batch(logins, baselines=baselines.modes_frame())
+    logins = logins.copy()
+    for col in SCORE_COLUMNS:
+        logins[col] = scores[col].to_numpy()
+    return logins
+
+
+def _user_rows(index, users):
+    # The users' rows of an index frame, without the attributed login context
+    parts = [index.get(user) for user in users if user in index]
+    rows = pd.concat(parts, ignore_index=True) if parts else index.frame.iloc[:0]
+    return rows.drop(columns=[col for col in LOGIN_CONTEXT_COLUMNS.values() if col in rows.columns])
+
+
+def _replace_users(frame, users, fresh):
+    # `frame` without the users' rows, plus `fresh`; categorical columns keep one sorted vocabulary
+    kept = frame[~frame['user_id'].isin(users).to_numpy()]
+    fresh = fresh[frame.columns]
+    for col in frame.columns:
+        if isinstance(kept[col].dtype, pd.CategoricalDtype) and kept[col].dtype != fresh[col].dtype:
+            dtype = pd.CategoricalDtype(kept[col].cat.categories.union(fresh[col].astype("category").cat.categories))
+            kept = kept.assign(**{col: kept[col].astype(dtype)})
+            fresh = fresh.assign(**{col: fresh[col].astype(dtype)})
+    return pd.concat([kept, fresh], ignore_index=True)
+
+
+def _merged_or_built(name, version, build, merge):
+    # A version published by a login sync in this process starts from the previous version's entry,
+    # when that entry was built here; otherwise the entry is built from the tables
+    synced = _synced.get(version)
+    if synced is not None and (name, synced[0]) in _built and _only_logins_changed(synced[0], version):
+        count(f"{name}_merged")
+        result = merge(version, *synced)
+    else:
+        count(f"{name}_built")
+        result = build(version)
+    _built.add((name, version))
+    return result
+
+
+def _login_version(version):
+    return manifest(version)["login"]["version"]
+
+
+def _synced_users(scores):
+    return pd.unique(scores['user_id'].astype(str))
+
+
+def _rows_of(df, users):
+    return df[df['user_id'].isin(users).to_numpy()].reset_index(drop=True)
+
+
+@st.cache_resource(max_entries=MAX_TABLE_VERSIONS, show_spinner=False)
+def _baselines(version):
+    login_df = cached_table("login", version)
+    with span("baselines", rows=len(login_df)):
+        return load_or_build(login_df, _login_version(version))
+
+
+def _score_logins(version):
+    login_df = cached_table("login", version)
+    with span("score_batch", rows=len(login_df)):
+        scored = score_batch(login_df, baselines=_baselines(version).modes_frame())
+    # What each login was followed by, from the raw sessions / transactions
+    with span("post_login_activity", rows=len(scored)):
+        scored = with_post_login_activity(scored, cached_table("transaction", version), cached_table("session", version))
+    with span("user_index:login"):
+        return UserIndex(scored)
+
+
+def _merge_login_scores(version, previous, scores):
+    # Only the synced users' logins changed: their rows are replaced, everyone else's carried over
+    users = _synced_users(scores)
+    with span("apply_rescored", rows=len(scores)):
+        logins = _apply_scores(_rows_of(cached_table("login", version), users), scores, _baselines(version))
+    with span("post_login_activity", rows=len(logins)):
+        logins = with_post_login_activity(
+            logins, _rows_of(cached_table("transaction", version), users), _rows_of(cached_table("session", version), users),
+        )
+    with span("user_index:login"):
+        return UserIndex(_replace_users(_login_scores(previous).frame, users, logins))
+
+
+@st.cache_resource(max_entries=MAX_TABLE_VERSIONS, show_spinner="Scoring logins...")
+def _login_scores(version):
+    # Rule-scored logins with their post-login activity, indexed by user
+    return _merged_or_built("login_scores", version, _score_logins, _merge_login_scores)
+
+
+@st.cache_resource(max_entries=MAX_TABLE_VERSIONS, show_spinner="Scoring behaviour...")
+def _behavior_scores(version):
+    # (model_score, model_reason) of every login, in login-index order, each left out of its own profile.
+    # The population prior moves with every sync, so all logins are rescored: one gather over the counts
+    logins = _login_scores(version).frame
+    with span("behavior_model", rows=len(logins)):
+        model = load_or_build_model(cached_table("login", version), _login_version(version))
+        return model.score(logins, leave_one_out=True)
+
+
+@st.cache_resource(max_entries=MAX_TABLE_VERSIONS, show_spinner=False)
+def _login_index(version):
+    model_score, model_reason = _behavior_scores(version)
+    return _login_scores(version).assign(model_score=model_score, model_reason=model_reason)
+
+
+def _score_sessions(version):
+    sessions = cached_table("session", version)
+    with span("session_paths", rows=len(sessions)):
+        sessions = score_paths(sessions)
+    # Each session carries its preceding login
+    with span("attribute_sessions", rows=len(sessions)):
+        sessions = attribute_to_logins(sessions, _login_scores(version).frame)
+    with span("user_index:session"):
+        return UserIndex(sessions.drop(columns='login_row'))
+
+
+def _merge_sessions(version, previous, scores):
+    # Path scores don't involve logins; the synced users' sessions are attributed to their new logins
+    users = _synced_users(scores)
+    index = _session_index(previous)
+    with span("attribute_sessions"):
+        sessions = attribute_to_logins(_user_rows(index, users), _rows_of(_login_scores(version).frame, users))
+    with span("user_index:session"):
+        return UserIndex(_replace_users(index.frame, users, sessions.drop(columns='login_row')))
+
+
+@st.cache_resource(max_entries=MAX_TABLE_VERSIONS, show_spinner="Scoring session paths...")
+def _session_index(version):
+    return _merged_or_built("session_index", version, _score_sessions, _merge_sessions)
+
+
+def _score_transactions(version):
+    with span("transaction_risk") as s:
+        transactions = load_or_score(cached_table("transaction", version), manifest(version)["transaction"]["version"])
+        s.rows = len(transactions)
+    # Each transaction carries its preceding login
+    with span("attribute_transactions", rows=len(transactions)):
+        transactions = attribute_to_logins(transactions, _login_scores(version).frame)
+    with span("user_index:transaction"):
+        return UserIndex(transactions.drop(columns='login_row'))
+
+
+def _merge_transactions(version, previous, scores):
+    users = _synced_users(scores)
+    index = _transaction_index(previous)
+    with span("attribute_transactions"):
+        transactions = attribute_to_logins(_user_rows(index, users), _rows_of(_login_scores(version).frame, users))
+    with span("user_index:transaction"):
+        return UserIndex(_replace_users(index.frame, users, transactions.drop(columns='login_row')))
+
+
+@st.cache_resource(max_entries=MAX_TABLE_VERSIONS, show_spinner="Scoring transactions...")
+def _transaction_index(version):
+    return _merged_or_built("transaction_index", version, _score_transactions, _merge_transactions)
+
+
+@st.cache_resource(max_entries=MAX_TABLE_VERSIONS, show_spinner=False)
+def _feature_index(version):
+    with span("user_index:feature"):
+        return UserIndex(cached_table("feature", version))
+
+
+_INDEXES = {"login": _login_index, "session": _session_index, "transaction": _transaction_index, "feature": _feature_index}
+
+
+def user_index(table, version=None):
+    return _INDEXES[table](version or data_version())
+
+
+@st.cache_resource(max_entries=MAX_TABLE_VERSIONS, show_spinner=False)
+def _login_times(version):
+    # Rule-scored logins in time order, for the all-user map of a window
+    with span("time_index:login"):
+        return TimeIndex(_login_scores(version).frame)
+
+
+@st.cache_resource(max_entries=MAX_TABLE_VERSIONS, show_spinner="Binning logins...")
+def _geo_grid(version):
+    logins = _login_scores(version).frame
+    with span("geo_grid", rows=len(logins)):
+        return GeoGrid(logins)
+
+
+@st.cache_resource(max_entries=MAX_TABLE_VERSIONS, show_spinner=False)
+def _risk_aggregates(version):
+    # The rollup saved for this login version (a sync keeps it current) needs no scoring at all
+    login_version = _login_version(version)
+    if os.path.exists(risk_aggregate_path()):
+        aggregates = RiskAggregates.load()
+        if aggregates.version == login_version:
+            return aggregates
+    logins = _login_scores(version).frame
+    with span("risk_aggregates", rows=len(logins)):
+        return load_or_build_aggregates(logins, login_version)
+
+
+@st.cache_resource(max_entries=MAX_TABLE_VERSIONS, show_spinner=False)
+def _linkage(version):
+    login_df = cached_table("login", version)
+    with span("linkage_index", rows=len(login_df)):
+        return load_or_build_linkage(login_df, _login_version(version))
+
+
+@st.cache_data(max_entries=MAX_TABLE_VERSIONS, show_spinner=False)
+def user_ids(version):
+    # Users with logins, in login-index order, read off the raw table
+    users = cached_table("login", version)['user_id'].astype("category")
+    codes = np.unique(users.cat.codes.to_numpy())
+    return users.cat.categories[codes[codes >= 0]].tolist()
+
+
+@st.cache_data(max_entries=MAX_TABLE_VERSIONS * len(TABLES), show_spinner=False)
+def _table_span(table, version):
+    times = cached_table(table, version)['timestamp']
+    return (times.min(), times.max()) if len(times) else None
+
+
+def time_span(version=None):
+    # First and last timestamp over all tables, read off the raw tables
+    version = version or data_version()
+    bounds = [bound for bound in (_table_span(table, version) for table in TABLES) if bound is not None]
+    if not bounds:
+        return None, None
+    return min(first for first, _ in bounds), max(last for _, last in bounds)
+
+
+@st.cache_data(max_entries=MAX_USER_ENTRIES, show_spinner=False)
+def user_rows(table, user_id, version, start=None, end=None):
+    rows = user_index(table, version).get(user_id, start, end)
+    return drop_unused_categories(rows.reset_index(drop=True))
+
+
+@st.cache_resource(max_entries=MAX_USER_ENTRIES, show_spinner=False)
+def _window_baselines(user_id, version, start, end):
+    return BaselineStore.build(user_rows("login", user_id, version, start, end))
+
+
+def _user_baselines(user_id, version, start, end):
+    # Full-history counters, or counters of just the window's logins
+    if start is None and end is None:
+        return _baselines(version)
+    return _window_baselines(user_id, version, start, end)
+
+
+@st.cache_data(max_entries=MAX_USER_ENTRIES, show_spinner=False)
+def user_summary(user_id, version, start=None, end=None):
+    summary = _user_baselines(user_id, version, start, end).summary(user_id)
+    return {**summary, "user_id": user_id}
+
+
+@st.cache_data(max_entries=MAX_USER_ENTRIES, show_spinner=False)
+def user_hour_histogram(user_id, version, start=None, end=None):
+    hours = _user_baselines(user_id, version, start, end).hour_histogram(user_id)
+    return hours[hours > 0]
+
+
+@st.cache_data(max_entries=MAX_USER_ENTRIES, show_spinner=False)
+def user_counts(user_id, column, version, start=None, end=None):
+    return _user_baselines(user_id, version, start, end).counts(user_id, column)
+
+
+@st.cache_data(max_entries=MAX_USER_ENTRIES, show_spinner=False)
+def user_anomalies(user_id, version, start=None, end=None, score='anomaly_score'):
+    # Logins above RISK_MEDIUM on the rule score, or on the behaviour model's model_score
+    user_df = user_rows("login", user_id, version, start, end)
+    return user_df[user_df[score] > RISK_MEDIUM].copy().reset_index(drop=True)
+
+
+@st.cache_data(max_entries=MAX_USER_ENTRIES, show_spinner=False)
+def user_events(user_id, version, start=None, end=None):
+    return user_timeline({table: user_index(table, version) for table in TABLES}, user_id, start, end)
+
+
+@st.cache_data(max_entries=MAX_USER_ENTRIES, show_spinner=False)
+def risk_leaderboard(days, version):
+    # Reads only the per-(user, day) rollup
+    return _risk_aggregates(version).leaderboard(days)
+
+
+@st.cache_data(max_entries=MAX_USER_ENTRIES, show_spinner=False)
+def map_layers(user_id, level, version, start=None, end=None):
+    # Binned cells and grouped travel arcs; user_id None covers every user
+    if start is None and end is None:
+        geo = _geo_grid(version)
+    elif user_id is None:
+        geo = GeoGrid(_login_times(version).window(start, end))
+    else:
+        geo = GeoGrid(_login_scores(version).get(user_id, start, end))
+    return geo.cells(level, user_id), geo.arcs(level, user_id)
+
+
+@st.cache_data(max_entries=MAX_USER_ENTRIES, show_spinner=False)
+def user_links(user_id, version):
+    # Accounts sharing a key with the user, the user's cluster and the user's keys
+    linkage = _linkage(version)
+    return linkage.shared_with(user_id), linkage.cluster(user_id), linkage.keys_of(user_id)
+
+
+@st.cache_data(max_entries=MAX_USER_ENTRIES, show_spinner=False)
+def linked_clusters(hours, version):
+    # Clusters that grew and keys that spread within the last `hours` of logins
+    linkage = _linkage(version)
+    window = pd.Timedelta(hours=hours)
+    return linkage.new_clusters(window), linkage.key_bursts(window)
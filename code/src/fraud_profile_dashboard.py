@@ -1,77 +1,152 @@
 import streamlit as st
 import pandas as pd
 import pydeck as pdk
-from geopy.distance import geodesic
 
-# Load all data
-login_df = pd.read_excel("code/src/synthetic_logs/synthetic_login_metadata.xlsx")
-session_df = pd.read_excel("code/src/synthetic_logs/session_metadata.xlsx")
-transaction_df = pd.read_excel("code/src/synthetic_logs/transaction_metadata.xlsx")
-feature_df = pd.read_excel("code/src/synthetic_logs/feature_usage_logs.xlsx")
-
-# Preprocess timestamps
-login_df['timestamp'] = pd.to_datetime(login_df['timestamp'])
-session_df['timestamp'] = pd.to_datetime(session_df['timestamp'])
-transaction_df['timestamp'] = pd.to_datetime(transaction_df['timestamp'])
-feature_df['timestamp'] = pd.to_datetime(feature_df['timestamp'])
-
-# Extract hour for login patterns
-login_df['login_hour'] = login_df['timestamp'].dt.hour
+from anomaly_scoring import RISK_HIGH, RISK_MEDIUM
+from cache_layer import (
+    apply_sync, data_version, linked_clusters, map_layers, risk_leaderboard, time_span, user_anomalies, user_counts,
+    user_events, user_hour_histogram, user_ids, user_links, user_rows, user_summary,
+)
+from geo_aggregation import GRID_LEVELS, LEVEL_ZOOM, cell_radius_m
+import instrumentation
+from instrumentation import span, timed
+from log_store import LOG_DIR
+from pagination import paged_dataframe
+from risk_aggregates import TIME_WINDOWS, top_users
+from schema import format_ip_columns, format_pages
+from session_paths import transition_matrix
+from snapshot import publish
+from sync_pipeline import SchemaError, saved_state, sync_logins
+from time_index import RELATIVE_WINDOWS, as_utc, relative_window
+
+VIEWS = [
+    "🔐 Login Profile", "🔄 Session Activity", "💳 Transactions", "🔧 Feature Usage", "📈 Risk Overview", "🕸️ Account Links",
+]
+
+# Label -> hours of logins looked back over for new clusters
+LINK_WINDOWS = {"Last hour": 1, "Last 6 hours": 6, "Last day": 24, "Last 7 days": 24 * 7}
+
+ANOMALY_COLUMNS = [
+    'timestamp', 'device_type', 'login_method', 'channel', 'login_hour', 'lat', 'lon', 'anomaly_reason', 'anomaly_score',
+    'model_reason', 'model_score', 'post_login_transfer_amount',
+]
+
+# Label -> column the anomaly table is flagged and coloured by
+FLAG_SCORES = {"Rule score": 'anomaly_score', "Behavior model": 'model_score'}
+
+SESSION_COLUMNS = [
+    'timestamp', 'session_duration_sec', 'pages_visited', 'path_length', 'path_loglik', 'path_z', 'unlikely_step',
+    'unusual_path',
+]
+
+TRANSACTION_COLUMNS = [
+    'timestamp', 'transaction_type', 'amount', 'recipient', 'method', 'txn_count_10min', 'txn_amount_1h', 'amount_z',
+    'txn_risk_reason', 'txn_risk_score', 'login_time', 'login_score',
+]
 
 st.set_page_config(layout="wide")
-st.title("🔒 Fraud Profile Explorer")
 
-# Tabs
-login_tab, session_tab, transaction_tab, feature_tab = st.tabs([
-    "🔐 Login Profile", "🔄 Session Activity", "💳 Transactions", "🔧 Feature Usage"
-])
+# Timing spans for this rerun, shown in the sidebar and appended to the metrics file
+run = instrumentation.begin_run(enabled=st.sidebar.toggle("🐞 Debug timings", value=instrumentation.enabled()))
 
-# --- LOGIN PROFILE TAB --- #
-with login_tab:
-    st.sidebar.title("🛡️ Fraud Profile Dashboard")
-    user_id = st.sidebar.selectbox("Select a User", login_df['user_id'].unique())
+# Tables, baselines, scores and user indexes are shared by all sessions per published snapshot and
+# built by the first view that reads them; a rerun that doesn't change the data only reads the snapshot pointer
+with span("data_version"):
+    version = data_version()
+
+st.title("🔒 Fraud Profile Explorer")
 
-    user_df = login_df[login_df['user_id'] == user_id].sort_values(by='timestamp').reset_index(drop=True)
+st.sidebar.title("🛡️ Fraud Profile Dashboard")
+user_id = st.sidebar.selectbox("Select a User", user_ids(version))
+
+# Date window for the per-user views; each table is sliced by binary search on its sorted timestamps
+first_seen, last_seen = time_span(version)
+window_label = st.sidebar.selectbox("Date range", [*RELATIVE_WINDOWS, "Custom"])
+if window_label == "Custom" and first_seen is not None:
+    picked = st.sidebar.date_input(
+        "From / to (UTC)", value=(first_seen.date(), last_seen.date()),
+        min_value=first_seen.date(), max_value=last_seen.date(),
+    )
+    # The range is half-open, so the end date is included up to midnight
+    start = as_utc(picked[0]) if len(picked) > 0 else None
+    end = as_utc(picked[1]) + pd.Timedelta(days=1) if len(picked) > 1 else None
+else:
+    start, end = relative_window(window_label if window_label in RELATIVE_WINDOWS else "All time", last_seen)
+
+# Only the selected view is computed; each view is a fragment, so its own widgets
+# (map detail, pagination, anomaly picker) rerun just that view
+view = st.segmented_control("View", VIEWS, default=VIEWS[0], key="view") or VIEWS[0]
+
+
+# --- LOGIN PROFILE VIEW --- #
+@st.fragment
+@timed("view:login")
+def login_view(user_id, start, end):
+    user_df = user_rows("login", user_id, version, start, end)
 
     st.title(f"Fraud Profile for: {user_id}")
 
     # Summary Panel
+    summary = user_summary(user_id, version, start, end)
     st.subheader("📌 User Summary")
     col1, col2, col3 = st.columns(3)
-    col1.metric("Total Logins", len(user_df))
-    col2.metric("Most Used Device", user_df['device_type'].mode()[0])
-    col3.metric("Preferred Channel", user_df['channel'].mode()[0])
+    col1.metric("Total Logins", summary['total_logins'])
+    col2.metric("Most Used Device", summary['device_type'])
+    col3.metric("Preferred Channel", summary['preferred_channel'])
 
     col4, col5, col6 = st.columns(3)
-    col4.metric("Most Used Login Method", user_df['login_method'].mode()[0])
-    col5.metric("Top City", user_df['city'].mode()[0])
-    col6.metric("Common OS/Browser", user_df['os_browser'].mode()[0])
+    col4.metric("Most Used Login Method", summary['most_used_login_method'])
+    col5.metric("Top City", summary['city'])
+    col6.metric("Common OS/Browser", summary['os_browser'])
 
     # Login Time Histogram
     st.subheader("⏰ Login Hours Distribution")
-    hour_counts = user_df['login_hour'].value_counts().sort_index()
-    st.bar_chart(hour_counts)
+    st.bar_chart(user_hour_histogram(user_id, version, start, end))
 
     # Geolocation Map
     st.subheader("🗺️ Login Location Map")
-    map_data = user_df[['lat', 'lon']].drop_duplicates()
-    st.pydeck_chart(pdk.Deck(
-        initial_view_state=pdk.ViewState(
-            latitude=map_data['lat'].mean(),
-            longitude=map_data['lon'].mean(),
-            zoom=4,
-            pitch=0,
-        ),
-        layers=[
-            pdk.Layer(
-                'ScatterplotLayer',
-                data=map_data,
-                get_position='[lon, lat]',
-                get_color='[200, 30, 0, 160]',
-                get_radius=80000,
-            )
-        ]
-    ))
+    col_scope, col_level = st.columns(2)
+    map_scope = col_scope.radio("Show", ["This user", "All users"], horizontal=True)
+    map_level = col_level.select_slider("Detail", options=list(GRID_LEVELS), value="region")
+
+    # Only pre-binned cells and grouped travel legs go to the browser
+    with span("map") as timing:
+        cells, arcs = map_layers(user_id if map_scope == "This user" else None, map_level, version, start, end)
+        timing.rows = len(cells) + len(arcs)
+        if cells.empty:
+            st.info("No logins in this date range.")
+        else:
+            st.pydeck_chart(pdk.Deck(
+                initial_view_state=pdk.ViewState(
+                    latitude=float((cells['lat'] * cells['logins']).sum() / cells['logins'].sum()),
+                    longitude=float((cells['lon'] * cells['logins']).sum() / cells['logins'].sum()),
+                    zoom=LEVEL_ZOOM[map_level],
+                    pitch=40,
+                ),
+                layers=[
+                    pdk.Layer(
+                        'ColumnLayer',
+                        data=cells,
+                        get_position='[lon, lat]',
+                        get_elevation='logins',
+                        elevation_scale=cell_radius_m(map_level) / max(int(cells['logins'].max()), 1) * 4,
+                        radius=cell_radius_m(map_level) * 0.8,
+                        get_fill_color='[200, 30 + 170 * (1 - anomalies / logins), 0, 180]',
+                        pickable=True,
+                    ),
+                    pdk.Layer(
+                        'ArcLayer',
+                        data=arcs,
+                        get_source_position='[from_lon, from_lat]',
+                        get_target_position='[to_lon, to_lat]',
+                        get_source_color='[255, 140, 0, 200]',
+                        get_target_color='[200, 0, 80, 200]',
+                        get_width='1 + legs',
+                    ),
+                ],
+                tooltip={"text": "{logins} logins, {anomalies} anomalous"},
+            ))
+            st.caption(f"{len(cells)} cells, {int(arcs['legs'].sum()) if len(arcs) else 0} impossible-travel legs")
 
     # Device / Channel / Login Method Breakdown
     st.subheader("📊 Behavior Breakdown")
@@ -79,89 +154,90 @@ with login_tab:
 
     with col7:
         st.markdown("**Device Type**")
-        st.bar_chart(user_df['device_type'].value_counts())
+        st.bar_chart(user_counts(user_id, 'device_type', version, start, end))
 
     with col8:
         st.markdown("**Login Methods**")
-        st.bar_chart(user_df['login_method'].value_counts())
+        st.bar_chart(user_counts(user_id, 'login_method', version, start, end))
 
     with col9:
         st.markdown("**Channels**")
-        st.bar_chart(user_df['channel'].value_counts())
+        st.bar_chart(user_counts(user_id, 'channel', version, start, end))
 
     # Strict Anomaly Detection
     st.subheader("🚨 Strict Anomaly Detection with Risk Scoring")
 
-    mode_device = user_df['device_type'].mode()[0]
-    mode_method = user_df['login_method'].mode()[0]
-    mode_channel = user_df['channel'].mode()[0]
-    mode_hour = user_df['login_hour'].mode()[0]
-
-    user_df['anomaly_reason'] = ""
-    user_df['anomaly_score'] = 0
-
-    user_df.loc[user_df['device_type'] != mode_device, ['anomaly_reason', 'anomaly_score']] = ["Unusual Device", 0.25]
-    user_df.loc[user_df['login_method'] != mode_method, ['anomaly_reason', 'anomaly_score']] += ["; Unusual Method", 0.25]
-    user_df.loc[user_df['channel'] != mode_channel, ['anomaly_reason', 'anomaly_score']] += ["; Unusual Channel", 0.2]
-    user_df.loc[abs(user_df['login_hour'] - mode_hour) > 3, ['anomaly_reason', 'anomaly_score']] += ["; Odd Login Hour", 0.2]
-
-    for i in range(1, len(user_df)):
-        prev = user_df.loc[i - 1]
-        curr = user_df.loc[i]
-        loc1 = (prev['lat'], prev['lon'])
-        loc2 = (curr['lat'], curr['lon'])
-        time_diff_hr = (curr['timestamp'] - prev['timestamp']).total_seconds() / 3600
-        if time_diff_hr > 0:
-            distance_km = geodesic(loc1, loc2).km
-            speed = distance_km / time_diff_hr
-            if speed > 500:
-                user_df.loc[i, 'anomaly_reason'] += "; High GeoVelocity"
-                user_df.loc[i, 'anomaly_score'] += 0.3
-
-    user_df['anomaly_score'] = user_df['anomaly_score'].clip(upper=1.0)
-    anomalies = user_df[user_df['anomaly_score'] > 0.4].copy().reset_index(drop=True)
+    # Both scores are shown either way; this picks which one decides what is listed
+    score_column = FLAG_SCORES[st.radio("Flag by", list(FLAG_SCORES), horizontal=True)]
+    anomalies = user_anomalies(user_id, version, start, end, score_column)
 
     def highlight_risk(row):
-        if row['anomaly_score'] > 0.7:
+        if row[score_column] > RISK_HIGH:
             return ['background-color: red'] * len(row)
-        elif row['anomaly_score'] > 0.4:
+        elif row[score_column] > RISK_MEDIUM:
             return ['background-color: orange'] * len(row)
         else:
             return ['background-color: lightgreen'] * len(row)
 
     st.markdown("### ⚠️ Anomalies Detected (with Risk Levels)")
 
-    selected_index = st.selectbox("Select an anomaly row to explain:", anomalies.index)
-    st.dataframe(anomalies[['timestamp', 'device_type', 'login_method', 'channel', 'login_hour', 'lat', 'lon', 'anomaly_reason', 'anomaly_score']].style.apply(highlight_risk, axis=1))
+    page = paged_dataframe(anomalies[ANOMALY_COLUMNS], "anomalies", style=highlight_risk)
+    selected_index = st.selectbox("Select an anomaly row to explain:", page.index)
 
     if selected_index is not None and selected_index in anomalies.index:
         st.markdown("#### 🧾 Explanation for Selected Anomaly")
         selected_row = anomalies.loc[selected_index]
-        for col in ['timestamp', 'device_type', 'login_method', 'channel', 'login_hour', 'lat', 'lon', 'anomaly_reason', 'anomaly_score']:
+        for col in ANOMALY_COLUMNS:
             st.write(f"**{col}**: {selected_row[col]}")
 
+    # Toggles rather than expanders: a collapsed expander still builds its content
+    # Everything the user did, across tables
+    if st.toggle("🧭 Activity Timeline"):
+        paged_dataframe(user_events(user_id, version, start, end), "timeline", hide_index=True)
+
     # Raw data toggle
-    with st.expander("📄 Show Raw Login Data"):
-        st.dataframe(user_df)
+    if st.toggle("📄 Show Raw Login Data"):
+        paged_dataframe(format_ip_columns(user_df), "raw_logins")
 
-# --- SESSION ACTIVITY TAB --- #
-with session_tab:
+
+# --- SESSION ACTIVITY VIEW --- #
+@st.fragment
+@timed("view:session")
+def session_view(user_id, start, end):
     st.header(f"Session Activity for {user_id}")
-    user_sessions = session_df[session_df['user_id'] == user_id]
+    user_sessions = user_rows("session", user_id, version, start, end)
 
     st.subheader("Session Duration Stats")
     st.metric("Average Duration (s)", round(user_sessions['session_duration_sec'].mean(), 2))
 
+    st.subheader("🧭 Navigation Paths")
+    unusual = user_sessions['unusual_path']
+    col1, col2 = st.columns(2)
+    col1.metric("Unusual Paths", int(unusual.sum()))
+    col2.metric("Avg. Pages per Session", round(user_sessions['path_length'].mean(), 2))
+
+    st.markdown("**Page transition probabilities** (row: from, column: to)")
+    st.dataframe(transition_matrix(user_sessions).style.format("{:.2f}").background_gradient(cmap="Reds", axis=None))
+
+    def highlight_path(row):
+        return ['background-color: orange' if row['unusual_path'] else ''] * len(row)
+
     st.subheader("Pages Visited")
-    st.dataframe(user_sessions[['timestamp', 'session_duration_sec', 'pages_visited']])
+    paths = user_sessions[SESSION_COLUMNS].assign(pages_visited=format_pages(user_sessions['pages_visited']))
+    paged_dataframe(paths, "sessions", style=highlight_path)
 
-# --- TRANSACTION TAB --- #
-with transaction_tab:
+
+# --- TRANSACTION VIEW --- #
+@st.fragment
+@timed("view:transaction")
+def transaction_view(user_id, start, end):
     st.header(f"Transactions for {user_id}")
-    user_txn = transaction_df[transaction_df['user_id'] == user_id]
+    user_txn = user_rows("transaction", user_id, version, start, end)
 
     st.metric("Total Transactions", len(user_txn))
     st.metric("Avg. Amount", round(user_txn['amount'].mean(), 2))
+    after_risky_login = user_txn['login_score'] > RISK_MEDIUM
+    st.metric("Amount After Risky Logins", round(user_txn.loc[after_risky_login, 'amount'].sum(), 2))
 
     st.subheader("Transaction Breakdown")
     col1, col2 = st.columns(2)
@@ -170,12 +246,30 @@ with transaction_tab:
     with col2:
         st.bar_chart(user_txn['method'].value_counts())
 
-    st.dataframe(user_txn)
+    st.subheader("⚠️ Transaction Risk")
+    flagged_txn = user_txn[user_txn['txn_risk_score'] > RISK_MEDIUM]
+    col3, col4, col5 = st.columns(3)
+    col3.metric("Flagged Transactions", len(flagged_txn))
+    col4.metric("Flagged Amount", round(flagged_txn['amount'].sum(), 2))
+    col5.metric("Max Robust Z", round(user_txn['amount_z'].max(), 2) if len(user_txn) else 0)
+
+    def highlight_txn_risk(row):
+        if row['txn_risk_score'] > RISK_HIGH:
+            return ['background-color: red'] * len(row)
+        elif row['txn_risk_score'] > RISK_MEDIUM:
+            return ['background-color: orange'] * len(row)
+        else:
+            return [''] * len(row)
+
+    paged_dataframe(user_txn[TRANSACTION_COLUMNS], "transactions", style=highlight_txn_risk)
 
-# --- FEATURE USAGE TAB --- #
-with feature_tab:
+
+# --- FEATURE USAGE VIEW --- #
+@st.fragment
+@timed("view:feature")
+def feature_view(user_id, start, end):
     st.header(f"Feature Usage for {user_id}")
-    user_features = feature_df[feature_df['user_id'] == user_id]
+    user_features = user_rows("feature", user_id, version, start, end)
 
     st.metric("Features Used", user_features['feature'].nunique())
 
@@ -183,7 +277,86 @@ with feature_tab:
     freq_df = user_features.groupby('feature')['frequency'].sum().sort_values(ascending=False)
     st.bar_chart(freq_df)
 
-    st.dataframe(user_features)
+    paged_dataframe(user_features, "features")
+
+
+# --- RISK OVERVIEW VIEW --- #
+@st.fragment
+@timed("view:overview")
+def overview_view():
+    st.header("Riskiest Users")
+
+    col1, col2, col3, col4 = st.columns(4)
+    window = col1.selectbox("Time window", list(TIME_WINDOWS))
+    sort_by = col2.selectbox("Sort by", ['max_score', 'mean_score', 'anomalies', 'logins', 'last_anomaly'])
+    order = col3.radio("Order", ["Descending", "Ascending"], horizontal=True)
+    page_size = col4.selectbox("Rows per page", [25, 50, 100])
+
+    board = risk_leaderboard(TIME_WINDOWS[window], version)
+    col5, col6, col7 = st.columns(3)
+    col5.metric("Users", len(board))
+    col6.metric("Users with anomalies", int((board['anomalies'] > 0).sum()))
+    col7.metric("High-risk users", int((board['max_score'] > RISK_HIGH).sum()))
+
+    pages = max(1, -(-len(board) // page_size))
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1)
+    top, _ = top_users(board, sort_by, ascending=order == "Ascending", page=page, page_size=page_size)
+
+    def highlight_max_risk(row):
+        if row['max_score'] > RISK_HIGH:
+            return ['background-color: red'] * len(row)
+        elif row['max_score'] > RISK_MEDIUM:
+            return ['background-color: orange'] * len(row)
+        else:
+            return ['background-color: lightgreen'] * len(row)
+
+    st.dataframe(top.style.apply(highlight_max_risk, axis=1), hide_index=True)
+
+
+# --- ACCOUNT LINKS VIEW --- #
+@st.fragment
+@timed("view:links")
+def links_view(user_id):
+    st.header(f"Accounts Sharing Infrastructure with {user_id}")
+    shared, cluster, keys = user_links(user_id, version)
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Directly Linked Accounts", len(shared))
+    col2.metric("Cluster Size", len(cluster))
+    col3.metric("Keys Seen", len(keys))
+
+    st.subheader("Shared IPs / Fingerprints")
+    paged_dataframe(shared, "shared_accounts", hide_index=True)
+    if len(cluster) > 1:
+        st.caption("Cluster: " + ", ".join(cluster))
+
+    st.subheader("This User's Keys")
+    paged_dataframe(keys, "user_keys", hide_index=True)
+
+    st.subheader("🕸️ New Account Clusters")
+    window = st.selectbox("Window", list(LINK_WINDOWS))
+    clusters, bursts = linked_clusters(LINK_WINDOWS[window], version)
+    col4, col5 = st.columns(2)
+    with col4:
+        st.markdown("**Clusters that grew**")
+        paged_dataframe(clusters, "new_clusters", hide_index=True)
+    with col5:
+        st.markdown("**Keys that spread to new accounts**")
+        paged_dataframe(bursts, "key_bursts", hide_index=True)
+
+
+if view == VIEWS[0]:
+    login_view(user_id, start, end)
+elif view == VIEWS[1]:
+    session_view(user_id, start, end)
+elif view == VIEWS[2]:
+    transaction_view(user_id, start, end)
+elif view == VIEWS[3]:
+    feature_view(user_id, start, end)
+elif view == VIEWS[4]:
+    overview_view()
+else:
+    links_view(user_id)
 
 # --- SYNC BUTTON --- #
 st.markdown("---")
@@ -193,27 +366,36 @@ sync_button = st.button("📥 Sync Now", type="primary")
 
 if sync_button:
     try:
-        new_data = pd.read_excel("code/src/synthetic_logs/AData.xlsx")
-        required_columns = [
-            'user_id', 'timestamp', 'device_type', 'os_browser', 'screen_resolution',
-            'ip', 'lat', 'lon', 'city', 'login_method', 'channel'
-        ]
-
-        # Validate column structure
-        if set(required_columns) <= set(new_data.columns):
-            new_data = new_data[required_columns]
-
-            # Append to existing Excel
-            existing_df = pd.read_excel("code/src/synthetic_logs/synthetic_login_metadata.xlsx")
-            combined_df = pd.concat([existing_df, new_data], ignore_index=True)
-
-            # Save back
-            combined_df.to_excel("code/src/synthetic_logs/synthetic_login_metadata.xlsx", index=False)
-            st.success("✅ Data synced successfully!")
-
-            # Refresh the page
-            st.rerun()
+        # Append-only: validates, skips rows already stored and refreshes only the affected users
+        with span("sync") as timing:
+            # Private copies from disk: the cached ones are shared with every other session
+            result = sync_logins(f"{LOG_DIR}/AData.xlsx", **saved_state())
+            timing.rows = result['added']
+        if result['added'] or result['rebuilt']:
+            # New snapshot version: sessions switch on their next rerun, nothing is cleared under them.
+            # Its cached state is the current one with just the synced users' rescored rows merged in,
+            # unless the sync first had to catch up with rows an interrupted sync left behind
+            published = publish()
+            if not result['rebuilt']:
+                apply_sync(version, published, result['scores'])
+        if result['rebuilt']:
+            st.warning(f"Rebuilt {', '.join(result['rebuilt'])} to cover logins an interrupted sync had stored")
+        if result['added']:
+            st.success(
+                f"✅ Synced {result['added']} new logins for {len(result['affected_users'])} users "
+                f"({result['duplicates']} duplicates skipped, {result['rejected']} invalid rows dropped)"
+            )
+            rescored = result['scores']
+            st.dataframe(
+                rescored.groupby('user_id', observed=True)['anomaly_score']
+                .agg(logins='count', anomalies=lambda s: int((s > RISK_MEDIUM).sum()), max_score='max')
+            )
         else:
-            st.error(f"❌ Invalid file structure. Missing columns: {set(required_columns) - set(new_data.columns)}")
+            st.info(f"Nothing new to sync ({result['duplicates']} duplicates skipped, {result['rejected']} invalid rows dropped)")
+    except SchemaError as e:
+        st.error(f"❌ {e}")
     except Exception as e:
         st.error(f"❌ Error syncing data: {e}")
+
+# Timings panel (only while debug timings are on)
+instrumentation.debug_sidebar(run)
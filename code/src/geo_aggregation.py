@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+from anomaly_scoring import RISK_MEDIUM
+from geo_velocity import compute_geo_velocity
+from user_index import UserIndex
+
+# Server-side binning of login locations for the map.
+# Coordinates are snapped to a lat/lon grid at a few detail levels, per user and for the whole
+# population, so the map only receives one row per occupied cell however long the history is.
+# Impossible-travel legs (consecutive logins above the geo-velocity threshold) are grouped by
+# (from cell, to cell) the same way and drawn as arcs.
+
+# Detail level -> cell edge in degrees
+GRID_LEVELS = {
+    "country": 4.0,
+    "region": 1.0,
+    "city": 0.25,
+}
+# Initial pydeck zoom that suits each level
+LEVEL_ZOOM = {"country": 3, "region": 5, "city": 7}
+
+KM_PER_DEGREE = 111.32
+
+
+def cell_ids(lat, lon, size):
+    # Row-major cell number on a global grid of `size`-degree cells
+    n_cols = int(np.ceil(360 / size))
+    rows = np.floor((np.asarray(lat, dtype=float) + 90) / size).astype(np.int64)
+    cols = np.floor((np.asarray(lon, dtype=float) + 180) / size).astype(np.int64) % n_cols
+    return rows * n_cols + cols
+
+
+def cell_centers(ids, size):
+    n_cols = int(np.ceil(360 / size))
+    ids = np.asarray(ids, dtype=np.int64)
+    return (ids // n_cols + 0.5) * size - 90, (ids % n_cols + 0.5) * size - 180
+
+
+def cell_radius_m(level):
+    # Half a cell edge at the equator, for column/hexagon radius
+    return GRID_LEVELS[level] * KM_PER_DEGREE * 1000 / 2
+
+
+def travel_legs(df, key='user_id'):
+    # One row per consecutive login pair above the geo-velocity threshold
+    ordered = df.sort_values([key, 'timestamp'], kind='stable')
+    velocity = compute_geo_velocity(ordered, key=key)
+    lat = ordered['lat'].to_numpy(dtype=float)
+    lon = ordered['lon'].to_numpy(dtype=float)
+    flagged = np.flatnonzero(velocity['high_geovelocity'].to_numpy())
+    return pd.DataFrame({
+        key: ordered[key].array[flagged],
+        'timestamp': ordered['timestamp'].iloc[flagged].to_numpy(),
+        'from_lat': lat[flagged - 1],
+        'from_lon': lon[flagged - 1],
+        'to_lat': lat[flagged],
+        'to_lon': lon[flagged],
+        'speed_kmh': velocity['speed_kmh'].to_numpy()[flagged],
+    })
+
+
+def _bin_logins(df, size, key):
+    binned = pd.DataFrame({
+        key: df[key].array,
+        'cell': cell_ids(df['lat'], df['lon'], size),
+        'anomalous': df['anomaly_score'].to_numpy() > RISK_MEDIUM if 'anomaly_score' in df.columns else False,
+    })
+    return binned.groupby([key, 'cell'], observed=True).agg(
+        logins=('anomalous', 'size'),
+        anomalies=('anomalous', 'sum'),
+    ).reset_index()
+
+
+def _with_centers(cells, size):
+    lat, lon = cell_centers(cells['cell'], size)
+    return cells.assign(lat=lat, lon=lon)[['lat', 'lon', 'logins', 'anomalies']].reset_index(drop=True)
+
+
+def _group_legs(legs, size):
+    if not len(legs):
+        return pd.DataFrame(columns=['from_lat', 'from_lon', 'to_lat', 'to_lon', 'legs', 'max_speed_kmh'])
+    pairs = legs.assign(
+        from_cell=cell_ids(legs['from_lat'], legs['from_lon'], size),
+        to_cell=cell_ids(legs['to_lat'], legs['to_lon'], size),
+    ).groupby(['from_cell', 'to_cell']).agg(legs=('speed_kmh', 'size'), max_speed_kmh=('speed_kmh', 'max')).reset_index()
+    from_lat, from_lon = cell_centers(pairs['from_cell'], size)
+    to_lat, to_lon = cell_centers(pairs['to_cell'], size)
+    return pd.DataFrame({
+        'from_lat': from_lat, 'from_lon': from_lon, 'to_lat': to_lat, 'to_lon': to_lon,
+        'legs': pairs['legs'].to_numpy(), 'max_speed_kmh': pairs['max_speed_kmh'].to_numpy(),
+    })
+
+
+class GeoGrid:
+    def __init__(self, df, key='user_id', levels=GRID_LEVELS):
+        self.levels = dict(levels)
+        self.user_cells = {}
+        self.global_cells = {}
+        for level, size in self.levels.items():
+            per_user = _bin_logins(df, size, key)
+            self.user_cells[level] = UserIndex(per_user, key=key, sort_by='cell')
+            totals = per_user.groupby('cell')[['logins', 'anomalies']].sum().reset_index()
+            self.global_cells[level] = _with_centers(totals, size)
+        self.legs = UserIndex(travel_legs(df, key), key=key)
+
+    def cells(self, level, user_id=None):
+        # Occupied cells with login / anomaly counts, for one user or everyone
+        if user_id is None:
+            return self.global_cells[level]
+        return _with_centers(self.user_cells[level].get(user_id), self.levels[level])
+
+    def arcs(self, level, user_id=None):
+        legs = self.legs.frame if user_id is None else self.legs.get(user_id)
+        return _group_legs(legs, self.levels[level])
@@ -0,0 +1,293 @@
+import contextvars
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+import pandas as pd
+
+from log_store import LOG_DIR
+
+# Named timing spans and counters for the hot paths of the apps.
+# Each span records wall time, rows processed and the change in resident memory; nested spans
+# are named by their path ("view:login/score_batch"). Records can be appended to a JSON-lines
+# file, summarised in Prometheus text format, or shown in the dashboards' debug sidebar.
+# Disabled by default: span() then hands back one shared no-op context manager and count()
+# returns straight away. FRAUD_METRICS=1 turns it on for every run; begin_run(enabled=...) or
+# enable() for the current context only. The run and its switch live in a context variable, so
+# concurrent Streamlit sessions (one script thread each) neither toggle nor mix each other's spans.
+
+METRICS_PATH = os.path.join(LOG_DIR, "metrics", "spans.jsonl")
+PROMETHEUS_PATH = os.path.join(LOG_DIR, "metrics", "metrics.prom")
+MAX_RECORDS = 10_000
+# Runs whose counters are kept for counters(run)
+MAX_RUNS = 100
+
+_default_enabled = os.environ.get("FRAUD_METRICS", "") not in ("", "0")
+# (run id, enabled) of the current context; None until begin_run() / enable()
+_current = contextvars.ContextVar("instrumentation_run", default=None)
+_lock = threading.Lock()
+_local = threading.local()
+_records = []
+_flushed = 0
+# Process totals for the Prometheus export, and per-run counts for the sidebar
+_counters = defaultdict(float)
+_run_counters = OrderedDict()
+# Per span name: calls, seconds, rows, memory change; survives the trimming of _records
+_totals = defaultdict(lambda: [0, 0.0, 0, 0])
+_last_run = 0
+
+
+def _state():
+    return _current.get() or (0, _default_enabled)
+
+
+def enabled():
+    return _state()[1]
+
+
+def enable(on=True):
+    # Current context only (this run, or the next begin_run() in it)
+    _current.set((_state()[0], bool(on)))
+
+
+def _rss_bytes():
+    # Current resident set size; peak RSS where /proc isn't available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class Span:
+    __slots__ = ('name', 'rows', 'run', '_start', '_rss')
+
+    def __init__(self, name, rows=None, run=0):
+        self.name = name
+        self.rows = rows
+        self.run = run
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        if stack:
+            self.name = f"{stack[-1].name}/{self.name}"
+        stack.append(self)
+        self._rss = _rss_bytes()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        _local.stack.pop()
+        _record({
+            'run': self.run,
+            'span': self.name,
+            'seconds': elapsed,
+            'rows': self.rows,
+            'rss_delta_bytes': _rss_bytes() - self._rss,
+            'error': exc_type.__name__ if exc_type else None,
+            'time': time.time(),
+        })
+        return False
+
+
+class _NoopSpan:
+    # Shared stand-in while disabled; setting .rows on it is harmless
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    @property
+    def rows(self):
+        return None
+
+    @rows.setter
+    def rows(self, value):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name, rows=None):
+    # with span("score_batch", rows=len(df)) as s: ...   (or set s.rows inside the block)
+    run, on = _state()
+    if not on:
+        return _NOOP
+    return Span(name, rows, run)
+
+
+def timed(name=None):
+    # Decorator form of span(); rows are taken from the result when it has a length
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            run, on = _state()
+            if not on:
+                return fn(*args, **kwargs)
+            with Span(label, run=run) as s:
+                result = fn(*args, **kwargs)
+                if hasattr(result, '__len__'):
+                    s.rows = len(result)
+                return result
+
+        return wrapper
+    return decorate
+
+
+def count(name, value=1):
+    run, on = _state()
+    if not on:
+        return
+    with _lock:
+        _counters[name] += value
+        per_run = _run_counters.setdefault(run, defaultdict(float))
+        per_run[name] += value
+
+
+def _record(record):
+    global _flushed
+    with _lock:
+        _records.append(record)
+        totals = _totals[record['span']]
+        totals[0] += 1
+        totals[1] += record['seconds']
+        totals[2] += record['rows'] or 0
+        totals[3] += record['rss_delta_bytes']
+        if len(_records) > MAX_RECORDS:
+            # Keep the newest records; anything unflushed that falls off is simply lost
+            drop = len(_records) - MAX_RECORDS
+            del _records[:drop]
+            _flushed = max(0, _flushed - drop)
+
+
+def begin_run(enabled=None):
+    # Mark the start of a script run (a Streamlit rerun, a CLI invocation) in the current context;
+    # enabled=None keeps the context's setting
+    global _last_run
+    on = _state()[1] if enabled is None else bool(enabled)
+    with _lock:
+        _last_run += 1
+        run = _last_run
+        _run_counters[run] = defaultdict(float)
+        while len(_run_counters) > MAX_RUNS:
+            _run_counters.popitem(last=False)
+    _current.set((run, on))
+    return run
+
+
+def records(run=None):
+    with _lock:
+        return [r for r in _records if run is None or r['run'] == run]
+
+
+def counters(run=None):
+    # Totals since the last reset, or one run's counts
+    with _lock:
+        return dict(_counters if run is None else _run_counters.get(run, {}))
+
+
+def reset():
+    global _flushed
+    with _lock:
+        _records.clear()
+        _counters.clear()
+        _run_counters.clear()
+        _totals.clear()
+        _flushed = 0
+
+
+def summary(run=None):
+    # One row per span name: calls, total / mean / max time, rows and memory change
+    df = pd.DataFrame(records(run), columns=['span', 'seconds', 'rows', 'rss_delta_bytes'])
+    if df.empty:
+        return pd.DataFrame(columns=['span', 'calls', 'total_ms', 'mean_ms', 'max_ms', 'rows', 'rss_delta_mb'])
+    grouped = df.groupby('span', sort=False)
+    table = pd.DataFrame({
+        'calls': grouped.size(),
+        'total_ms': grouped['seconds'].sum() * 1000,
+        'mean_ms': grouped['seconds'].mean() * 1000,
+        'max_ms': grouped['seconds'].max() * 1000,
+        'rows': grouped['rows'].sum(min_count=1),
+        'rss_delta_mb': grouped['rss_delta_bytes'].sum() / 2 ** 20,
+    }).reset_index()
+    return table.sort_values('total_ms', ascending=False, ignore_index=True)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text():
+    # Cumulative totals since the last reset, in the Prometheus text exposition format
+    with _lock:
+        totals = {name: list(values) for name, values in _totals.items()}
+        counter_values = dict(_counters)
+    metrics = [
+        ('fraud_span_calls_total', "Completed spans"),
+        ('fraud_span_seconds_total', "Wall time spent in the span"),
+        ('fraud_span_rows_total', "Rows processed in the span"),
+        ('fraud_span_rss_delta_bytes_total', "Change in resident memory across the span"),
+    ]
+    lines = []
+    for position, (metric, help_text) in enumerate(metrics):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for name in sorted(totals):
+            lines.append(f'{metric}{{span="{_label(name)}"}} {float(totals[name][position]):g}')
+    lines += ["# HELP fraud_counter_total Named event counters", "# TYPE fraud_counter_total counter"]
+    for name, value in sorted(counter_values.items()):
+        lines.append(f'fraud_counter_total{{name="{_label(name)}"}} {value:g}')
+    return "\n".join(lines) + "\n"
+
+
+def flush(path=METRICS_PATH, prometheus_path=PROMETHEUS_PATH):
+    # Append records not yet written to the JSON-lines file and rewrite the Prometheus snapshot
+    global _flushed
+    with _lock:
+        pending = _records[_flushed:]
+        _flushed = len(_records)
+    if not pending and not _counters:
+        return 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        for record in pending:
+            f.write(json.dumps(record) + "\n")
+    if prometheus_path:
+        os.makedirs(os.path.dirname(prometheus_path), exist_ok=True)
+        with open(prometheus_path + ".tmp", "w") as f:
+            f.write(prometheus_text())
+        os.replace(prometheus_path + ".tmp", prometheus_path)
+    return len(pending)
+
+
+def debug_sidebar(run):
+    # Optional Streamlit panel with this run's spans; call at the end of the script
+    import streamlit as st
+
+    if not enabled():
+        return
+    with st.sidebar.expander("🐞 Timings", expanded=True):
+        table = summary(run)
+        # Nested spans are already inside their parent's time
+        top_level = table.loc[~table['span'].str.contains("/", regex=False), 'total_ms'].sum()
+        st.caption(f"{top_level:.0f} ms in {int(table['calls'].sum())} spans this run")
+        st.dataframe(table, hide_index=True)
+        run_counters = counters(run)
+        if run_counters:
+            st.json(run_counters)
+        st.caption(f"Written to {METRICS_PATH}")
+    flush()
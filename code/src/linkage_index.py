@@ -0,0 +1,309 @@
+import bisect
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import log_store
+from schema import format_ips
+
+# Cross-user linkage over shared infrastructure.
+# An inverted index maps each IP, device fingerprint (os_browser + screen_resolution) and city
+# to the users seen with it (first / last seen, login count). Users sharing a linking key are
+# joined in a union-find, so "which accounts share infrastructure with this user" is a dict
+# lookup and the account ring around a user is one find(). Keys shared by a large part of the
+# population (a popular browser build, a city) say nothing about rings and don't link.
+# Ingest is incremental: new logins only touch their own (key, user) pairs; the union-find
+# is rebuilt from the index only when a key crosses the sharing limit, which is rare. All of
+# that happens inside ingest: lookups never modify the index, so one built index can be shared
+# by concurrent readers. The saved file records the login table version it covers.
+
+LINKAGE_FILE = "linkage_index.parquet"
+VERSION_KEY = b"login_version"
+
+LINK_KEYS = {
+    # kind: (login columns, joins accounts in the union-find)
+    "ip": (["ip"], True),
+    "fingerprint": (["os_browser", "screen_resolution"], True),
+    "city": (["city"], False),
+}
+# A key links accounts while it has at most this many users...
+MAX_LINK_USERS = 50
+# ...and at most this share of the population
+MAX_LINK_SHARE = 0.05
+MIN_LINK_USERS = 2
+
+LINK_WINDOW = pd.Timedelta(hours=1)
+
+PAIR_COLUMNS = ['kind', 'key', 'user_id', 'first_seen', 'last_seen', 'logins']
+
+
+def linkage_path():
+    # Follows log_store.use_store()
+    return os.path.join(log_store.STORE_DIR, LINKAGE_FILE)
+
+
+def key_pairs(df):
+    # One row per (kind, key, user) with first / last seen and login count
+    frames = []
+    for kind, (columns, _) in LINK_KEYS.items():
+        grouped = df.groupby([*columns, 'user_id'], observed=True)['timestamp'].agg(['min', 'max', 'size']).reset_index()
+        values = [
+            format_ips(grouped[col]) if pd.api.types.is_integer_dtype(grouped[col].dtype) else grouped[col].astype(str)
+            for col in columns
+        ]
+        key = pd.Series(values[0], dtype=object)
+        for more in values[1:]:
+            key = key + " | " + pd.Series(more, dtype=object)
+        frames.append(pd.DataFrame({
+            'kind': kind,
+            'key': key.to_numpy(),
+            'user_id': grouped['user_id'].astype(str).to_numpy(),
+            'first_seen': grouped['min'].array,
+            'last_seen': grouped['max'].array,
+            'logins': grouped['size'].to_numpy(),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+class LinkageIndex:
+    def __init__(self):
+        # (kind, key) -> {user: [first_seen, last_seen, logins]}
+        self.keys = {}
+        # user -> set of (kind, key)
+        self.user_keys = {}
+        # Union-find over users
+        self.parent = {}
+        self.members = {}
+        self.limit = MIN_LINK_USERS
+        self._stale = False
+        # (first_seen, kind, key, user) of every pair, ordered by first_seen, for "new since" queries
+        self._first_seen = []
+        self._timeline = []
+        self.total_logins = 0
+        self.latest = None
+        # Login table version the index covers, when known
+        self.version = None
+
+    # --- union-find --- #
+
+    def _find(self, user):
+        # Root of `user`, compressing the path on the way; updates only
+        parent = self.parent
+        root = user
+        while parent[root] != root:
+            root = parent[root]
+        while parent[user] != root:
+            parent[user], user = root, parent[user]
+        return root
+
+    def _root(self, user):
+        # Root of `user` without touching the tree, for lookups; union by size keeps paths short
+        parent = self.parent
+        while parent[user] != user:
+            user = parent[user]
+        return user
+
+    def _union(self, a, b):
+        a, b = self._find(a), self._find(b)
+        if a == b:
+            return
+        if len(self.members[a]) < len(self.members[b]):
+            a, b = b, a
+        self.parent[b] = a
+        self.members[a].extend(self.members.pop(b))
+
+    def _links(self, kind, users):
+        return LINK_KEYS[kind][1] and len(users) <= self.limit
+
+    def _rebuild(self):
+        self.parent = {user: user for user in self.user_keys}
+        self.members = {user: [user] for user in self.user_keys}
+        for (kind, _), users in self.keys.items():
+            if self._links(kind, users):
+                first, *rest = users
+                for user in rest:
+                    self._union(first, user)
+        self._stale = False
+
+    # --- updates --- #
+
+    def ingest(self, df):
+        # New logins (user_id, timestamp, ip, os_browser, screen_resolution, city)
+        if df.empty:
+            return 0
+        self.total_logins += len(df)
+        return self._add_pairs(key_pairs(df))
+
+    def _add_pairs(self, pairs):
+        fresh = []
+        for kind, key, user, first, last, logins in pairs[PAIR_COLUMNS].itertuples(index=False):
+            users = self.keys.setdefault((kind, key), {})
+            seen = users.get(user)
+            if seen is not None:
+                seen[0] = min(seen[0], first)
+                seen[1] = max(seen[1], last)
+                seen[2] += logins
+                continue
+            users[user] = [first, last, logins]
+            if user not in self.user_keys:
+                self.user_keys[user] = set()
+                self.parent[user] = user
+                self.members[user] = [user]
+            self.user_keys[user].add((kind, key))
+            fresh.append((first, kind, key, user))
+            if not self._stale and LINK_KEYS[kind][1]:
+                if len(users) == self.limit + 1:
+                    # Key just became too common: its earlier links no longer hold
+                    self._stale = True
+                elif len(users) <= self.limit and len(users) > 1:
+                    self._union(user, next(iter(users)))
+
+        limit = max(MIN_LINK_USERS, min(MAX_LINK_USERS, int(MAX_LINK_SHARE * len(self.user_keys))))
+        if limit != self.limit:
+            self.limit = limit
+            self._stale = True
+        if self._stale:
+            self._rebuild()
+
+        if fresh:
+            # Ingest runs in time order, so this is almost always an append
+            fresh.sort(key=lambda item: item[0])
+            for first, kind, key, user in fresh:
+                position = bisect.bisect_right(self._first_seen, first)
+                self._first_seen.insert(position, first)
+                self._timeline.insert(position, (kind, key, user))
+            latest = max(item[0] for item in fresh)
+            self.latest = latest if self.latest is None else max(self.latest, latest)
+        return len(fresh)
+
+    # --- lookups --- #
+
+    def cluster(self, user):
+        # Every account connected to `user` through linking keys, `user` included
+        if user not in self.parent:
+            return []
+        return sorted(self.members[self._root(user)])
+
+    def keys_of(self, user):
+        rows = []
+        for kind, key in sorted(self.user_keys.get(user, ())):
+            users = self.keys[(kind, key)]
+            first, last, logins = users[user]
+            rows.append((kind, key, len(users), self._links(kind, users), first, last, logins))
+        return pd.DataFrame(rows, columns=['kind', 'key', 'users', 'links', 'first_seen', 'last_seen', 'logins'])
+
+    def shared_with(self, user):
+        # Accounts that share at least one key with `user`, most shared keys first
+        root = self._root(user) if user in self.parent else None
+        shared = {}
+        for kind, key in self.user_keys.get(user, ()):
+            users = self.keys[(kind, key)]
+            if len(users) > self.limit:
+                # A popular browser build or a whole city: not worth listing
+                continue
+            for other in users:
+                if other != user:
+                    shared.setdefault(other, []).append(f"{kind}: {key}")
+        rows = [
+            (other, len(keys), "; ".join(sorted(keys)), self._root(other) == root)
+            for other, keys in shared.items()
+        ]
+        df = pd.DataFrame(rows, columns=['user_id', 'shared_keys', 'keys', 'same_cluster'])
+        return df.sort_values(['shared_keys', 'user_id'], ascending=[False, True], ignore_index=True)
+
+    def _since(self, window, now):
+        now = self.latest if now is None else now
+        if now is None:
+            return []
+        start = bisect.bisect_left(self._first_seen, now - window)
+        return list(zip(self._first_seen[start:], self._timeline[start:]))
+
+    def new_clusters(self, window=LINK_WINDOW, now=None, min_size=2):
+        # Clusters that gained links within `window` of the latest login, largest first
+        grown = {}
+        for first, (kind, key, user) in self._since(window, now):
+            users = self.keys[(kind, key)]
+            if not self._links(kind, users) or len(users) < 2:
+                continue
+            root = self._root(user)
+            entry = grown.setdefault(root, {'new_users': set(), 'keys': set(), 'last_link': first})
+            entry['new_users'].add(user)
+            entry['keys'].add(f"{kind}: {key}")
+            entry['last_link'] = max(entry['last_link'], first)
+        rows = [
+            (root, len(self.members[root]), len(entry['new_users']), len(entry['keys']),
+             "; ".join(sorted(entry['keys'])[:5]), entry['last_link'])
+            for root, entry in grown.items()
+            if len(self.members[root]) >= min_size
+        ]
+        df = pd.DataFrame(rows, columns=['cluster', 'size', 'new_users', 'new_keys', 'keys', 'last_link'])
+        return df.sort_values(['size', 'new_users'], ascending=False, ignore_index=True)
+
+    def key_bursts(self, window=LINK_WINDOW, now=None, min_users=2):
+        # Keys that appeared for several new accounts within `window`, whether or not they link
+        counts = {}
+        for _, (kind, key, user) in self._since(window, now):
+            counts.setdefault((kind, key), set()).add(user)
+        rows = [
+            (kind, key, len(users), len(self.keys[(kind, key)]))
+            for (kind, key), users in counts.items()
+            if len(users) >= min_users
+        ]
+        df = pd.DataFrame(rows, columns=['kind', 'key', 'new_users', 'total_users'])
+        return df.sort_values(['new_users', 'total_users'], ascending=False, ignore_index=True)
+
+    # --- persistence --- #
+
+    def pairs(self):
+        rows = [
+            (kind, key, user, first, last, logins)
+            for (kind, key), users in self.keys.items()
+            for user, (first, last, logins) in users.items()
+        ]
+        return pd.DataFrame(rows, columns=PAIR_COLUMNS)
+
+    def save(self, path=None):
+        path = path or linkage_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(self.pairs(), preserve_index=False)
+        if self.version is not None:
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), VERSION_KEY: self.version.encode()})
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or linkage_path()
+        table = pq.read_table(path)
+        pairs = table.to_pandas()
+        index = cls()
+        version = (table.schema.metadata or {}).get(VERSION_KEY)
+        index.version = version.decode() if version else None
+        if len(pairs):
+            # Every login has exactly one IP pair
+            index.total_logins = int(pairs.loc[pairs['kind'] == "ip", 'logins'].sum())
+            index._add_pairs(pairs)
+        return index
+
+    @classmethod
+    def build(cls, login_df):
+        index = cls()
+        index.ingest(login_df)
+        return index
+
+
+def load_or_build(login_df, version, path=None):
+    path = path or linkage_path()
+    # Reuse the index saved for this login table version, otherwise rebuild once and save.
+    # Either way it is fully linked on return and read-only from here on
+    if os.path.exists(path):
+        index = LinkageIndex.load(path)
+        if index.version == version:
+            return index
+    index = LinkageIndex.build(login_df)
+    index.version = version
+    index.save(path)
+    return index
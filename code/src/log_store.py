@@ -0,0 +1,191 @@
+import hashlib
+import os
+import shutil
+import sys
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from schema import PAGE_COLUMNS, apply_schema, arrow_dtypes, format_ip_columns, pages_to_codes
+
+# Columnar store for the synthetic logs.
+# Each table lives under synthetic_logs/store/<table>/day=YYYY-MM-DD/part-*.parquet
+# with a native UTC timestamp column, dictionary-encoded (categorical) strings and session
+# page paths as list<uint8> page codes. Timestamps are written in microseconds whatever unit
+# they were parsed or generated in; parts from before the unit was pinned may hold nanoseconds,
+# so tables are read at that finest unit and cast down, and mixed parts always load.
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "synthetic_logs")
+STORE_DIR = os.path.join(LOG_DIR, "store")
+
+TABLES = ["login", "session", "transaction", "feature"]
+
+# Workbooks the tables were originally kept in
+EXCEL_SOURCES = {
+    "login": "synthetic_login_metadata.xlsx",
+    "session": "session_metadata.xlsx",
+    "transaction": "transaction_metadata.xlsx",
+    "feature": "feature_usage_logs.xlsx",
+}
+
+CATEGORICAL_COLUMNS = {
+    "login": ["user_id", "device_type", "os_browser", "screen_resolution", "ip", "city", "login_method", "channel"],
+    "session": ["user_id"],
+    "transaction": ["user_id", "transaction_type", "method"],
+    "feature": ["user_id", "feature"],
+    # Ground truth written by synthetic_generator.py (fraudulent rows only)
+    "login_labels": ["user_id", "ip", "fraud_pattern"],
+    "transaction_labels": ["user_id", "recipient", "fraud_pattern"],
+}
+
+PARTITION_COLUMN = "day"
+
+TIMESTAMP_UNIT = "us"
+TIMESTAMP_TYPE = pa.timestamp(TIMESTAMP_UNIT, tz="UTC")
+_READ_TIMESTAMP_TYPE = pa.timestamp("ns", tz="UTC")
+
+
+def use_store(path):
+    # Point the store at another directory (benchmarks, tests, scratch copies)
+    global STORE_DIR
+    STORE_DIR = path
+
+
+def table_path(table):
+    return os.path.join(STORE_DIR, table)
+
+
+def table_exists(table):
+    return os.path.isdir(table_path(table)) and len(list_parts(table)) > 0
+
+
+def list_parts(table):
+    parts = []
+    for root, _, files in os.walk(table_path(table)):
+        parts.extend(os.path.join(root, f) for f in files if f.endswith(".parquet"))
+    return sorted(parts)
+
+
+def table_version(table):
+    # Fingerprint of the part files (name, mtime, size); changes whenever the table is written or appended to
+    stats = []
+    for path in list_parts(table):
+        info = os.stat(path)
+        stats.append((os.path.relpath(path, STORE_DIR), info.st_mtime_ns, info.st_size))
+    return hashlib.sha1(repr(stats).encode()).hexdigest()[:16]
+
+
+def prepare_frame(df, table):
+    # Addresses are stored as dotted strings whatever their in-memory form
+    df = format_ip_columns(df)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True, format="ISO8601").dt.as_unit(TIMESTAMP_UNIT)
+    for col in CATEGORICAL_COLUMNS[table]:
+        if col in df.columns:
+            df[col] = df[col].astype(str).astype("category")
+    for col in PAGE_COLUMNS.get(table, []):
+        if col in df.columns:
+            df[col] = pages_to_codes(df[col])
+    return df
+
+
+def _write_partitions(df, directory):
+    os.makedirs(directory, exist_ok=True)
+    days = df['timestamp'].dt.strftime("%Y-%m-%d")
+    written = []
+    for day, part in df.groupby(days, sort=True):
+        part_dir = os.path.join(directory, f"{PARTITION_COLUMN}={day}")
+        os.makedirs(part_dir, exist_ok=True)
+        path = os.path.join(part_dir, f"part-{uuid.uuid4().hex}.parquet")
+        tmp_path = path + ".tmp"
+        pq.write_table(pa.Table.from_pandas(part, preserve_index=False), tmp_path)
+        # Readers only ever see complete files
+        os.replace(tmp_path, path)
+        written.append(path)
+    return written
+
+
+def write_table(df, table):
+    # Replace the whole table
+    df = prepare_frame(df, table)
+    target = table_path(table)
+    staging = target + f".staging-{uuid.uuid4().hex}"
+    _write_partitions(df, staging)
+    if os.path.isdir(target):
+        retired = target + f".old-{uuid.uuid4().hex}"
+        os.replace(target, retired)
+        os.replace(staging, target)
+        shutil.rmtree(retired, ignore_errors=True)
+    else:
+        os.makedirs(STORE_DIR, exist_ok=True)
+        os.replace(staging, target)
+    return len(df)
+
+
+def append_table(df, table):
+    # Add new part files next to the existing ones
+    df = prepare_frame(df, table)
+    _write_partitions(df, table_path(table))
+    return len(df)
+
+
+def open_dataset(table):
+    # The dataset schema comes from one part; pin its timestamp type so every part casts to it losslessly
+    path = table_path(table)
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    index = dataset.schema.get_field_index("timestamp")
+    if index < 0:
+        return dataset
+    schema = dataset.schema.set(index, pa.field("timestamp", _READ_TIMESTAMP_TYPE))
+    return ds.dataset(path, schema=schema, format="parquet", partitioning="hive")
+
+
+def projection(dataset, columns=None):
+    # Scanner columns (name -> expression) with the timestamp cast to TIMESTAMP_TYPE
+    if columns is None:
+        columns = [name for name in dataset.schema.names if name != PARTITION_COLUMN]
+    return {
+        name: ds.field(name).cast(TIMESTAMP_TYPE, safe=False) if name == "timestamp" else ds.field(name)
+        for name in columns
+    }
+
+
+def load_table(table, columns=None, filters=None):
+    if not table_exists(table):
+        raise FileNotFoundError(
+            f"No '{table}' table in {STORE_DIR}. Run `python code/src/log_store.py migrate` first."
+        )
+    dataset = open_dataset(table)
+    df = dataset.to_table(columns=projection(dataset, columns), filter=filters).to_pandas(types_mapper=arrow_dtypes)
+    # Part files each carry their own dictionary; map them onto the shared, sorted vocabulary
+    return apply_schema(df, table, CATEGORICAL_COLUMNS[table])
+
+
+def drop_unused_categories(df):
+    # Per-user slices keep the full vocabulary; trim it so value_counts/plots only show what the user has
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].cat.remove_unused_categories()
+    return df
+
+
+def migrate_from_excel(log_dir=LOG_DIR):
+    migrated = {}
+    for table, filename in EXCEL_SOURCES.items():
+        path = os.path.join(log_dir, filename)
+        if not os.path.exists(path):
+            print(f"Skipping {table}: {path} not found")
+            continue
+        migrated[table] = write_table(pd.read_excel(path), table)
+        print(f"Migrated {migrated[table]} rows from {filename} into {table_path(table)}")
+    return migrated
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        migrate_from_excel(sys.argv[2] if len(sys.argv) > 2 else LOG_DIR)
+    else:
+        print("Usage: python code/src/log_store.py migrate [excel_dir]")
@@ -0,0 +1,293 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from anomaly_scoring import GEO_VELOCITY_REASON, GEO_VELOCITY_WEIGHT, MAX_SCORE, score_batch
+from baseline_store import PROFILE_COLUMNS, BaselineStore
+from geo_velocity import DISTANCE_FUNCTIONS, SPEED_THRESHOLD_KMH
+from log_store import CATEGORICAL_COLUMNS, open_dataset, projection, table_exists, table_path, table_version
+from risk_aggregates import RiskAggregates, daily_aggregates
+from schema import apply_schema
+from time_index import as_utc, window_filter
+
+# Out-of-core profile building and scoring for histories larger than RAM. Two passes:
+#   1. baselines: BaselineStore counters are additive and don't care about row order, so the
+#                 table is streamed as row batches of `chunk_size` rows
+#   2. scoring:   needs time order, which an external sort provides. Each row batch is sorted by
+#                 time and spilled to a temporary Arrow run file; the runs are then merged k ways,
+#                 reading blocks of chunk_size / k rows of each, and re-cut into chunks of
+#                 exactly `chunk_size` rows. Each chunk is scored with score_batch against the
+#                 final baselines; the only rule that looks across rows is geo-velocity, so each
+#                 user's last login (time, lat, lon) is carried over the chunk boundary and their
+#                 first login in the next chunk is checked against it.
+# Scores and reasons are identical to score_batch over the whole table (or over the rows of a
+# [start, end) window, whose day partitions are the only ones opened): rows with equal timestamps
+# keep the table's row order through both the run sorts and the merge. Peak memory is per-user
+# state plus a few chunks' worth of rows, whatever the table size, as long as there are fewer
+# runs than rows per chunk (one run per chunk_size rows: a billion logins at the default
+# chunk_size make 5,000 runs). Pass 2 needs free disk for one lz4-compressed copy of the table.
+
+CHUNK_SIZE = 200_000
+
+# Pass 1 only needs the profile attributes (login_hour comes from the timestamp)
+BASELINE_INPUT_COLUMNS = ['user_id', 'timestamp', *(col for col in PROFILE_COLUMNS if col != 'login_hour')]
+
+# Pass 2's sorted runs are only read back once, so a fast codec is enough
+RUN_WRITE_OPTIONS = ipc.IpcWriteOptions(compression="lz4")
+
+
+def _dataset(table):
+    if not table_exists(table):
+        raise FileNotFoundError(f"No '{table}' table in {table_path(table)}")
+    return open_dataset(table)
+
+
+def _row_batches(dataset, batch_size, columns=None, window=None):
+    # Arrow tables of batch_size rows (the last one shorter) in table order, optionally only
+    # those matching `window`. Small files are gathered into one table; one batch is read ahead at a time
+    batches = dataset.to_batches(
+        columns=projection(dataset, columns), filter=window, batch_size=batch_size,
+        batch_readahead=1, fragment_readahead=1,
+    )
+    pending, rows = [], 0
+    for batch in batches:
+        pending.append(batch)
+        rows += batch.num_rows
+        if rows >= batch_size:
+            gathered = pa.Table.from_batches(pending)
+            full = rows // batch_size * batch_size
+            for offset in range(0, full, batch_size):
+                yield gathered.slice(offset, batch_size)
+            pending, rows = gathered.slice(full).to_batches(), rows - full
+    if rows:
+        yield pa.Table.from_batches(pending)
+
+
+def _frame(rows, table):
+    # A merged chunk holds pieces of many runs, each with its run's whole dictionary; re-encode
+    # so the categoricals (and the schema mapping, which works per category) cover just this chunk
+    for index, field in enumerate(rows.schema):
+        if pa.types.is_dictionary(field.type):
+            column = rows.column(index).cast(field.type.value_type).combine_chunks().dictionary_encode()
+            rows = rows.set_column(index, field.name, column)
+    return apply_schema(rows.to_pandas(), table, CATEGORICAL_COLUMNS[table])
+
+
+def login_batches(batch_size=CHUNK_SIZE, columns=None, table="login", start=None, end=None):
+    # Frames of batch_size rows in table order, optionally only those in [start, end)
+    for rows in _row_batches(_dataset(table), batch_size, columns, window_filter(start, end)):
+        yield _frame(rows, table)
+
+
+def _write_run(rows, path, block_rows):
+    # Time-sorted Arrow IPC stream in blocks of block_rows rows, one dictionary per column
+    rows = rows.sort_by('timestamp').unify_dictionaries().combine_chunks()
+    with pa.OSFile(path, "wb") as sink:
+        with ipc.new_stream(sink, rows.schema, options=RUN_WRITE_OPTIONS) as writer:
+            for batch in rows.to_batches(max_chunksize=block_rows):
+                writer.write_batch(batch)
+
+
+def _merge_runs(paths, block_rows):
+    # Time-ordered tables from a k-way merge of time-sorted runs. Each run keeps between one and
+    # two blocks buffered (more only while a block ends in a tie). Rows before the earliest of the
+    # open runs' last buffered timestamps can't be preceded by anything still on disk, so they go
+    # out; equal timestamps come out in run order, i.e. table order
+    readers = [iter(ipc.open_stream(pa.OSFile(path))) for path in paths]
+    buffers = [None] * len(paths)
+    times = [np.zeros(0, dtype="datetime64[us]")] * len(paths)
+
+    def refill(run):
+        batch = next(readers[run], None)
+        if batch is None:
+            readers[run] = None
+            return
+        rows = pa.Table.from_batches([batch])
+        buffers[run] = rows if buffers[run] is None else pa.concat_tables([buffers[run], rows])
+        times[run] = np.concatenate([times[run], rows['timestamp'].to_numpy()])
+
+    for run in range(len(paths)):
+        refill(run)
+    while True:
+        open_runs = [run for run, reader in enumerate(readers) if reader is not None]
+        if not open_runs:
+            rest = [rows for rows in buffers if rows is not None and rows.num_rows]
+            if rest:
+                yield pa.concat_tables(rest).sort_by('timestamp')
+            return
+        bound = min(times[run][-1] for run in open_runs)
+        ready = []
+        for run, rows in enumerate(buffers):
+            emitted = int(np.searchsorted(times[run], bound, side='left'))
+            if emitted:
+                ready.append(rows.slice(0, emitted))
+                buffers[run], times[run] = rows.slice(emitted), times[run][emitted:]
+        if ready:
+            yield pa.concat_tables(ready).sort_by('timestamp')
+        for run in open_runs:
+            if len(times[run]) < block_rows or times[run][-1] == bound:
+                refill(run)
+
+
+def login_chunks(chunk_size=CHUNK_SIZE, columns=None, table="login", start=None, end=None):
+    # Time-ordered frames of chunk_size rows (the last one shorter), optionally only those in [start, end)
+    dataset = _dataset(table)
+    window = window_filter(start, end)
+    runs = -(-dataset.count_rows(filter=window) // chunk_size)
+    block_rows = max(1, chunk_size // max(runs, 1))
+    with tempfile.TemporaryDirectory(prefix="out_of_core-") as directory:
+        paths = []
+        for rows in _row_batches(dataset, chunk_size, columns, window):
+            paths.append(os.path.join(directory, f"run-{len(paths):06d}.arrows"))
+            _write_run(rows, paths[-1], block_rows)
+
+        pending, pending_rows = [], 0
+        for rows in _merge_runs(paths, block_rows):
+            pending.append(rows)
+            pending_rows += rows.num_rows
+            if pending_rows >= chunk_size:
+                gathered = pa.concat_tables(pending)
+                full = pending_rows // chunk_size * chunk_size
+                for offset in range(0, full, chunk_size):
+                    yield _frame(gathered.slice(offset, chunk_size), table)
+                pending, pending_rows = [gathered.slice(full)], pending_rows - full
+        if pending_rows:
+            yield _frame(pa.concat_tables(pending), table)
+
+
+def build_baselines(chunk_size=CHUNK_SIZE, half_life_days=None, start=None, end=None):
+    # Pass 1: per-user attribute counters, one row batch at a time
+    store = BaselineStore(half_life_days=half_life_days)
+    for batch in login_batches(chunk_size, columns=BASELINE_INPUT_COLUMNS, start=start, end=end):
+        # Modes only matter once every batch is counted
+        store.update_frame(batch, refresh=False)
+    store.refresh_modes()
+    return store
+
+
+class ChunkScorer:
+    def __init__(self, baselines, method="haversine", key='user_id'):
+        # baselines: per-user modes as from compute_baselines / BaselineStore.modes_frame
+        self.baselines = baselines
+        self.method = method
+        self.key = key
+        # Each user's latest login so far: timestamp, lat, lon (indexed by user), same dtypes as the chunks
+        self.last_login = None
+
+    def score(self, chunk):
+        scored = score_batch(chunk, baselines=self.baselines, method=self.method, key=self.key)
+        users = chunk[self.key].astype(str).to_numpy()
+        ordered = np.lexsort((chunk['timestamp'].values, users))
+
+        # Each user's first login in this chunk has no predecessor inside it; compare with the carried one
+        first = ordered[np.r_[True, users[ordered][1:] != users[ordered][:-1]]] if len(ordered) else ordered
+        previous = self.last_login.reindex(users[first]) if self.last_login is not None else None
+        carried = previous['lat'].notna().to_numpy() if previous is not None else np.zeros(0, dtype=bool)
+        if carried.any():
+            rows = first[carried]
+            previous = previous[carried]
+            distance_km = DISTANCE_FUNCTIONS[self.method](
+                previous['lat'].to_numpy(dtype=float), previous['lon'].to_numpy(dtype=float),
+                chunk['lat'].to_numpy(dtype=float)[rows], chunk['lon'].to_numpy(dtype=float)[rows],
+            )
+            elapsed = chunk['timestamp'].iloc[rows].reset_index(drop=True) - previous['timestamp'].reset_index(drop=True)
+            time_diff_hr = np.array(elapsed / pd.Timedelta(hours=1), dtype=float)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                speed_kmh = np.where(time_diff_hr > 0, distance_km / time_diff_hr, np.nan)
+            flagged = scored.index[rows[speed_kmh > SPEED_THRESHOLD_KMH]]
+            # Geo-velocity is the last rule score_batch applies, so appending keeps the reason order
+            scored.loc[flagged, 'anomaly_score'] = np.clip(scored.loc[flagged, 'anomaly_score'] + GEO_VELOCITY_WEIGHT, None, MAX_SCORE)
+            reasons = scored.loc[flagged, 'anomaly_reason']
+            scored.loc[flagged, 'anomaly_reason'] = np.where(
+                reasons == "", GEO_VELOCITY_REASON, reasons + "; " + GEO_VELOCITY_REASON
+            )
+
+        last = ordered[np.r_[users[ordered][1:] != users[ordered][:-1], True]] if len(ordered) else ordered
+        latest = pd.DataFrame({
+            'timestamp': chunk['timestamp'].iloc[last].array,
+            'lat': chunk['lat'].to_numpy()[last],
+            'lon': chunk['lon'].to_numpy()[last],
+        }, index=users[last])
+        if self.last_login is not None:
+            latest = pd.concat([self.last_login[~self.last_login.index.isin(latest.index)], latest])
+        self.last_login = latest
+        return scored
+
+
+def score_chunks(baselines, chunk_size=CHUNK_SIZE, method="haversine", start=None, end=None):
+    # Pass 2: scored chunks in time order
+    scorer = ChunkScorer(baselines.modes_frame(), method=method)
+    for chunk in login_chunks(chunk_size, start=start, end=end):
+        yield scorer.score(chunk)
+
+
+def run(chunk_size=CHUNK_SIZE, output=None, half_life_days=None, method="haversine", start=None, end=None):
+    # Baselines plus the risk rollup, optionally writing every scored login to one Parquet file
+    baselines = build_baselines(chunk_size, half_life_days, start, end)
+    daily = []
+    writer = None
+    try:
+        for scored in score_chunks(baselines, chunk_size, method, start, end):
+            daily.append(daily_aggregates(scored))
+            if output is not None:
+                table = pa.Table.from_pandas(scored, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output, table.schema)
+                # Per-chunk dictionaries differ; write plain values so every chunk has the same schema
+                writer.write_table(table.cast(writer.schema) if table.schema != writer.schema else table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return baselines, RiskAggregates(combine_daily(daily))
+
+
+def combine_daily(frames):
+    # A day can straddle a chunk boundary: merge its partial rows
+    if not frames:
+        return RiskAggregates().daily
+    daily = pd.concat(frames, ignore_index=True)
+    return daily.groupby(['user_id', 'day'], sort=True).agg(
+        logins=('logins', 'sum'),
+        score_sum=('score_sum', 'sum'),
+        max_score=('max_score', 'max'),
+        anomalies=('anomalies', 'sum'),
+        last_anomaly=('last_anomaly', 'max'),
+    ).reset_index()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build baselines and score logins chunk by chunk")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows per read batch / scoring chunk")
+    parser.add_argument("--output", help="Parquet file for the scored logins")
+    parser.add_argument("--half-life-days", type=float)
+    parser.add_argument("--since", type=as_utc, help="only logins at or after this time (ISO 8601, UTC if no zone)")
+    parser.add_argument("--until", type=as_utc, help="only logins before this time")
+    parser.add_argument("--save", action="store_true", help="save baselines and risk aggregates to the store")
+    args = parser.parse_args()
+    if args.save and (args.since is not None or args.until is not None):
+        # The saved state stands for the whole table
+        parser.error("--save can't be combined with --since / --until")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    started = time.perf_counter()
+    version = table_version("login")
+    baselines, aggregates = run(args.chunk_size, args.output, args.half_life_days, start=args.since, end=args.until)
+    if args.save:
+        # Stamped with the table version they were built from, so the dashboard reuses them
+        baselines.version = aggregates.version = version
+        baselines.save()
+        aggregates.save()
+    print(
+        f"Scored {aggregates.total_logins()} logins for {len(baselines.users())} users "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
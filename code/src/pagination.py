@@ -0,0 +1,31 @@
+import math
+
+import streamlit as st
+
+from instrumentation import span
+
+# Server-side paging for dashboard tables: frames stay in the server cache and only the
+# visible page is styled, serialized and sent to the browser.
+
+PAGE_SIZE = 100
+
+
+def page_count(n_rows, page_size=PAGE_SIZE):
+    return max(1, math.ceil(n_rows / page_size))
+
+
+def page_slice(df, page, page_size=PAGE_SIZE):
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size]
+
+
+def paged_dataframe(df, key, page_size=PAGE_SIZE, style=None, **kwargs):
+    pages = page_count(len(df), page_size)
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages}, {len(df)} rows)", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+    view = page_slice(df, page, page_size)
+    # Styler.apply and serialization of the visible page
+    with span(f"table:{key}", rows=len(view)):
+        st.dataframe(view.style.apply(style, axis=1) if style else view, **kwargs)
+    return view
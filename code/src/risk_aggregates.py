@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from anomaly_scoring import RISK_MEDIUM
+import log_store
+
+# Population-wide risk rollup for the Risk Overview.
+# Scored logins are reduced once to one row per (user, day) holding the login count, score sum,
+# max score, number of anomalies (score above RISK_MEDIUM) and the last anomaly time. Leaderboards
+# for any day window are then a small group-by over this table, never a scan of the raw logins.
+# After a sync only the affected users' rows are replaced. The saved file records the login
+# table version it covers in its Parquet metadata.
+
+RISK_AGGREGATE_FILE = "risk_aggregates.parquet"
+VERSION_KEY = b"login_version"
+
+AGGREGATE_COLUMNS = ['logins', 'score_sum', 'max_score', 'anomalies', 'last_anomaly']
+LEADERBOARD_COLUMNS = ['user_id', 'max_score', 'mean_score', 'logins', 'anomalies', 'last_anomaly']
+
+# Label -> number of trailing days (None = everything)
+TIME_WINDOWS = {
+    "All time": None,
+    "Last day": 1,
+    "Last 7 days": 7,
+    "Last 30 days": 30,
+}
+
+
+def risk_aggregate_path():
+    # Follows log_store.use_store()
+    return os.path.join(log_store.STORE_DIR, RISK_AGGREGATE_FILE)
+
+
+def daily_aggregates(scored_df):
+    # scored_df: output of anomaly_scoring.score_batch
+    score = scored_df['anomaly_score'].to_numpy()
+    anomalous = score > RISK_MEDIUM
+    df = pd.DataFrame({
+        'user_id': scored_df['user_id'].to_numpy(),
+        'day': scored_df['timestamp'].dt.floor("D").array,
+        'score': score,
+        'anomaly': anomalous,
+        'anomaly_time': scored_df['timestamp'].where(anomalous).array,
+    })
+    # Group on the categorical codes, not the strings
+    daily = df.groupby(['user_id', 'day'], sort=True, observed=True).agg(
+        logins=('score', 'size'),
+        score_sum=('score', 'sum'),
+        max_score=('score', 'max'),
+        anomalies=('anomaly', 'sum'),
+        last_anomaly=('anomaly_time', 'max'),
+    ).reset_index()
+    daily['user_id'] = daily['user_id'].astype(str)
+    return daily
+
+
+class RiskAggregates:
+    def __init__(self, daily=None, version=None):
+        if daily is None:
+            daily = pd.DataFrame(columns=['user_id', 'day', *AGGREGATE_COLUMNS])
+        self.daily = daily
+        # Login table version the rollup covers, when known
+        self.version = version
+
+    def replace_users(self, scored_df):
+        # scored_df holds the full, freshly scored history of every user it mentions
+        fresh = daily_aggregates(scored_df)
+        kept = self.daily[~self.daily['user_id'].isin(fresh['user_id'].unique())]
+        self.daily = pd.concat([kept, fresh], ignore_index=True).sort_values(['user_id', 'day'], ignore_index=True)
+        return fresh['user_id'].unique().tolist()
+
+    def total_logins(self):
+        return int(self.daily['logins'].sum())
+
+    def latest_day(self):
+        return self.daily['day'].max() if len(self.daily) else None
+
+    def leaderboard(self, days=None):
+        # Per-user rollup over the trailing `days` days (all days when None)
+        daily = self.daily
+        if days is not None and len(daily):
+            daily = daily[daily['day'] > self.latest_day() - pd.Timedelta(days=days)]
+        board = daily.groupby('user_id', sort=False).agg(
+            logins=('logins', 'sum'),
+            score_sum=('score_sum', 'sum'),
+            max_score=('max_score', 'max'),
+            anomalies=('anomalies', 'sum'),
+            last_anomaly=('last_anomaly', 'max'),
+        ).reset_index()
+        board['mean_score'] = board['score_sum'] / board['logins']
+        return board[LEADERBOARD_COLUMNS]
+
+    # --- persistence --- #
+
+    def save(self, path=None):
+        path = path or risk_aggregate_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(self.daily, preserve_index=False)
+        if self.version is not None:
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), VERSION_KEY: self.version.encode()})
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or risk_aggregate_path()
+        table = pq.read_table(path)
+        version = (table.schema.metadata or {}).get(VERSION_KEY)
+        return cls(table.to_pandas(), version=version.decode() if version else None)
+
+    @classmethod
+    def build(cls, scored_df):
+        return cls(daily_aggregates(scored_df))
+
+
+def top_users(board, sort_by='max_score', ascending=False, page=1, page_size=25):
+    # One page of a leaderboard; ties keep a stable user order
+    ordered = board.sort_values([sort_by, 'user_id'], ascending=[ascending, True], kind='stable')
+    pages = max(1, int(np.ceil(len(ordered) / page_size)))
+    page = min(max(page, 1), pages)
+    start = (page - 1) * page_size
+    return ordered.iloc[start:start + page_size].reset_index(drop=True), pages
+
+
+def load_or_build(scored_df, version, path=None):
+    path = path or risk_aggregate_path()
+    # Reuse the rollup saved for this login table version, otherwise rebuild once and save
+    if os.path.exists(path):
+        aggregates = RiskAggregates.load(path)
+        if aggregates.version == version:
+            return aggregates
+    aggregates = RiskAggregates.build(scored_df)
+    aggregates.version = version
+    aggregates.save(path)
+    return aggregates
@@ -0,0 +1,265 @@
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Typed in-memory schema for the log tables.
+# The string attributes are small, fixed vocabularies shared by the generators and the loaders,
+# so frames hold them as categoricals with one vocabulary per column (integer codes line up
+# across tables and loads). IPv4 addresses are held as uint32 and coordinates as float32;
+# format_ips() turns addresses back into dotted strings for display. Session page paths are
+# ragged arrays of page codes (an Arrow list<uint8> column: offsets + codes), not " > "-joined
+# strings; format_pages() joins them back for display.
+
+device_types = ["mobile", "desktop", "tablet"]
+os_browsers = {
+    "mobile": ["Android/Chrome", "iOS/Safari"],
+    "desktop": ["Windows/Chrome", "Mac/Safari", "Linux/Firefox"],
+    "tablet": ["iOS/Safari", "Android/Chrome"]
+}
+resolutions = {
+    "mobile": ["1080x2340", "750x1334", "720x1600"],
+    "desktop": ["1920x1080", "1366x768", "1440x900"],
+    "tablet": ["1536x2048", "1200x1920"]
+}
+login_methods = ["password", "biometric", "OTP"]
+channels = ["web", "app", "API"]
+
+locations = [
+    {"city": "New York", "lat": 40.7128, "lon": -74.0060},
+    {"city": "Los Angeles", "lat": 34.0522, "lon": -118.2437},
+    {"city": "Chicago", "lat": 41.8781, "lon": -87.6298},
+    {"city": "Houston", "lat": 29.7604, "lon": -95.3698},
+    {"city": "Miami", "lat": 25.7617, "lon": -80.1918},
+]
+
+pages = ["dashboard", "transfer", "settings", "profile", "offers", "support"]
+transaction_types = ["fund_transfer", "bill_payment", "recharge", "upi_payment"]
+transaction_methods = ["NEFT", "IMPS", "RTGS", "UPI"]
+features = ["balance_check", "mini_statement", "set_pin", "block_card", "credit_score", "loan_offers"]
+
+
+def _flatten(by_device):
+    return sorted({value for values in by_device.values() for value in values})
+
+
+# Sorted, so the mode tie-break (smallest value) is the same on codes and on strings
+VOCABULARIES = {
+    "device_type": sorted(device_types),
+    "os_browser": _flatten(os_browsers),
+    "screen_resolution": _flatten(resolutions),
+    "city": sorted(loc["city"] for loc in locations),
+    "login_method": sorted(login_methods),
+    "channel": sorted(channels),
+    "transaction_type": sorted(transaction_types),
+    "method": sorted(transaction_methods),
+    "feature": sorted(features),
+}
+
+# Page codes are what the store holds, so pages are only ever appended, never reordered
+PAGE_CODES = {page: code for code, page in enumerate(pages)}
+PAGE_SEPARATOR = " > "
+PAGE_PATH_TYPE = pa.list_(pa.uint8())
+
+IP_COLUMNS = {"login": ["ip"], "login_labels": ["ip"]}
+PAGE_COLUMNS = {"session": ["pages_visited"]}
+FLOAT32_COLUMNS = {"login": ["lat", "lon"]}
+
+
+def with_vocabulary(column, name):
+    # Values outside the shared vocabulary (e.g. hand-edited uploads) are kept, not dropped.
+    # Columns without one (user_id, recipient) just get their own values, sorted.
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype(str).astype("category")
+    categories = sorted(set(VOCABULARIES.get(name, ())).union(column.cat.categories))
+    return column.cat.set_categories(categories)
+
+
+def ip_to_int(ip):
+    a, b, c, d = (int(part) for part in ip.split("."))
+    if not all(0 <= part <= 255 for part in (a, b, c, d)):
+        raise ValueError(f"Invalid IPv4 address: {ip!r}")
+    return (a << 24) | (b << 16) | (c << 8) | d
+
+
+def ips_to_uint32(values):
+    # Dotted strings -> uint32; categoricals are converted once per distinct address
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        lookup = ips_to_uint32(values.cat.categories.astype(str))
+        codes = values.cat.codes.to_numpy()
+        if (codes < 0).any():
+            raise ValueError("Missing IPv4 address")
+        return lookup[codes]
+    if pd.api.types.is_integer_dtype(values.dtype) or not len(values):
+        return values.to_numpy(dtype=np.uint32)
+    octets = values.astype(str).str.split(".", expand=True)
+    if octets.shape[1] != 4 or octets.isna().any().any():
+        raise ValueError("Invalid IPv4 address")
+    octets = octets.astype(np.int64).to_numpy()
+    if ((octets < 0) | (octets > 255)).any():
+        raise ValueError("Invalid IPv4 address")
+    return (octets @ np.array([1 << 24, 1 << 16, 1 << 8, 1], dtype=np.int64)).astype(np.uint32)
+
+
+def is_ipv4(values):
+    # Row mask of well-formed dotted IPv4 strings
+    values = pd.Series(values).astype(str)
+    return values.str.fullmatch(r"(25[0-5]|2[0-4]\d|1?\d?\d)(\.(25[0-5]|2[0-4]\d|1?\d?\d)){3}").to_numpy()
+
+
+def format_ip(value):
+    value = int(value)
+    return f"{value >> 24 & 255}.{value >> 16 & 255}.{value >> 8 & 255}.{value & 255}"
+
+
+def format_ips(values):
+    values = np.asarray(values, dtype=np.uint32)
+    unique, inverse = np.unique(values, return_inverse=True)
+    return np.array([format_ip(v) for v in unique], dtype=object)[inverse]
+
+
+def page_paths(offsets, codes):
+    # Ragged page codes -> list<uint8> column
+    paths = pa.ListArray.from_arrays(pa.array(offsets, type=pa.int32()), pa.array(codes, type=pa.uint8()))
+    return pd.arrays.ArrowExtensionArray(paths)
+
+
+def is_page_paths(values):
+    # Parquet names the list item "element", so compare the value type only
+    dtype = values.dtype
+    return isinstance(dtype, pd.ArrowDtype) and pa.types.is_list(dtype.pyarrow_dtype) and \
+        dtype.pyarrow_dtype.value_type == PAGE_PATH_TYPE.value_type
+
+
+def pages_to_codes(values):
+    # " > "-joined paths -> list<uint8> page codes; each distinct path is split once
+    values = pd.Series(values)
+    if is_page_paths(values):
+        return values.array
+    rows, paths = pd.factorize(values.fillna("").astype(str))
+    encoded = []
+    for path in paths:
+        names = path.split(PAGE_SEPARATOR) if path else []
+        unknown = [name for name in names if name not in PAGE_CODES]
+        if unknown:
+            raise ValueError(f"Unknown page(s) {unknown} in path {path!r}")
+        encoded.append([PAGE_CODES[name] for name in names])
+    path_lengths = np.array([len(codes) for codes in encoded], dtype=np.int64)
+    path_starts = np.concatenate([[0], np.cumsum(path_lengths)[:-1]]).astype(np.int64)
+    path_codes = np.array([code for codes in encoded for code in codes], dtype=np.uint8)
+
+    lengths = path_lengths[rows] if len(rows) else np.zeros(0, dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    # Position of every output code within the flat codes of the distinct paths
+    gather = np.repeat(path_starts[rows] - offsets[:-1], lengths) + np.arange(offsets[-1])
+    return page_paths(offsets, path_codes[gather])
+
+
+def page_path_array(values):
+    # The column's list array in one piece (frames read from the store hold chunked ones)
+    paths = pa.array(pages_to_codes(values))
+    return paths.combine_chunks() if isinstance(paths, pa.ChunkedArray) else paths
+
+
+def format_pages(values):
+    # list<uint8> page codes -> " > "-joined strings, joined in Arrow rather than row by row
+    paths = page_path_array(values)
+    names = pa.array(pages).take(paths.flatten())
+    lengths = pc.list_value_length(paths).fill_null(0).to_numpy()
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int32)
+    joined = pc.binary_join(pa.ListArray.from_arrays(pa.array(offsets), names), PAGE_SEPARATOR)
+    return joined.to_numpy(zero_copy_only=False)
+
+
+def arrow_dtypes(data_type):
+    # to_pandas(types_mapper=...): list columns stay Arrow-backed instead of one ndarray per row
+    return pd.ArrowDtype(data_type) if pa.types.is_list(data_type) else None
+
+
+def apply_schema(df, table, categorical_columns=()):
+    for col in categorical_columns:
+        if col in df.columns and col not in IP_COLUMNS.get(table, []):
+            df[col] = with_vocabulary(df[col], col)
+    for col in IP_COLUMNS.get(table, []):
+        if col in df.columns:
+            df[col] = ips_to_uint32(df[col])
+    for col in FLOAT32_COLUMNS.get(table, []):
+        if col in df.columns:
+            df[col] = df[col].astype(np.float32)
+    for col in PAGE_COLUMNS.get(table, []):
+        if col in df.columns:
+            df[col] = pages_to_codes(df[col])
+    return df
+
+
+def format_ip_columns(df):
+    # Copy with dotted addresses, for tables shown to analysts and for writing back to the store
+    formatted = df.copy()
+    for col in ("ip",):
+        if col in formatted.columns and pd.api.types.is_integer_dtype(formatted[col].dtype):
+            formatted[col] = format_ips(formatted[col])
+    return formatted
+
+
+LOGIN_EVENT_FIELDS = [
+    "user_id", "timestamp", "device_type", "os_browser", "screen_resolution",
+    "ip", "lat", "lon", "city", "login_method", "channel",
+]
+
+
+class LoginEvent:
+    # One login on the streaming path: fixed attributes instead of a per-event dict.
+    # Supports event['col'] / event.get('col') so the scoring rules accept either.
+    __slots__ = (*LOGIN_EVENT_FIELDS, "login_hour")
+
+    def __init__(self, user_id, timestamp, device_type, os_browser, screen_resolution,
+                 ip, lat, lon, city, login_method, channel, login_hour=None):
+        self.user_id = user_id
+        self.timestamp = timestamp
+        self.device_type = device_type
+        self.os_browser = os_browser
+        self.screen_resolution = screen_resolution
+        self.ip = ip
+        self.lat = lat
+        self.lon = lon
+        self.city = city
+        self.login_method = login_method
+        self.channel = channel
+        self.login_hour = login_hour
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        timestamp = mapping['timestamp']
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        if timestamp.tzinfo is None:
+            # Stored logins are UTC; a naive time would not compare with them
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        ip = mapping['ip']
+        return cls(
+            str(mapping['user_id']), timestamp, mapping['device_type'], mapping['os_browser'],
+            mapping['screen_resolution'], ip_to_int(ip) if isinstance(ip, str) else int(ip),
+            float(mapping['lat']), float(mapping['lon']), mapping['city'],
+            mapping['login_method'], mapping['channel'], mapping.get('login_hour'),
+        )
+
+    @classmethod
+    def from_json(cls, line):
+        return cls.from_mapping(json.loads(line))
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None)
+        return default if value is None else value
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from anomaly_scoring import RISK_MEDIUM, risk_level, score_event
+from baseline_store import MODE_COLUMNS, BaselineStore
+from instrumentation import count
+from log_store import LOG_DIR, load_table
+from schema import LOGIN_EVENT_FIELDS, LoginEvent, format_ip
+
+# Headless real-time login scoring.
+# Events (one JSON object per line, same columns as the login table) come from an in-process
+# asyncio queue, a tailed file or a local TCP socket. Each event is scored with the dashboard's
+# rules against in-memory per-user state (attribute counters + last location/time), the state is
+# then updated with the event, and anything above RISK_MEDIUM is appended to an alerts file.
+# An event that fails to parse or score is logged and skipped; the consumer keeps going.
+# Latency percentiles are over the most recent LATENCY_SAMPLES events, in a fixed ring buffer.
+#
+#   python code/src/scoring_service.py replay            # feed the stored login table through it
+#   python code/src/scoring_service.py tail events.jsonl
+#   python code/src/scoring_service.py serve --port 9099
+
+ALERTS_PATH = os.path.join(LOG_DIR, "alerts.jsonl")
+QUEUE_SIZE = 10_000
+LATENCY_SAMPLES = 100_000
+
+logger = logging.getLogger(__name__)
+
+
+class _ModeView:
+    # Presents BaselineStore modes in the {user: {'mode_device': ...}} shape score_event expects
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, user):
+        modes = self.store.modes.get(user)
+        if not modes:
+            return None
+        return {name: modes.get(col) for name, col in MODE_COLUMNS.items()}
+
+
+def parse_event(event):
+    # JSON line, mapping or LoginEvent -> LoginEvent
+    if isinstance(event, LoginEvent):
+        return event
+    if isinstance(event, (str, bytes)):
+        return LoginEvent.from_json(event)
+    return LoginEvent.from_mapping(event)
+
+
+class ScoringService:
+    def __init__(self, baselines=None, alerts_path=ALERTS_PATH):
+        self.baselines = baselines if baselines is not None else BaselineStore()
+        self.modes = _ModeView(self.baselines)
+        self.last_login = {}
+        self.alerts_path = alerts_path
+        self.alerts = open(alerts_path, "a") if alerts_path else None
+        self.processed = 0
+        self.alerted = 0
+        self.rejected = 0
+        self.latencies_ns = np.zeros(LATENCY_SAMPLES, dtype=np.int64)
+
+    def warm_start(self, login_df):
+        # Seed counters and last locations from history so the first live events have a baseline
+        self.baselines.update_frame(login_df)
+        latest = login_df.sort_values(['user_id', 'timestamp'], kind='stable').drop_duplicates('user_id', keep='last')
+        for user, ts, lat, lon in zip(latest['user_id'].astype(str), latest['timestamp'], latest['lat'], latest['lon']):
+            self.last_login[user] = (ts, lat, lon)
+
+    def process(self, event):
+        start = time.perf_counter_ns()
+        event = parse_event(event)
+        result = score_event(event, baselines=self.modes, last_login=self.last_login)
+        self.baselines.update(event)
+        self.processed += 1
+        count("events_scored")
+        if result['anomaly_score'] > RISK_MEDIUM:
+            self.alert(event, result)
+        self.latencies_ns[(self.processed - 1) % LATENCY_SAMPLES] = time.perf_counter_ns() - start
+        return result
+
+    def alert(self, event, result):
+        self.alerted += 1
+        count("events_alerted")
+        if self.alerts is None:
+            return
+        record = {
+            'user_id': event.user_id,
+            'timestamp': event.timestamp.isoformat(),
+            'ip': format_ip(event.ip),
+            'lat': event.lat,
+            'lon': event.lon,
+            'anomaly_score': round(result['anomaly_score'], 4),
+            'anomaly_reason': result['anomaly_reason'],
+            'risk_level': risk_level(result['anomaly_score']),
+        }
+        self.alerts.write(json.dumps(record) + "\n")
+
+    def flush(self):
+        if self.alerts is not None:
+            self.alerts.flush()
+
+    def close(self):
+        if self.alerts is not None:
+            self.alerts.close()
+            self.alerts = None
+
+    async def consume(self, queue):
+        # None on the queue stops the consumer
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            try:
+                self.process(event)
+            except Exception as exc:
+                # One bad line must not stop the consumer (and block every producer on a full queue)
+                self.rejected += 1
+                count("events_rejected")
+                logger.warning("Skipping event %.200r: %s: %s", event, type(exc).__name__, exc)
+            if queue.empty():
+                self.flush()
+        self.flush()
+
+    def stats(self, elapsed_s=None):
+        recorded = self.latencies_ns[:min(self.processed, LATENCY_SAMPLES)]
+        latencies = recorded / 1000 if len(recorded) else np.zeros(1)
+        stats = {
+            'processed': self.processed,
+            'alerts': self.alerted,
+            'rejected': self.rejected,
+            'latency_p50_us': round(float(np.percentile(latencies, 50)), 2),
+            'latency_p99_us': round(float(np.percentile(latencies, 99)), 2),
+        }
+        if elapsed_s:
+            stats['events_per_s'] = round(self.processed / elapsed_s)
+        return stats
+
+
+# --- sources --- #
+
+async def tail_file(path, queue, from_start=False, poll_interval=0.2):
+    with open(path) as f:
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+        while True:
+            line = f.readline()
+            if not line:
+                await asyncio.sleep(poll_interval)
+                continue
+            if line.strip():
+                await queue.put(line)
+
+
+async def serve_socket(queue, host="127.0.0.1", port=9099):
+    async def handle(reader, writer):
+        while line := await reader.readline():
+            if line.strip():
+                await queue.put(line)
+        writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def replay_events(login_df):
+    # Stored logins in time order, as the events a live source would produce
+    ordered = login_df.sort_values('timestamp', kind='stable')
+    values = {col: ordered[col].to_numpy() for col in LOGIN_EVENT_FIELDS}
+    values['user_id'] = ordered['user_id'].astype(str).to_numpy()
+    values['timestamp'] = ordered['timestamp'].dt.to_pydatetime()
+    for col in ('ip', 'lat', 'lon'):
+        values[col] = values[col].tolist()
+    for row in zip(*(values[col] for col in LOGIN_EVENT_FIELDS)):
+        yield LoginEvent(*row)
+
+
+async def replay(service, login_df, limit=None):
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    consumer = asyncio.create_task(service.consume(queue))
+    start = time.perf_counter()
+    for i, event in enumerate(replay_events(login_df)):
+        if limit is not None and i >= limit:
+            break
+        await queue.put(event)
+    await queue.put(None)
+    await consumer
+    return time.perf_counter() - start
+
+
+async def run_source(service, source):
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    consumer = asyncio.create_task(service.consume(queue))
+    try:
+        await source(queue)
+    finally:
+        await queue.put(None)
+        await consumer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Real-time login anomaly scoring service")
+    parser.add_argument("--alerts", default=ALERTS_PATH, help="JSON-lines alerts sink")
+    parser.add_argument("--warm", action="store_true", help="seed per-user state from the stored login table")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    replay_parser = sub.add_parser("replay", help="feed the stored login table through the service")
+    replay_parser.add_argument("--limit", type=int)
+
+    tail_parser = sub.add_parser("tail", help="score JSON lines appended to a file")
+    tail_parser.add_argument("path")
+    tail_parser.add_argument("--from-start", action="store_true")
+
+    serve_parser = sub.add_parser("serve", help="score JSON lines sent to a local TCP socket")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=9099)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    service = ScoringService(alerts_path=args.alerts)
+    history = load_table("login") if args.warm or args.mode == "replay" else None
+    if args.warm:
+        service.warm_start(history)
+
+    try:
+        if args.mode == "replay":
+            elapsed = asyncio.run(replay(service, history, args.limit))
+            print(json.dumps(service.stats(elapsed)))
+        elif args.mode == "tail":
+            asyncio.run(run_source(service, lambda q: tail_file(args.path, q, args.from_start)))
+        else:
+            asyncio.run(run_source(service, lambda q: serve_socket(q, args.host, args.port)))
+    except KeyboardInterrupt:
+        print(json.dumps(service.stats()))
+    finally:
+        service.close()
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+# Vectorized helpers shared by the scorers (transactions, session paths, behaviour model).
+# Each works on whole columns at once: per-user statistics through one groupby over user codes,
+# reason strings through one lookup per combination of flags.
+
+# Robust z-score: 0.6745 * (x - median) / MAD, comparable to a normal z-score
+MAD_SCALE = 0.6745
+
+
+def robust_z(users, values):
+    # Each value's robust z-score against its own user's median / MAD
+    grouped = pd.Series(values).groupby(users)
+    median = grouped.transform('median').to_numpy()
+    mad = pd.Series(np.abs(values - median)).groupby(users).transform('median').to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = MAD_SCALE * (values - median) / mad
+    # Users with a constant value have no spread to compare against
+    return np.where(mad > 0, z, 0.0)
+
+
+def reason_labels(flags, names):
+    # Reason strings per combination of flags (one boolean array per name), looked up by
+    # bitmask instead of built row by row
+    mask = np.zeros(len(flags[0]) if flags else 0, dtype=np.int64)
+    for bit, flagged in enumerate(flags):
+        mask |= flagged.astype(np.int64) << bit
+    labels = ["; ".join(name for bit, name in enumerate(names) if combo >> bit & 1) for combo in range(1 << len(names))]
+    return pd.Categorical.from_codes(mask, categories=labels)
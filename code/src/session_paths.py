@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+
+from schema import page_path_array, pages
+from scoring_utils import robust_z
+
+# Page-path analytics over sessions, without splitting strings.
+# A column of paths is a ragged array: one flat uint8 array of page codes plus per-session
+# offsets (the list<uint8> column as stored). Every step of every session, entering the first
+# page and leaving the last included, is a (from, to) pair of small ints, so per-user
+# first-order transition counts are one bincount over user * STATES**2 + from * STATES + to.
+# A session's path likelihood is the mean log probability of its steps under the user's own
+# transition matrix, smoothed towards the population's, with each step left out of its own
+# count. Sessions far below the user's usual likelihood are flagged.
+
+START = len(pages)
+END = len(pages) + 1
+STATES = len(pages) + 2
+STATE_NAMES = [*pages, "(start)", "(end)"]
+
+# Population transitions mixed into each user's matrix, in pseudo-sessions
+SMOOTHING = 2.0
+# Flag paths whose likelihood is this many robust z below the user's median...
+PATH_Z_THRESHOLD = 3.5
+# ...once the user has enough sessions to have a usual path
+MIN_SESSIONS = 10
+
+PATH_COLUMNS = ['path_length', 'path_loglik', 'path_z', 'unlikely_step', 'unusual_path']
+
+
+def path_arrays(values):
+    # (offsets, codes) of a column of paths; offsets has one entry per session plus one
+    paths = page_path_array(values)
+    lengths = pc.list_value_length(paths).fill_null(0).to_numpy().astype(np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    return offsets, paths.flatten().to_numpy()
+
+
+def transitions(offsets, codes):
+    # (session, from, to) for every step, START -> first page ... last page -> END
+    # Both arrays hold each session's block at offsets[s] + s, one longer than the path
+    lengths = np.diff(offsets)
+    codes = codes.astype(np.int64)
+    sessions = np.repeat(np.arange(len(lengths)), lengths + 1)
+    froms = np.insert(codes, offsets[:-1], START)
+    tos = np.insert(codes, offsets[1:], END)
+    return sessions, froms, tos
+
+
+def transition_counts(users, froms, tos, n_users):
+    # (n_users, STATES, STATES) step counts
+    keys = (users * STATES + froms) * STATES + tos
+    return np.bincount(keys, minlength=n_users * STATES * STATES).reshape(n_users, STATES, STATES)
+
+
+def _probabilities(counts):
+    totals = counts.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(totals > 0, counts / totals, 0.0)
+
+
+def transition_matrix(df):
+    # Step probabilities over all the rows' paths, from-states down, to-states across
+    offsets, codes = path_arrays(df['pages_visited'])
+    _, froms, tos = transitions(offsets, codes)
+    counts = transition_counts(np.zeros(len(froms), dtype=np.int64), froms, tos, 1)[0]
+    matrix = pd.DataFrame(_probabilities(counts), index=STATE_NAMES, columns=STATE_NAMES)
+    # Nothing leaves END and nothing enters START
+    return matrix.loc[[STATE_NAMES[START], *pages], [*pages, STATE_NAMES[END]]]
+
+
+def score_paths(df, key='user_id'):
+    # Returns df (same index and row order) with the PATH_COLUMNS
+    user_column = df[key]
+    if isinstance(user_column.dtype, pd.CategoricalDtype):
+        users = user_column.cat.codes.to_numpy().astype(np.int64)
+    else:
+        users = pd.factorize(user_column)[0].astype(np.int64)
+    n_users = int(users.max()) + 1 if len(users) else 0
+
+    offsets, codes = path_arrays(df['pages_visited'])
+    sessions, froms, tos = transitions(offsets, codes)
+    step_users = users[sessions]
+    counts = transition_counts(step_users, froms, tos, n_users)
+    population = _probabilities(counts.sum(axis=0))
+
+    # Each step is left out of its own count, so a one-off path isn't its own evidence
+    seen = counts[step_users, froms, tos] - 1
+    seen_from = counts.sum(axis=2)[step_users, froms] - 1
+    probability = (seen + SMOOTHING * population[froms, tos]) / (seen_from + SMOOTHING)
+    log_probability = np.log(np.maximum(probability, 1e-12))
+
+    steps = np.diff(offsets) + 1
+    loglik = np.bincount(sessions, weights=log_probability, minlength=len(steps)) / steps
+    z = robust_z(users, loglik) if len(users) else np.zeros(0)
+    history = np.bincount(users, minlength=n_users)[users] if len(users) else np.zeros(0, dtype=np.int64)
+
+    # Least likely step of each session, for the explanation; sessions are contiguous blocks of steps
+    blocks = offsets[:-1] + np.arange(len(steps))
+    lowest = np.minimum.reduceat(log_probability, blocks) if len(steps) else np.zeros(0)
+    candidates = np.flatnonzero(log_probability == lowest[sessions])
+    first = candidates[np.searchsorted(sessions[candidates], np.arange(len(steps)))]
+    step_labels = [f"{STATE_NAMES[a]} → {STATE_NAMES[b]}" for a in range(STATES) for b in range(STATES)]
+
+    scored = df.copy()
+    scored['path_length'] = steps - 1
+    scored['path_loglik'] = loglik
+    scored['path_z'] = z
+    scored['unlikely_step'] = pd.Categorical.from_codes(froms[first] * STATES + tos[first], categories=step_labels)
+    scored['unusual_path'] = (z < -PATH_Z_THRESHOLD) & (history >= MIN_SESSIONS)
+    return scored
@@ -0,0 +1,163 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from anomaly_scoring import score_batch
+import log_store
+from log_store import load_table, table_version
+from snapshot import read_arrow, write_arrow
+
+# Multi-process re-score of every login.
+# Users are hash-partitioned into shards (crc32 of the user id, so the split is the same in
+# every process and every run). Every score_batch rule only looks at one user's own rows, so
+# shards are scored independently. The driver writes the login table once, grouped by shard,
+# to an uncompressed Arrow IPC file. Workers memory-map it and slice their shard out without
+# copying; only paths and row ranges cross the process boundary. Each finished shard is
+# checkpointed as its own Arrow file (written atomically), and a rerun with the same table,
+# shard count and method skips the shards already done. The merge concatenates the shards in
+# shard order and puts the rows back in load order, so the Parquet output is byte-identical
+# to scoring the whole table in one process (--single-process).
+
+SHARD_SUBDIR = "shard_scoring"
+SCORED_FILE = "scored_logins.parquet"
+SHARDS = 64
+INPUT_FILE = "input.arrow"
+LAYOUT_FILE = "shards.json"
+
+
+def shard_dir():
+    # Follows log_store.use_store()
+    return os.path.join(log_store.STORE_DIR, SHARD_SUBDIR)
+
+
+def scored_path():
+    return os.path.join(log_store.STORE_DIR, SCORED_FILE)
+
+
+def shard_of(users, shards):
+    # Shard per row; crc32 rather than hash(), which is salted per process
+    users = pd.Series(users)
+    if not isinstance(users.dtype, pd.CategoricalDtype):
+        users = users.astype(str).astype("category")
+    by_category = np.array(
+        [zlib.crc32(str(user).encode()) % shards for user in users.cat.categories], dtype=np.int64
+    )
+    return by_category[users.cat.codes.to_numpy()]
+
+
+def run_dir(shards, method, path=None):
+    # Checkpoints are only reused for the same login table, shard count and method
+    path = path or shard_dir()
+    key = hashlib.sha1(f"{table_version('login')}-{shards}-{method}".encode()).hexdigest()[:16]
+    return os.path.join(path, key)
+
+
+def prepare(directory, shards):
+    # Login table grouped by shard (load order kept within a shard), plus each shard's row range
+    layout_path = os.path.join(directory, LAYOUT_FILE)
+    if os.path.exists(layout_path):
+        with open(layout_path) as f:
+            return json.load(f)
+    os.makedirs(directory, exist_ok=True)
+    df = load_table("login")
+    ids = shard_of(df['user_id'], shards)
+    order = np.argsort(ids, kind='stable')
+    bounds = np.searchsorted(ids[order], np.arange(shards + 1))
+    write_arrow(pa.Table.from_pandas(df, preserve_index=False).take(order), os.path.join(directory, INPUT_FILE))
+    np.save(os.path.join(directory, "order.npy"), order)
+    layout = {'shards': shards, 'rows': len(df), 'bounds': bounds.tolist()}
+    with open(layout_path + ".tmp", "w") as f:
+        json.dump(layout, f)
+    os.replace(layout_path + ".tmp", layout_path)
+    return layout
+
+
+def shard_path(directory, shard):
+    return os.path.join(directory, f"shard-{shard:04d}.arrow")
+
+
+def score_shard(directory, shard, start, stop, method="haversine"):
+    # Runs in a worker: score one shard's rows and checkpoint them
+    rows = read_arrow(os.path.join(directory, INPUT_FILE)).slice(start, stop - start)
+    scored = score_batch(rows.to_pandas(), method=method)
+    write_arrow(pa.Table.from_pandas(scored, preserve_index=False), shard_path(directory, shard))
+    return shard, stop - start
+
+
+def merge(directory, layout):
+    # Shards in shard order are the input's rows in order; undo the grouping
+    table = pa.concat_tables([read_arrow(shard_path(directory, shard)) for shard in range(layout['shards'])])
+    order = np.load(os.path.join(directory, "order.npy"))
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(len(order))
+    return table.take(inverse).combine_chunks()
+
+
+def write_output(table, output):
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    pq.write_table(table, output + ".tmp")
+    os.replace(output + ".tmp", output)
+
+
+def run(shards=SHARDS, workers=None, output=None, method="haversine", keep=False, log=print):
+    output = output or scored_path()
+    directory = run_dir(shards, method)
+    layout = prepare(directory, shards)
+    bounds = layout['bounds']
+    pending = [shard for shard in range(shards) if not os.path.exists(shard_path(directory, shard))]
+    if len(pending) < shards:
+        log(f"Resuming: {shards - len(pending)} of {shards} shards already scored")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(score_shard, directory, shard, bounds[shard], bounds[shard + 1], method)
+            for shard in pending
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            shard, rows = future.result()
+            log(f"  shard {shard} ({rows} rows) done, {done}/{len(pending)}")
+
+    table = merge(directory, layout)
+    write_output(table, output)
+    if not keep:
+        shutil.rmtree(directory, ignore_errors=True)
+    return table.num_rows
+
+
+def run_single(output=None, method="haversine"):
+    # The reference: the whole table in this process
+    output = output or scored_path()
+    table = pa.Table.from_pandas(score_batch(load_table("login"), method=method), preserve_index=False)
+    write_output(table, output)
+    return table.num_rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Re-score every login across worker processes")
+    parser.add_argument("--shards", type=int, default=SHARDS)
+    parser.add_argument("--workers", type=int, help="defaults to the number of CPUs")
+    parser.add_argument("--output", help="Parquet file for the scored logins (default: in the store)")
+    parser.add_argument("--method", default="haversine")
+    parser.add_argument("--keep", action="store_true", help="keep the shard checkpoints after the merge")
+    parser.add_argument("--single-process", action="store_true", help="score in this process only (reference output)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    started = time.perf_counter()
+    if args.single_process:
+        rows = run_single(args.output, args.method)
+    else:
+        rows = run(args.shards, args.workers, args.output, args.method, args.keep)
+    print(f"Scored {rows} logins into {args.output or scored_path()} in {time.perf_counter() - started:.1f}s")
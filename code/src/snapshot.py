@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+import sys
+import uuid
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+import log_store
+from log_store import TABLES, load_table, table_exists, table_version
+from schema import arrow_dtypes
+
+# Immutable, memory-mapped snapshots of the store for the dashboards.
+# publish() writes every table as an uncompressed Arrow IPC file under
+# store/snapshots/<version>/ and then swaps the one-line CURRENT pointer with an atomic
+# rename. Readers resolve CURRENT once per rerun and memory-map the files, so numeric,
+# timestamp and category-code columns are views on the page cache: one physical copy shared by
+# every session and every process on the box. A publish never touches a snapshot that is
+# being read; sessions pick up the new version on their next rerun. Tables whose version is
+# unchanged since the current snapshot are hard-linked into the new one, not reloaded and
+# rewritten, so a login sync only writes the login table.
+
+SNAPSHOT_SUBDIR = "snapshots"
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+# Older snapshots kept for sessions still on them (open mappings survive deletion on POSIX)
+KEEP_SNAPSHOTS = 2
+
+
+def snapshot_root():
+    # Follows log_store.use_store()
+    return os.path.join(log_store.STORE_DIR, SNAPSHOT_SUBDIR)
+
+
+def snapshot_path(version):
+    return os.path.join(snapshot_root(), version)
+
+
+def current_version():
+    # Version CURRENT points at, or None before the first publish
+    try:
+        with open(os.path.join(snapshot_root(), CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def manifest(version):
+    # Per-table version and row count of a snapshot
+    with open(os.path.join(snapshot_path(version), MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def write_arrow(table, path):
+    # Uncompressed Arrow IPC file, written to a temporary name and renamed into place
+    with pa.OSFile(path + ".tmp", "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + ".tmp", path)
+
+
+def read_arrow(path):
+    # Memory-mapped: the table's buffers are views on the page cache
+    return ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _carry_over(previous, table, path):
+    # Hard link (copy across filesystems) the table's file from an earlier snapshot
+    source = os.path.join(snapshot_path(previous), f"{table}.arrow")
+    try:
+        os.link(source, path)
+    except OSError:
+        shutil.copyfile(source, path)
+
+
+def publish():
+    # Snapshot the store as it is now and point CURRENT at it; returns the version
+    tables = [table for table in TABLES if table_exists(table)]
+    versions = {table: table_version(table) for table in tables}
+    version = "-".join(versions[table] for table in tables)
+    os.makedirs(snapshot_root(), exist_ok=True)
+
+    target = snapshot_path(version)
+    if not os.path.isdir(target):
+        previous = current_version()
+        carried = manifest(previous) if previous and os.path.isdir(snapshot_path(previous)) else {}
+        staging = os.path.join(snapshot_root(), f".staging-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        rows = {}
+        for table in tables:
+            path = os.path.join(staging, f"{table}.arrow")
+            if carried.get(table, {}).get("version") == versions[table]:
+                _carry_over(previous, table, path)
+                rows[table] = carried[table]["rows"]
+            else:
+                df = load_table(table)
+                write_arrow(pa.Table.from_pandas(df, preserve_index=False), path)
+                rows[table] = len(df)
+        with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+            json.dump({table: {"version": versions[table], "rows": rows[table]} for table in tables}, f, indent=1)
+        try:
+            os.replace(staging, target)
+        except OSError:
+            # Someone else published the same version first
+            shutil.rmtree(staging, ignore_errors=True)
+
+    pointer = os.path.join(snapshot_root(), f"{CURRENT_FILE}.{uuid.uuid4().hex}.tmp")
+    with open(pointer, "w") as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(snapshot_root(), CURRENT_FILE))
+    _prune(keep=version)
+    return version
+
+
+def _prune(keep):
+    snapshots = [
+        entry for entry in os.scandir(snapshot_root())
+        if entry.is_dir() and not entry.name.startswith(".") and entry.name != keep
+    ]
+    snapshots.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in snapshots[KEEP_SNAPSHOTS - 1:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def current_or_publish():
+    return current_version() or publish()
+
+
+def read_table(table, version):
+    # Zero-copy where Arrow allows it; the arrays are read-only views on the mapped file
+    arrow_table = read_arrow(os.path.join(snapshot_path(version), f"{table}.arrow"))
+    return arrow_table.to_pandas(split_blocks=True, types_mapper=arrow_dtypes)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "publish":
+        print(f"Published snapshot {publish()} in {snapshot_root()}")
+    else:
+        print(f"Current snapshot: {current_version()}\nUsage: python code/src/snapshot.py publish")
@@ -1,59 +1,78 @@
 import streamlit as st
-import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 import pydeck as pdk
 
-# Load data
-df = pd.read_excel("code/src/synthetic_login_metadata.xlsx")
-df['timestamp'] = pd.to_datetime(df['timestamp'])
-df['login_hour'] = df['timestamp'].dt.hour
+from cache_layer import data_version, map_layers, user_counts, user_hour_histogram, user_ids, user_rows, user_summary
+from geo_aggregation import LEVEL_ZOOM, cell_radius_m
+import instrumentation
+from instrumentation import span
+from schema import format_ip_columns
+
+# Timing spans for this rerun, shown in the sidebar and appended to the metrics file
+run = instrumentation.begin_run(enabled=st.sidebar.toggle("🐞 Debug timings", value=instrumentation.enabled()))
+
+# Load data (cached per store version)
+with span("data_version"):
+    version = data_version()
 
 # Sidebar user selector
 st.sidebar.title("🛡️ Fraud Profile Dashboard")
-user_id = st.sidebar.selectbox("Select a User", df['user_id'].unique())
+user_id = st.sidebar.selectbox("Select a User", user_ids(version))
 
-user_df = df[df['user_id'] == user_id]
+with span("user_rows") as timing:
+    user_df = user_rows("login", user_id, version)
+    timing.rows = len(user_df)
 
 st.title(f"Fraud Profile for: {user_id}")
 
 # Summary Panel
+summary = user_summary(user_id, version)
 st.subheader("📌 User Summary")
 col1, col2, col3 = st.columns(3)
-col1.metric("Total Logins", len(user_df))
-col2.metric("Most Used Device", user_df['device_type'].mode()[0])
-col3.metric("Preferred Channel", user_df['channel'].mode()[0])
+col1.metric("Total Logins", summary['total_logins'])
+col2.metric("Most Used Device", summary['device_type'])
+col3.metric("Preferred Channel", summary['preferred_channel'])
 
 col4, col5, col6 = st.columns(3)
-col4.metric("Most Used Login Method", user_df['login_method'].mode()[0])
-col5.metric("Top City", user_df['city'].mode()[0])
-col6.metric("Common OS/Browser", user_df['os_browser'].mode()[0])
+col4.metric("Most Used Login Method", summary['most_used_login_method'])
+col5.metric("Top City", summary['city'])
+col6.metric("Common OS/Browser", summary['os_browser'])
 
 # Login Time Histogram
 st.subheader("⏰ Login Hours Distribution")
-hour_counts = user_df['login_hour'].value_counts().sort_index()
-st.bar_chart(hour_counts)
+st.bar_chart(user_hour_histogram(user_id, version))
 
 # Geolocation Map
 st.subheader("🗺️ Login Location Map")
-map_data = user_df[['lat', 'lon']].drop_duplicates()
-st.pydeck_chart(pdk.Deck(
-    initial_view_state=pdk.ViewState(
-        latitude=map_data['lat'].mean(),
-        longitude=map_data['lon'].mean(),
-        zoom=4,
-        pitch=0,
-    ),
-    layers=[
-        pdk.Layer(
-            'ScatterplotLayer',
-            data=map_data,
-            get_position='[lon, lat]',
-            get_color='[200, 30, 0, 160]',
-            get_radius=80000,
-        )
-    ]
-))
+with span("map") as timing:
+    cells, arcs = map_layers(user_id, "region", version)
+    timing.rows = len(cells) + len(arcs)
+    st.pydeck_chart(pdk.Deck(
+        initial_view_state=pdk.ViewState(
+            latitude=float((cells['lat'] * cells['logins']).sum() / cells['logins'].sum()),
+            longitude=float((cells['lon'] * cells['logins']).sum() / cells['logins'].sum()),
+            zoom=LEVEL_ZOOM["region"],
+            pitch=0,
+        ),
+        layers=[
+            pdk.Layer(
+                'ScatterplotLayer',
+                data=cells,
+                get_position='[lon, lat]',
+                get_color='[200, 30, 0, 160]',
+                get_radius=cell_radius_m("region"),
+            ),
+            pdk.Layer(
+                'ArcLayer',
+                data=arcs,
+                get_source_position='[from_lon, from_lat]',
+                get_target_position='[to_lon, to_lat]',
+                get_source_color='[255, 140, 0, 200]',
+                get_target_color='[200, 0, 80, 200]',
+            ),
+        ]
+    ))
 
 # Device / Channel / Login Method Breakdown
 st.subheader("📊 Behavior Breakdown")
@@ -61,17 +80,21 @@ col7, col8, col9 = st.columns(3)
 
 with col7:
     st.markdown("**Device Type**")
-    st.bar_chart(user_df['device_type'].value_counts())
+    st.bar_chart(user_counts(user_id, 'device_type', version))
 
 with col8:
     st.markdown("**Login Methods**")
-    st.bar_chart(user_df['login_method'].value_counts())
+    st.bar_chart(user_counts(user_id, 'login_method', version))
 
 with col9:
     st.markdown("**Channels**")
-    st.bar_chart(user_df['channel'].value_counts())
+    st.bar_chart(user_counts(user_id, 'channel', version))
 
 # Raw data toggle
 with st.expander("📄 Show Raw Login Data"):
-    st.dataframe(user_df)
+    with span("table:raw_logins", rows=len(user_df)):
+        st.dataframe(format_ip_columns(user_df))
+
+# Timings panel (only while debug timings are on)
+instrumentation.debug_sidebar(run)
 
@@ -0,0 +1,201 @@
+import os
+
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from anomaly_scoring import score_batch
+from baseline_store import BaselineStore, baseline_dir
+from behavior_model import BehaviorModel, model_path
+from instrumentation import count
+from linkage_index import LinkageIndex, linkage_path
+from log_store import append_table, load_table, table_exists, table_version
+from risk_aggregates import RiskAggregates, risk_aggregate_path
+from schema import ips_to_uint32, is_ipv4
+
+# Append-only, idempotent ingestion of new login data.
+# New rows are validated chunk by chunk, deduplicated on (user_id, timestamp, ip) against
+# the batch itself and the matching day partitions already in the store, and appended as
+# new part files (each written atomically). Re-running a sync on the same file adds nothing.
+# The saved per-user state passed in (baselines, risk rollup, linkage index, behaviour model) is
+# updated for the new rows only and stamped with the login table version it now covers.
+# The rows are committed first, so a sync that fails after the append leaves state stamped with
+# an older version than the table's. Every sync therefore starts by rebuilding any state that
+# lags the stored table (catch_up); a retry of the failed sync then brings it level, even though
+# all of its rows are skipped as duplicates.
+
+REQUIRED_COLUMNS = [
+    'user_id', 'timestamp', 'device_type', 'os_browser', 'screen_resolution',
+    'ip', 'lat', 'lon', 'city', 'login_method', 'channel'
+]
+STRING_COLUMNS = ['user_id', 'device_type', 'os_browser', 'screen_resolution', 'ip', 'city', 'login_method', 'channel']
+NATURAL_KEY = ['user_id', 'timestamp', 'ip']
+
+CHUNK_SIZE = 50_000
+
+
+class SchemaError(ValueError):
+    def __init__(self, missing):
+        self.missing = set(missing)
+        super().__init__(f"Invalid file structure. Missing columns: {self.missing}")
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        yield from pd.read_csv(path, chunksize=chunk_size)
+    elif ext == ".parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        # openpyxl can't stream, so read the workbook once and validate it in slices
+        df = pd.read_excel(path)
+        for start in range(0, max(len(df), 1), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+
+def validate_chunk(chunk):
+    missing = set(REQUIRED_COLUMNS) - set(chunk.columns)
+    if missing:
+        raise SchemaError(missing)
+    chunk = chunk[REQUIRED_COLUMNS].copy()
+    chunk['timestamp'] = pd.to_datetime(chunk['timestamp'], utc=True, errors='coerce', format="ISO8601")
+    chunk['lat'] = pd.to_numeric(chunk['lat'], errors='coerce')
+    chunk['lon'] = pd.to_numeric(chunk['lon'], errors='coerce')
+
+    valid = chunk['timestamp'].notna() & chunk['lat'].between(-90, 90) & chunk['lon'].between(-180, 180)
+    for col in STRING_COLUMNS:
+        valid &= chunk[col].notna()
+        chunk[col] = chunk[col].astype(str).str.strip()
+    valid &= is_ipv4(chunk['ip'])
+    return chunk[valid], int((~valid).sum())
+
+
+def _key_frame(df):
+    return pd.DataFrame({
+        'user_id': df['user_id'].astype(str).to_numpy(),
+        'timestamp': df['timestamp'].astype("datetime64[us, UTC]").to_numpy(),
+        # Stored rows load with uint32 addresses; compare new rows the same way
+        'ip': ips_to_uint32(df['ip']),
+    }, index=df.index)
+
+
+def existing_keys(days):
+    # Only the day partitions the new rows fall into are read
+    if not table_exists("login") or not days:
+        return pd.DataFrame(columns=NATURAL_KEY)
+    stored = load_table("login", columns=NATURAL_KEY, filters=ds.field("day").isin(sorted(days)))
+    return _key_frame(stored).drop_duplicates()
+
+
+def drop_known(new_rows, known):
+    keys = _key_frame(new_rows)
+    fresh = ~keys.duplicated()
+    if len(known):
+        seen = keys.merge(known.assign(_seen=True), on=NATURAL_KEY, how='left')['_seen'].fillna(False).to_numpy(dtype=bool)
+        fresh &= ~seen
+    return new_rows[fresh.to_numpy()]
+
+
+def saved_state():
+    # Private copies of the state saved in the store; None for any the dashboards haven't built yet,
+    # which a sync then leaves for them to build from the tables
+    return {
+        'baselines': BaselineStore.load() if os.path.isdir(baseline_dir()) else None,
+        'aggregates': RiskAggregates.load() if os.path.exists(risk_aggregate_path()) else None,
+        'linkage': LinkageIndex.load() if os.path.exists(linkage_path()) else None,
+        'model': BehaviorModel.load() if os.path.exists(model_path()) else None,
+    }
+
+
+def catch_up(baselines=None, aggregates=None, linkage=None, model=None):
+    # Rebuilds (and saves) the given states whose version is not the stored table's.
+    # Returns the states to carry on with and the names of those rebuilt
+    states = {'baselines': baselines, 'aggregates': aggregates, 'linkage': linkage, 'model': model}
+    if not table_exists("login"):
+        return states, []
+    version = table_version("login")
+    stale = [name for name, state in states.items() if state is not None and state.version != version]
+    if not stale:
+        return states, []
+
+    history = load_table("login")
+    if 'baselines' in stale:
+        states['baselines'] = BaselineStore.build(history, half_life_days=baselines.half_life_days)
+    if 'aggregates' in stale:
+        modes = states['baselines'].modes_frame() if states['baselines'] is not None else None
+        states['aggregates'] = RiskAggregates.build(score_batch(history, baselines=modes))
+    if 'linkage' in stale:
+        states['linkage'] = LinkageIndex.build(history)
+    if 'model' in stale:
+        states['model'] = BehaviorModel.build(history)
+    for name in stale:
+        states[name].version = version
+        states[name].save()
+    return states, stale
+
+
+def sync_logins(source_path, baselines=None, aggregates=None, linkage=None, model=None, chunk_size=CHUNK_SIZE):
+    # The state objects are updated in place, except those catch_up had to rebuild;
+    # result['state'] holds the ones the sync ended with
+    states, rebuilt = catch_up(baselines, aggregates, linkage, model)
+    baselines, aggregates, linkage, model = (states[name] for name in ('baselines', 'aggregates', 'linkage', 'model'))
+
+    valid_chunks = []
+    rejected = 0
+    for chunk in read_chunks(source_path, chunk_size):
+        chunk, bad_rows = validate_chunk(chunk)
+        rejected += bad_rows
+        if len(chunk):
+            valid_chunks.append(chunk)
+
+    incoming = pd.concat(valid_chunks, ignore_index=True) if valid_chunks else pd.DataFrame(columns=REQUIRED_COLUMNS)
+    days = set(incoming['timestamp'].dt.strftime("%Y-%m-%d")) if len(incoming) else set()
+    new_rows = drop_known(incoming, existing_keys(days)) if len(incoming) else incoming
+
+    result = {
+        'added': len(new_rows),
+        'duplicates': len(incoming) - len(new_rows),
+        'rejected': rejected,
+        'affected_users': sorted(new_rows['user_id'].unique().tolist()) if len(new_rows) else [],
+        'scores': pd.DataFrame(),
+        'rebuilt': rebuilt,
+        'state': states,
+    }
+    count("sync_rows_added", result['added'])
+    count("sync_rows_duplicate", result['duplicates'])
+    count("sync_rows_rejected", rejected)
+    if not len(new_rows):
+        return result
+
+    append_table(new_rows, "login")
+    version = table_version("login")
+
+    # Only the new (key, user) pairs are added to the linkage index
+    if linkage is not None:
+        linkage.ingest(new_rows)
+        linkage.version = version
+        linkage.save()
+
+    # Refresh only the users that received new logins
+    if baselines is not None:
+        baselines.update_frame(new_rows)
+        baselines.version = version
+        baselines.save()
+        result['scores'] = rescore_users(result['affected_users'], baselines)
+        if aggregates is not None:
+            aggregates.replace_users(result['scores'])
+            aggregates.version = version
+            aggregates.save()
+
+    # Counts are additive, so the new logins are simply added
+    if model is not None:
+        model.update(new_rows)
+        model.version = version
+        model.save()
+    return result
+
+
+def rescore_users(users, baselines):
+    history = load_table("login", filters=ds.field("user_id").isin(users))
+    return score_batch(history, baselines=baselines.modes_frame().loc[users])
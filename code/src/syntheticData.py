@@ -1,39 +1,19 @@
 from datetime import datetime, timedelta
 import pandas as pd
-import os
 import random
-os.makedirs("synthetic_logs", exist_ok=True)
+
+from log_store import load_table, table_path, write_table
+from schema import channels, device_types, locations, login_methods, os_browsers, resolutions
+
 # Constants
 NUM_USERS = 50
 NUM_LOGINS = 500
 
-device_types = ["mobile", "desktop", "tablet"]
-os_browsers = {
-    "mobile": ["Android/Chrome", "iOS/Safari"],
-    "desktop": ["Windows/Chrome", "Mac/Safari", "Linux/Firefox"],
-    "tablet": ["iOS/Safari", "Android/Chrome"]
-}
-resolutions = {
-    "mobile": ["1080x2340", "750x1334", "720x1600"],
-    "desktop": ["1920x1080", "1366x768", "1440x900"],
-    "tablet": ["1536x2048", "1200x1920"]
-}
-login_methods = ["password", "biometric", "OTP"]
-channels = ["web", "app", "API"]
-
-locations = [
-    {"city": "New York", "lat": 40.7128, "lon": -74.0060},
-    {"city": "Los Angeles", "lat": 34.0522, "lon": -118.2437},
-    {"city": "Chicago", "lat": 41.8781, "lon": -87.6298},
-    {"city": "Houston", "lat": 29.7604, "lon": -95.3698},
-    {"city": "Miami", "lat": 25.7617, "lon": -80.1918},
-]
-
 
 def random_ip(seed=None):
-    if seed:
-        random.seed(seed)
-    return ".".join(str(random.randint(1, 255)) for _ in range(4))
+    # Own RNG so seeding for a stable per-user IP doesn't reseed the global generator
+    rng = random.Random(seed) if seed else random
+    return ".".join(str(rng.randint(1, 255)) for _ in range(4))
 
 
 def create_user_profiles():
@@ -60,9 +40,10 @@ def generate_login_data():
     user_profiles = create_user_profiles()
     logins = []
     base_time = datetime.utcnow()
+    user_ids = list(user_profiles.keys())
 
     for _ in range(NUM_LOGINS):
-        user_id = random.choice(list(user_profiles.keys()))
+        user_id = random.choice(user_ids)
         profile = user_profiles[user_id]
 
         login_entry = {
@@ -89,17 +70,16 @@ logins = generate_login_data()
 # Convert to DataFrame
 df = pd.DataFrame(logins)
 
-# Save to Excel
-excel_file = "synthetic_logs/synthetic_login_metadata.xlsx"
-df.to_excel(excel_file, index=False)
+# Save to the columnar store
+write_table(df, "login")
 
-print(f"Saved {len(logins)} login events to {excel_file}")
+print(f"Saved {len(logins)} login events to {table_path('login')}")
 import random
 from datetime import datetime, timedelta, timezone
 
 # Load existing user_ids from previous login data
-login_df = pd.read_excel("synthetic_logs/synthetic_login_metadata.xlsx")
-user_ids = login_df["user_id"].unique()
+login_df = load_table("login", columns=["user_id"])
+user_ids = login_df["user_id"].unique().tolist()
 
 # Constants
 NUM_SESSIONS = 1000
@@ -169,10 +149,9 @@ session_df = generate_session_data()
 transaction_df = generate_transaction_data()
 feature_df = generate_feature_usage_data()
 
-# Save to Excel files
-
-session_df.to_excel("synthetic_logs/session_metadata.xlsx", index=False)
-transaction_df.to_excel("synthetic_logs/transaction_metadata.xlsx", index=False)
-feature_df.to_excel("synthetic_logs/feature_usage_logs.xlsx", index=False)
+# Save to the columnar store
+write_table(session_df, "session")
+write_table(transaction_df, "transaction")
+write_table(feature_df, "feature")
 
 session_df.head(), transaction_df.head(), feature_df.head()
@@ -1,23 +1,20 @@
-import os
 import random
 from datetime import datetime, timedelta, timezone
 
 import pandas as pd
 
+from log_store import load_table, write_table
+from schema import features, pages, transaction_methods, transaction_types
+
 # Load existing user_ids from previous login data
-login_df = pd.read_excel("code/src/synthetic_login_metadata.xlsx")
-user_ids = login_df["user_id"].unique()
+login_df = load_table("login", columns=["user_id"])
+user_ids = login_df["user_id"].unique().tolist()
 
 # Constants
 NUM_SESSIONS = 1000
 NUM_TRANSACTIONS = 1500
 NUM_FEATURES = 2000
 
-pages = ["dashboard", "transfer", "settings", "profile", "offers", "support"]
-transaction_types = ["fund_transfer", "bill_payment", "recharge", "upi_payment"]
-transaction_methods = ["NEFT", "IMPS", "RTGS", "UPI"]
-features = ["balance_check", "mini_statement", "set_pin", "block_card", "credit_score", "loan_offers"]
-
 # Generate Session Metadata
 def generate_session_data():
     session_data = []
@@ -76,10 +73,9 @@ session_df = generate_session_data()
 transaction_df = generate_transaction_data()
 feature_df = generate_feature_usage_data()
 
-# Save to Excel files
-os.makedirs("synthetic_logs", exist_ok=True)
-session_df.to_excel("synthetic_logs/session_metadata.xlsx", index=False)
-transaction_df.to_excel("synthetic_logs/transaction_metadata.xlsx", index=False)
-feature_df.to_excel("synthetic_logs/feature_usage_logs.xlsx", index=False)
+# Save to the columnar store
+write_table(session_df, "session")
+write_table(transaction_df, "transaction")
+write_table(feature_df, "feature")
 
 session_df.head(), transaction_df.head(), feature_df.head()
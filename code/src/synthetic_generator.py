@@ -0,0 +1,289 @@
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from log_store import TIMESTAMP_UNIT, append_table, write_table
+from schema import (
+    channels, device_types, features, locations, login_methods, os_browsers, page_paths, pages, resolutions,
+    transaction_methods, transaction_types,
+)
+
+# Vectorized synthetic log generator for load tests.
+# Draws whole columns from seeded numpy.random.Generator streams (one stream per table and one
+# for the user profiles), emits time-ordered chunks straight into the columnar store, skews
+# activity across users with a Zipf-like law, and injects labelled fraud patterns:
+#   impossible_travel - a second login from a far-away city minutes after a normal one
+#   device_swap       - a login from a device/browser/IP the user has never used
+#   bursty_transfer   - a burst of large fund transfers to new recipients within minutes
+# Ground truth goes to the login_labels / transaction_labels tables.
+
+LOGIN_COLUMNS = [
+    'user_id', 'timestamp', 'device_type', 'os_browser', 'screen_resolution',
+    'ip', 'lat', 'lon', 'city', 'login_method', 'channel'
+]
+
+SPAN_DAYS = 70
+CHUNK_SIZE = 1_000_000
+
+# Stream ids for SeedSequence.spawn, fixed so each table is reproducible on its own
+STREAMS = {"profiles": 0, "login": 1, "session": 2, "transaction": 3, "feature": 4}
+
+
+def _rng(seed, stream):
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(STREAMS[stream],)))
+
+
+def user_weights(n_users, skew):
+    # Zipf-like activity: the rank-r user is 1/r^skew as active as the busiest one (skew=0 is uniform)
+    weights = 1.0 / np.arange(1, n_users + 1) ** skew
+    return weights / weights.sum()
+
+
+def _random_ips(rng, n):
+    octets = rng.integers(1, 256, size=(n, 4)).astype(str)
+    return np.array([".".join(row) for row in octets], dtype=object)
+
+
+def create_user_profiles(n_users, seed=0):
+    rng = _rng(seed, "profiles")
+    user_ids = np.array([f"U{str(i).zfill(4)}" for i in range(1, n_users + 1)], dtype=object)
+
+    device_idx = rng.integers(0, len(device_types), n_users)
+    device = np.array(device_types, dtype=object)[device_idx]
+    os_browser = np.empty(n_users, dtype=object)
+    resolution = np.empty(n_users, dtype=object)
+    for i, name in enumerate(device_types):
+        mask = device_idx == i
+        os_browser[mask] = rng.choice(os_browsers[name], mask.sum())
+        resolution[mask] = rng.choice(resolutions[name], mask.sum())
+
+    return pd.DataFrame({
+        "user_id": user_ids,
+        "device_type": device,
+        "os_browser": os_browser,
+        "screen_resolution": resolution,
+        "ip": _random_ips(rng, n_users),
+        "location": rng.integers(0, len(locations), n_users),
+    })
+
+
+def _time_windows(n_events, chunk_size, end_time, span_days):
+    # Consecutive time windows, one per chunk, so chunks come out in time order
+    n_chunks = max(1, -(-n_events // chunk_size))
+    edges = pd.date_range(end=end_time, periods=n_chunks + 1, freq=pd.Timedelta(days=span_days) / n_chunks)
+    for k in range(n_chunks):
+        size = min(chunk_size, n_events - k * chunk_size)
+        yield size, edges[k], edges[k + 1]
+
+
+def _timestamps(rng, size, start, end):
+    # In the store's unit, so generated tables match synced rows
+    offsets = np.sort(rng.integers(0, (end - start).value, size))
+    return pd.to_datetime(start.value + offsets, utc=True).as_unit(TIMESTAMP_UNIT)
+
+
+def _login_frame(profiles, user_idx, timestamps, rng):
+    loc = profiles['location'].to_numpy()[user_idx]
+    return pd.DataFrame({
+        "user_id": profiles['user_id'].to_numpy()[user_idx],
+        "timestamp": timestamps,
+        "device_type": profiles['device_type'].to_numpy()[user_idx],
+        "os_browser": profiles['os_browser'].to_numpy()[user_idx],
+        "screen_resolution": profiles['screen_resolution'].to_numpy()[user_idx],
+        "ip": profiles['ip'].to_numpy()[user_idx],
+        "lat": np.array([l["lat"] for l in locations])[loc],
+        "lon": np.array([l["lon"] for l in locations])[loc],
+        "city": np.array([l["city"] for l in locations], dtype=object)[loc],
+        "login_method": rng.choice(np.array(login_methods, dtype=object), len(user_idx)),
+        "channel": rng.choice(np.array(channels, dtype=object), len(user_idx)),
+    })
+
+
+def _inject_login_fraud(chunk, profiles, user_idx, rng, fraud_rate):
+    n_fraud = rng.binomial(len(chunk), fraud_rate)
+    if n_fraud == 0:
+        return chunk, chunk.iloc[:0].assign(fraud_pattern=pd.Series(dtype=object))
+    picked = rng.choice(len(chunk), n_fraud, replace=False)
+    fraud = chunk.iloc[picked].copy()
+    fraud['timestamp'] = fraud['timestamp'] + pd.to_timedelta(rng.integers(1, 60, n_fraud), unit='min')
+    pattern = np.where(rng.random(n_fraud) < 0.5, "impossible_travel", "device_swap").astype(object)
+
+    travel = pattern == "impossible_travel"
+    if travel.any():
+        # Any other city in the list is > 1,100 km away, i.e. > 1,100 km/h within the hour
+        home = profiles['location'].to_numpy()[user_idx[picked[travel]]]
+        away = (home + rng.integers(1, len(locations), travel.sum())) % len(locations)
+        fraud.loc[fraud.index[travel], 'lat'] = np.array([l["lat"] for l in locations])[away]
+        fraud.loc[fraud.index[travel], 'lon'] = np.array([l["lon"] for l in locations])[away]
+        fraud.loc[fraud.index[travel], 'city'] = np.array([l["city"] for l in locations], dtype=object)[away]
+
+    swap = ~travel
+    if swap.any():
+        home_device = profiles['device_type'].to_numpy()[user_idx[picked[swap]]]
+        new_device = np.array([
+            device_types[(device_types.index(d) + offset) % len(device_types)]
+            for d, offset in zip(home_device, rng.integers(1, len(device_types), swap.sum()))
+        ], dtype=object)
+        fraud.loc[fraud.index[swap], 'device_type'] = new_device
+        fraud.loc[fraud.index[swap], 'os_browser'] = [rng.choice(os_browsers[d]) for d in new_device]
+        fraud.loc[fraud.index[swap], 'screen_resolution'] = [rng.choice(resolutions[d]) for d in new_device]
+        fraud.loc[fraud.index[swap], 'ip'] = _random_ips(rng, swap.sum())
+
+    fraud['fraud_pattern'] = pattern
+    combined = pd.concat([chunk, fraud.drop(columns='fraud_pattern')], ignore_index=True)
+    combined = combined.sort_values('timestamp', kind='stable').reset_index(drop=True)
+    return combined, fraud
+
+
+def generate_logins(n_events, n_users, skew=1.0, seed=0, chunk_size=CHUNK_SIZE, fraud_rate=0.001,
+                    end_time=None, span_days=SPAN_DAYS, profiles=None):
+    # Yields (logins, labels) chunk by chunk, in time order
+    rng = _rng(seed, "login")
+    profiles = create_user_profiles(n_users, seed) if profiles is None else profiles
+    weights = user_weights(n_users, skew)
+    end_time = pd.Timestamp(end_time or datetime.now(timezone.utc))
+
+    for size, start, end in _time_windows(n_events, chunk_size, end_time, span_days):
+        user_idx = rng.choice(n_users, size, p=weights)
+        timestamps = _timestamps(rng, size, start, end)
+        chunk = _login_frame(profiles, user_idx, timestamps, rng)
+        chunk, labels = _inject_login_fraud(chunk, profiles, user_idx, rng, fraud_rate)
+        yield chunk[LOGIN_COLUMNS], labels[['user_id', 'timestamp', 'ip', 'fraud_pattern']]
+
+
+def generate_sessions(n_events, user_ids, weights, seed=0, chunk_size=CHUNK_SIZE, end_time=None, span_days=SPAN_DAYS):
+    rng = _rng(seed, "session")
+    end_time = pd.Timestamp(end_time or datetime.now(timezone.utc))
+    for size, start, end in _time_windows(n_events, chunk_size, end_time, span_days):
+        # 2-6 distinct pages per session: a random permutation of page codes per row, cut at a random length
+        order = np.argsort(rng.random((size, len(pages))), axis=1)
+        lengths = rng.integers(2, len(pages) + 1, size)
+        visited = order[np.arange(len(pages)) < lengths[:, None]]
+        yield pd.DataFrame({
+            "user_id": user_ids[rng.choice(len(user_ids), size, p=weights)],
+            "timestamp": _timestamps(rng, size, start, end),
+            "session_duration_sec": np.round(rng.uniform(30, 900, size), 2),
+            "pages_visited": page_paths(np.concatenate([[0], np.cumsum(lengths)]), visited),
+        })
+
+
+def generate_transactions(n_events, user_ids, weights, seed=0, chunk_size=CHUNK_SIZE, burst_rate=0.0005,
+                          end_time=None, span_days=SPAN_DAYS):
+    rng = _rng(seed, "transaction")
+    end_time = pd.Timestamp(end_time or datetime.now(timezone.utc))
+    for size, start, end in _time_windows(n_events, chunk_size, end_time, span_days):
+        chunk = pd.DataFrame({
+            "user_id": user_ids[rng.choice(len(user_ids), size, p=weights)],
+            "timestamp": _timestamps(rng, size, start, end),
+            "transaction_type": rng.choice(np.array(transaction_types, dtype=object), size),
+            "amount": np.round(rng.uniform(10, 5000, size), 2),
+            "recipient": np.char.add("ACC", rng.integers(10000, 100000, size).astype(str)).astype(object),
+            "method": rng.choice(np.array(transaction_methods, dtype=object), size),
+        })
+
+        # Bursts: 5-15 large transfers to fresh recipients within 10 minutes of a normal transaction
+        n_bursts = rng.binomial(size, burst_rate)
+        bursts = pd.DataFrame(columns=list(chunk.columns) + ['fraud_pattern'])
+        if n_bursts:
+            anchors = chunk.iloc[rng.choice(size, n_bursts, replace=False)]
+            burst_sizes = rng.integers(5, 16, n_bursts)
+            rows = anchors.loc[anchors.index.repeat(burst_sizes)].reset_index(drop=True)
+            n = len(rows)
+            rows['timestamp'] = rows['timestamp'] + pd.to_timedelta(rng.integers(0, 600, n), unit='s')
+            rows['transaction_type'] = "fund_transfer"
+            rows['amount'] = np.round(rng.uniform(20000, 100000, n), 2)
+            rows['recipient'] = np.char.add("ACC", rng.integers(100000, 1000000, n).astype(str)).astype(object)
+            rows['method'] = rng.choice(np.array(["IMPS", "UPI"], dtype=object), n)
+            bursts = rows.assign(fraud_pattern="bursty_transfer")
+            chunk = pd.concat([chunk, rows], ignore_index=True).sort_values('timestamp', kind='stable')
+        yield chunk.reset_index(drop=True), bursts[['user_id', 'timestamp', 'recipient', 'fraud_pattern']]
+
+
+def generate_feature_usage(n_events, user_ids, weights, seed=0, chunk_size=CHUNK_SIZE, end_time=None, span_days=SPAN_DAYS):
+    rng = _rng(seed, "feature")
+    end_time = pd.Timestamp(end_time or datetime.now(timezone.utc))
+    for size, start, end in _time_windows(n_events, chunk_size, end_time, span_days):
+        yield pd.DataFrame({
+            "user_id": user_ids[rng.choice(len(user_ids), size, p=weights)],
+            "timestamp": _timestamps(rng, size, start, end),
+            "feature": rng.choice(np.array(features, dtype=object), size),
+            "frequency": rng.integers(1, 11, size),
+        })
+
+
+def _write_stream(chunks, table):
+    total = 0
+    for i, df in enumerate(chunks):
+        (write_table if i == 0 else append_table)(df, table)
+        total += len(df)
+    return total
+
+
+def _write_labelled_stream(chunks, table, label_table):
+    total = labels_total = 0
+    labels = []
+    for i, (df, label_df) in enumerate(chunks):
+        (write_table if i == 0 else append_table)(df, table)
+        total += len(df)
+        labels.append(label_df)
+        labels_total += len(label_df)
+    write_table(pd.concat(labels, ignore_index=True), label_table)
+    return total, labels_total
+
+
+def generate_all(n_logins, n_users, n_sessions=None, n_transactions=None, n_features=None,
+                 skew=1.0, seed=0, chunk_size=CHUNK_SIZE, fraud_rate=0.001, burst_rate=0.0005):
+    # Same ratios as the sample data: 1000 sessions, 1500 transactions and 2000 feature events per 500 logins
+    n_sessions = n_logins * 2 if n_sessions is None else n_sessions
+    n_transactions = n_logins * 3 if n_transactions is None else n_transactions
+    n_features = n_logins * 4 if n_features is None else n_features
+    end_time = pd.Timestamp(datetime.now(timezone.utc))
+
+    profiles = create_user_profiles(n_users, seed)
+    user_ids = profiles['user_id'].to_numpy()
+    weights = user_weights(n_users, skew)
+
+    counts = {}
+    counts['login'], counts['login_labels'] = _write_labelled_stream(
+        generate_logins(n_logins, n_users, skew, seed, chunk_size, fraud_rate, end_time, profiles=profiles),
+        "login", "login_labels",
+    )
+    counts['session'] = _write_stream(
+        generate_sessions(n_sessions, user_ids, weights, seed, chunk_size, end_time), "session"
+    )
+    counts['transaction'], counts['transaction_labels'] = _write_labelled_stream(
+        generate_transactions(n_transactions, user_ids, weights, seed, chunk_size, burst_rate, end_time),
+        "transaction", "transaction_labels",
+    )
+    counts['feature'] = _write_stream(
+        generate_feature_usage(n_features, user_ids, weights, seed, chunk_size, end_time), "feature"
+    )
+    return counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate large synthetic log tables into the columnar store")
+    parser.add_argument("--logins", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--sessions", type=int, help="defaults to 2x logins")
+    parser.add_argument("--transactions", type=int, help="defaults to 3x logins")
+    parser.add_argument("--features", type=int, help="defaults to 4x logins")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent for per-user activity (0 = uniform)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--fraud-rate", type=float, default=0.001, help="share of logins followed by an injected fraud login")
+    parser.add_argument("--burst-rate", type=float, default=0.0005, help="share of transactions that start a transfer burst")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    counts = generate_all(
+        args.logins, args.users, args.sessions, args.transactions, args.features,
+        skew=args.skew, seed=args.seed, chunk_size=args.chunk_size,
+        fraud_rate=args.fraud_rate, burst_rate=args.burst_rate,
+    )
+    for table, rows in counts.items():
+        print(f"{table}: {rows} rows")
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from log_store import PARTITION_COLUMN
+
+# Time-range access to the log tables.
+# In memory, rows are kept sorted by timestamp (per user in UserIndex, table-wide in TimeIndex)
+# and a window is two binary searches and a positional slice, so a 24-hour query costs the
+# same whatever the retention. On disk, day partitions outside the window are never opened.
+# Windows are half-open [start, end) in UTC; None leaves that side unbounded.
+
+# Label -> trailing window, relative to the latest login
+RELATIVE_WINDOWS = {
+    "All time": None,
+    "Last 24 hours": pd.Timedelta(hours=24),
+    "Last 7 days": pd.Timedelta(days=7),
+    "Last 30 days": pd.Timedelta(days=30),
+}
+
+
+def as_utc(value):
+    if value is None:
+        return None
+    value = pd.Timestamp(value)
+    return value.tz_localize("UTC") if value.tzinfo is None else value.tz_convert("UTC")
+
+
+def _naive(value):
+    # Sorted timestamp arrays are naive UTC datetime64 (Series.values)
+    return as_utc(value).tz_convert(None).to_datetime64()
+
+
+def window_bounds(times, start=None, end=None):
+    # (i, j) such that times[i:j] lies in [start, end); times sorted, naive UTC datetime64
+    i = 0 if start is None else int(np.searchsorted(times, _naive(start), side='left'))
+    j = len(times) if end is None else int(np.searchsorted(times, _naive(end), side='left'))
+    return i, max(i, j)
+
+
+def relative_window(label, latest):
+    # (start, end) of a RELATIVE_WINDOWS entry ending just after `latest`; (None, None) for all time
+    length = RELATIVE_WINDOWS[label]
+    if length is None or latest is None:
+        return None, None
+    end = as_utc(latest) + pd.Timedelta(microseconds=1)
+    return end - length, end
+
+
+def window_filter(start=None, end=None):
+    # Dataset filter for [start, end), or None for all time. The day-partition terms let Arrow
+    # skip whole files outside the window; the timestamp terms trim the edge days
+    terms = []
+    if start is not None:
+        start = as_utc(start)
+        terms += [ds.field(PARTITION_COLUMN) >= start.strftime("%Y-%m-%d"), ds.field("timestamp") >= start]
+    if end is not None:
+        last = as_utc(end) - pd.Timedelta(microseconds=1)
+        terms += [ds.field(PARTITION_COLUMN) <= last.strftime("%Y-%m-%d"), ds.field("timestamp") < as_utc(end)]
+    if not terms:
+        return None
+    expression = terms[0]
+    for term in terms[1:]:
+        expression &= term
+    return expression
+
+
+class TimeIndex:
+    def __init__(self, df):
+        # Table-wide time order over a frame that is left as it is
+        self.frame = df
+        values = df['timestamp'].values
+        self.order = np.argsort(values, kind='stable')
+        self.times = values[self.order]
+
+    def __len__(self):
+        return len(self.times)
+
+    def span(self):
+        if not len(self.times):
+            return None, None
+        return as_utc(self.times[0]), as_utc(self.times[-1])
+
+    def window(self, start=None, end=None):
+        # Rows in [start, end), in time order
+        i, j = window_bounds(self.times, start, end)
+        return self.frame.iloc[self.order[i:j]]
+
+    def count(self, start=None, end=None):
+        i, j = window_bounds(self.times, start, end)
+        return j - i
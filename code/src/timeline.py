@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+from anomaly_scoring import RISK_MEDIUM
+from schema import format_pages
+
+# Cross-table joins on time.
+# Sessions, transactions and feature usage are attributed to the user's most recent login
+# with one merge_asof over the time-sorted tables (grouped by user, no per-user loops), and
+# each login gets windowed features of what followed it, e.g. the amount transferred within
+# 10 minutes. user_timeline() interleaves one user's rows from all four tables.
+
+POST_LOGIN_WINDOW = pd.Timedelta(minutes=10)
+TRANSFER_TYPES = ["fund_transfer"]
+
+LOGIN_CONTEXT_COLUMNS = {
+    'timestamp': 'login_time',
+    'anomaly_score': 'login_score',
+    'anomaly_reason': 'login_reason',
+}
+
+
+def _shared_codes(frames, key):
+    # merge_asof groups fastest on integers: map each frame's user vocabulary onto a shared one
+    columns = [frame[key].astype("category") for frame in frames]
+    vocabulary = pd.Index(sorted(set().union(*(col.cat.categories for col in columns))))
+    return [vocabulary.get_indexer(col.cat.categories)[col.cat.codes.to_numpy()] for col in columns]
+
+
+def preceding_login_rows(events, logins, key='user_id', tolerance=None):
+    # Position in `logins` of each event's most recent login by the same user (-1 if none)
+    event_codes, login_codes = _shared_codes([events, logins], key)
+    left = pd.DataFrame({
+        '_key': event_codes, 'timestamp': events['timestamp'].array, '_event_row': np.arange(len(events)),
+    })
+    right = pd.DataFrame({'_key': login_codes, 'timestamp': logins['timestamp'].array, 'login_row': np.arange(len(logins))})
+    joined = pd.merge_asof(
+        left.sort_values('timestamp', kind='stable'),
+        right.sort_values('timestamp', kind='stable'),
+        on='timestamp', by='_key', direction='backward', tolerance=tolerance,
+    )
+    login_row = np.full(len(events), -1, dtype=np.int64)
+    login_row[joined['_event_row'].to_numpy()] = joined['login_row'].fillna(-1).to_numpy(dtype=np.int64)
+    return login_row
+
+
+def attribute_to_logins(events, logins, key='user_id', tolerance=None):
+    # Adds the preceding login's position (login_row) and its time / score / reason to each event
+    login_row = preceding_login_rows(events, logins, key, tolerance)
+    attributed = events.copy()
+    attributed['login_row'] = login_row
+    for col, name in LOGIN_CONTEXT_COLUMNS.items():
+        if col in logins.columns:
+            values = logins[col].reset_index(drop=True)
+            if values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+                # Few distinct reasons: gather codes, not millions of strings
+                values = values.astype("category")
+            # -1 isn't a position, so unmatched events get NaN / NaT
+            attributed[name] = values.reindex(login_row).array
+    return attributed
+
+
+def _rows_within(events, logins, window, key):
+    # Preceding-login rows, reusing attribute_to_logins output when given; -1 outside the window
+    if 'login_row' in events.columns:
+        rows = events['login_row'].to_numpy().copy()
+        matched = rows >= 0
+        # .values: naive UTC datetime64, not an object array of Timestamps
+        login_time = logins['timestamp'].values[rows[matched]]
+        elapsed = events['timestamp'].values[matched] - login_time
+        rows[np.flatnonzero(matched)[elapsed > window.to_timedelta64()]] = -1
+        return rows
+    return preceding_login_rows(events, logins, key, tolerance=window)
+
+
+def post_login_activity(logins, transactions=None, sessions=None, window=POST_LOGIN_WINDOW, key='user_id'):
+    # Per login: activity attributed to it that started within `window` of the login
+    features = pd.DataFrame(index=logins.index)
+    if transactions is not None:
+        rows = _rows_within(transactions, logins, window, key)
+        matched = rows >= 0
+        is_transfer = transactions['transaction_type'].isin(TRANSFER_TYPES).to_numpy()[matched]
+        amount = transactions['amount'].to_numpy(dtype=float)[matched]
+        rows = rows[matched]
+        features['post_login_transactions'] = np.bincount(rows, minlength=len(logins))
+        features['post_login_amount'] = np.bincount(rows, weights=amount, minlength=len(logins))
+        features['post_login_transfer_amount'] = np.bincount(rows, weights=amount * is_transfer, minlength=len(logins))
+    if sessions is not None:
+        rows = _rows_within(sessions, logins, window, key)
+        features['post_login_sessions'] = np.bincount(rows[rows >= 0], minlength=len(logins))
+    return features
+
+
+def with_post_login_activity(logins, transactions=None, sessions=None, window=POST_LOGIN_WINDOW, key='user_id'):
+    features = post_login_activity(logins, transactions, sessions, window, key)
+    return pd.concat([logins, features], axis=1)
+
+
+def risky_transfers(logins, min_score=RISK_MEDIUM):
+    # Anomalous logins that were followed by a transfer inside the window
+    flagged = (logins['anomaly_score'] > min_score) & (logins['post_login_transfer_amount'] > 0)
+    return logins[flagged]
+
+
+def user_timeline(indexes, user_id, start=None, end=None):
+    # One user's rows from every table, interleaved by time (optionally only [start, end))
+    describe = {
+        "login": lambda df: df['device_type'].astype(str) + " / " + df['login_method'].astype(str)
+        + " / " + df['channel'].astype(str) + " from " + df['city'].astype(str),
+        "session": lambda df: pd.Series(format_pages(df['pages_visited'])),
+        "transaction": lambda df: df['transaction_type'].astype(str) + " " + df['amount'].round(2).astype(str)
+        + " via " + df['method'].astype(str),
+        "feature": lambda df: df['feature'].astype(str) + " x" + df['frequency'].astype(str),
+    }
+    parts = []
+    for table, detail in describe.items():
+        rows = indexes[table].get(user_id, start, end)
+        if len(rows):
+            parts.append(pd.DataFrame({
+                'timestamp': rows['timestamp'].array,
+                'event': table,
+                'detail': detail(rows).to_numpy(),
+                'anomaly_score': rows['anomaly_score'].to_numpy() if 'anomaly_score' in rows.columns else np.nan,
+            }))
+    if not parts:
+        return pd.DataFrame(columns=['timestamp', 'event', 'detail', 'anomaly_score'])
+    return pd.concat(parts, ignore_index=True).sort_values('timestamp', kind='stable', ignore_index=True)
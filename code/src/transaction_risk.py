@@ -0,0 +1,145 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+import log_store
+from scoring_utils import reason_labels, robust_z
+
+# Rule-based transaction risk, in one grouped pass over all users.
+# Rows are sorted by (user, time) once; sliding-window counts and sums come from a searchsorted
+# over a per-user time key plus cumulative sums, amount outliers from per-user median / MAD,
+# velocity from the window count against the user's own rate, and first-seen recipients /
+# method switches from comparisons with the user's earlier rows.
+# Scored tables are saved per table version so the dashboard doesn't recompute them.
+
+TRANSACTION_RISK_SUBDIR = "transaction_risk"
+
+# Trailing windows, each including the current transaction
+WINDOWS = {
+    "10min": pd.Timedelta(minutes=10),
+    "1h": pd.Timedelta(hours=1),
+    "24h": pd.Timedelta(hours=24),
+}
+
+RULES = [
+    # (reason, flag column, weight)
+    ("High Velocity", 'high_velocity', 0.3),
+    ("Unusual Amount", 'unusual_amount', 0.35),
+    ("New Recipient", 'new_recipient', 0.15),
+    ("Method Switch", 'method_switch', 0.1),
+]
+VELOCITY_WINDOW = "10min"
+VELOCITY_MAX_COUNT = 3
+# Poisson-style allowance above the user's usual count per window
+VELOCITY_SIGMAS = 4
+AMOUNT_Z_THRESHOLD = 3.5
+
+MAX_SCORE = 1.0
+
+SIGNAL_COLUMNS = [
+    *(f'txn_{stat}_{name}' for name in WINDOWS for stat in ('count', 'amount')),
+    'amount_z', 'new_recipient', 'method_switch', 'high_velocity', 'unusual_amount',
+    'txn_risk_score', 'txn_risk_reason',
+]
+
+
+def _codes(column):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy()
+    return pd.factorize(column)[0]
+
+
+def window_stats(users, seconds, amounts, window):
+    # users / seconds sorted by (user, time); count and sum over (t - window, t] per row
+    if not len(seconds):
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    width = int(window.total_seconds())
+    span = int(seconds.max() - seconds.min()) + width + 1
+    # One sortable int64 key: users occupy disjoint ranges, so a window never reaches into the previous user
+    key = users.astype(np.int64) * span + (seconds - seconds.min())
+    start = np.searchsorted(key, key - width, side='right')
+    position = np.arange(len(key))
+    totals = np.concatenate([[0.0], np.cumsum(amounts)])
+    return position - start + 1, totals[position + 1] - totals[start]
+
+
+def expected_count(users, seconds, window):
+    # Each user's average number of transactions per window over their active span
+    counts = np.bincount(users)
+    first = np.full(len(counts), np.iinfo(np.int64).max)
+    last = np.full(len(counts), np.iinfo(np.int64).min)
+    np.minimum.at(first, users, seconds)
+    np.maximum.at(last, users, seconds)
+    span = np.maximum(last - first, window.total_seconds())
+    return (counts * window.total_seconds() / span)[users]
+
+
+def score_transactions(df, key='user_id'):
+    # Returns df (same index and row order) with the signal columns plus txn_risk_score / txn_risk_reason
+    seconds = df['timestamp'].values.astype("datetime64[s]").astype(np.int64)
+    order = np.lexsort((seconds, _codes(df[key])))
+    users = _codes(df[key])[order]
+    seconds = seconds[order]
+    amounts = df['amount'].to_numpy(dtype=float)[order]
+    recipients = _codes(df['recipient'])[order]
+    methods = _codes(df['method'])[order]
+    same_user = np.r_[False, users[1:] == users[:-1]]
+
+    signals = {}
+    for name, window in WINDOWS.items():
+        signals[f'txn_count_{name}'], signals[f'txn_amount_{name}'] = window_stats(users, seconds, amounts, window)
+    signals['amount_z'] = robust_z(users, amounts)
+    signals['new_recipient'] = ~pd.DataFrame({'user': users, 'recipient': recipients}).duplicated().to_numpy()
+    signals['method_switch'] = same_user & np.r_[False, methods[1:] != methods[:-1]]
+
+    # Busy accounts always have several transactions per window; compare with the user's own rate
+    expected = expected_count(users, seconds, WINDOWS[VELOCITY_WINDOW]) if len(users) else np.zeros(0)
+    limit = np.maximum(VELOCITY_MAX_COUNT, expected + VELOCITY_SIGMAS * np.sqrt(expected))
+    signals['high_velocity'] = signals[f'txn_count_{VELOCITY_WINDOW}'] > limit
+    signals['unusual_amount'] = signals['amount_z'] > AMOUNT_Z_THRESHOLD
+
+    flags = [signals[column] for _, column, _ in RULES]
+    score = sum(flagged * weight for flagged, (_, _, weight) in zip(flags, RULES))
+    signals['txn_risk_score'] = np.clip(score, None, MAX_SCORE)
+    signals['txn_risk_reason'] = reason_labels(flags, [name for name, _, _ in RULES])
+
+    # Back to the caller's row order
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(len(order))
+    scored = df.copy()
+    for col in SIGNAL_COLUMNS:
+        scored[col] = signals[col][inverse]
+    return scored
+
+
+def transaction_risk_dir():
+    # Follows log_store.use_store()
+    return os.path.join(log_store.STORE_DIR, TRANSACTION_RISK_SUBDIR)
+
+
+def save_scores(scored, version, path=None):
+    path = path or transaction_risk_dir()
+    # Only the derived columns are kept; they line up with the table's load order
+    os.makedirs(path, exist_ok=True)
+    target = os.path.join(path, f"{version}.parquet")
+    scored[SIGNAL_COLUMNS].to_parquet(target + ".tmp", index=False)
+    os.replace(target + ".tmp", target)
+    for stale in glob.glob(os.path.join(path, "*.parquet")):
+        if stale != target:
+            os.remove(stale)
+
+
+def load_or_score(df, version, path=None):
+    path = path or transaction_risk_dir()
+    # Reuse the scores saved for this table version, otherwise score once and save
+    target = os.path.join(path, f"{version}.parquet")
+    if os.path.exists(target):
+        signals = pd.read_parquet(target)
+        if len(signals) == len(df):
+            signals.index = df.index
+            return pd.concat([df, signals], axis=1)
+    scored = score_transactions(df)
+    save_scores(scored, version, path)
+    return scored
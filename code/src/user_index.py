@@ -0,0 +1,64 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+from time_index import window_bounds
+
+# User-partitioned index over a log table.
+# Rows are sorted once by (user_id, timestamp) and each user maps to an offset range,
+# so a user lookup is a positional slice instead of a boolean mask over the whole table,
+# and a time window inside it is a binary search over that user's sorted timestamps.
+
+
+class UserIndex:
+    def __init__(self, df, key='user_id', sort_by='timestamp'):
+        self.key = key
+        df = df.copy()
+        if not isinstance(df[key].dtype, pd.CategoricalDtype):
+            df[key] = df[key].astype("category")
+        sort_cols = [key, sort_by] if sort_by in df.columns else [key]
+        self.frame = df.sort_values(sort_cols, kind='stable').reset_index(drop=True)
+
+        categories = self.frame[key].cat.categories
+        counts = np.bincount(self.frame[key].cat.codes.to_numpy(), minlength=len(categories))
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        self.offsets = {
+            user: (int(start), int(end))
+            for user, start, end, count in zip(categories, starts, ends, counts)
+            if count > 0
+        }
+        self.times = self.frame['timestamp'].values if sort_by == 'timestamp' and sort_by in df.columns else None
+
+    def __contains__(self, user_id):
+        return user_id in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def users(self):
+        return list(self.offsets)
+
+    def get(self, user_id, start=None, end=None):
+        # All of the user's rows, or those in [start, end) when either bound is given
+        first, last = self.offsets.get(user_id, (0, 0))
+        if (start is not None or end is not None) and self.times is not None:
+            i, j = window_bounds(self.times[first:last], start, end)
+            first, last = first + i, first + j
+        return self.frame.iloc[first:last]
+
+    def assign(self, **columns):
+        # Same rows and offsets with columns added (or replaced); values are in frame order
+        index = copy.copy(self)
+        index.frame = self.frame.assign(**columns)
+        return index
+
+    def groups(self):
+        # Single pass over the sorted table
+        for user, (start, end) in self.offsets.items():
+            yield user, self.frame.iloc[start:end]
+
+
+def build_indexes(tables):
+    return {name: UserIndex(df) for name, df in tables.items()}
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The modules under code/src are run as scripts and import each other by name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+import log_store  # noqa: E402
+
+END_TIME = pd.Timestamp("2025-01-31", tz="UTC")
+
+CITIES = {
+    "New York": (40.7128, -74.0060),
+    "Los Angeles": (34.0522, -118.2437),
+    "Chicago": (41.8781, -87.6298),
+    "Houston": (29.7604, -95.3698),
+    "Miami": (25.7617, -80.1918),
+}
+DEVICES = {
+    "mobile": ("Android/Chrome", "1080x2340"),
+    "desktop": ("Windows/Chrome", "1920x1080"),
+    "tablet": ("iOS/Safari", "1536x2048"),
+}
+
+
+def make_logins(n_logins, n_users, seed=0, span_days=10, end_time=END_TIME):
+    # Time-ordered logins: each user mostly keeps a home city, device and IP, with a share of
+    # other cities (geo-velocity hits when the previous login was recent) and other devices
+    rng = np.random.default_rng(seed)
+    users = rng.integers(0, n_users, n_logins)
+    offsets = np.sort(rng.integers(0, span_days * 86_400_000_000, n_logins))
+    cities, devices = list(CITIES), list(DEVICES)
+    home_city = rng.integers(0, len(cities), n_users)
+    home_device = rng.integers(0, len(devices), n_users)
+    city = np.where(rng.random(n_logins) < 0.9, home_city[users], rng.integers(0, len(cities), n_logins))
+    device = np.where(rng.random(n_logins) < 0.85, home_device[users], rng.integers(0, len(devices), n_logins))
+    ips = np.array([f"10.{i // 250}.{i % 250}.{rng.integers(1, 255)}" for i in range(n_users)], dtype=object)
+    return pd.DataFrame({
+        'user_id': np.array([f"U{i:04d}" for i in range(n_users)], dtype=object)[users],
+        'timestamp': pd.to_datetime((end_time - pd.Timedelta(days=span_days)).value // 1000 + offsets, unit="us", utc=True),
+        'device_type': np.array(devices, dtype=object)[device],
+        'os_browser': np.array([DEVICES[d][0] for d in devices], dtype=object)[device],
+        'screen_resolution': np.array([DEVICES[d][1] for d in devices], dtype=object)[device],
+        'ip': np.where(device == home_device[users], ips[users], "192.168.1.1"),
+        'lat': np.array([CITIES[c][0] for c in cities])[city],
+        'lon': np.array([CITIES[c][1] for c in cities])[city],
+        'city': np.array(cities, dtype=object)[city],
+        'login_method': rng.choice(np.array(["password", "biometric", "OTP"], dtype=object), n_logins, p=[0.6, 0.3, 0.1]),
+        'channel': rng.choice(np.array(["web", "app", "API"], dtype=object), n_logins, p=[0.3, 0.6, 0.1]),
+    })
+
+
+@pytest.fixture
+def login_store(tmp_path, monkeypatch):
+    # A small login table (3000 rows, 40 users, ten days) in a throwaway store
+    monkeypatch.setattr(log_store, "STORE_DIR", str(tmp_path / "store"))
+    log_store.write_table(make_logins(3000, 40, seed=7), "login")
+    return tmp_path / "store"
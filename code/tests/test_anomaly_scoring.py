@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+from geopy.distance import geodesic
+
+from anomaly_scoring import score_batch
+from log_store import load_table
+
+
+def score_per_user(login_df):
+    # The dashboard's original algorithm: one user at a time, modes from Series.mode()[0],
+    # geo-velocity between consecutive logins with geopy's geodesic distance
+    frames = []
+    for _, user_df in login_df.groupby('user_id', observed=True, sort=False):
+        user_df = user_df.sort_values('timestamp', kind='stable')
+        mode_device = user_df['device_type'].mode()[0]
+        mode_method = user_df['login_method'].mode()[0]
+        mode_channel = user_df['channel'].mode()[0]
+        mode_hour = user_df['login_hour'].mode()[0]
+
+        reasons, scores = [], []
+        previous = None
+        for row in user_df.itertuples():
+            reason, score = [], 0.0
+            if row.device_type != mode_device:
+                reason.append("Unusual Device")
+                score += 0.25
+            if row.login_method != mode_method:
+                reason.append("Unusual Method")
+                score += 0.25
+            if row.channel != mode_channel:
+                reason.append("Unusual Channel")
+                score += 0.2
+            if abs(row.login_hour - mode_hour) > 3:
+                reason.append("Odd Login Hour")
+                score += 0.2
+            if previous is not None:
+                time_diff_hr = (row.timestamp - previous.timestamp).total_seconds() / 3600
+                if time_diff_hr > 0:
+                    distance_km = geodesic((previous.lat, previous.lon), (row.lat, row.lon)).km
+                    if distance_km / time_diff_hr > 500:
+                        reason.append("High GeoVelocity")
+                        score += 0.3
+            previous = row
+            reasons.append("; ".join(reason))
+            scores.append(min(score, 1.0))
+        frames.append(pd.DataFrame({'anomaly_reason': reasons, 'anomaly_score': scores}, index=user_df.index))
+    return pd.concat(frames).loc[login_df.index]
+
+
+def test_score_batch_matches_per_user_algorithm(login_store):
+    logins = load_table("login")
+    logins = logins.assign(login_hour=logins['timestamp'].dt.hour)
+    as_strings = logins.astype({col: str for col in ('user_id', 'device_type', 'login_method', 'channel')})
+    expected = score_per_user(as_strings)
+
+    scored = score_batch(logins, method="ellipsoidal")
+
+    assert (expected['anomaly_score'] > 0.4).any()
+    assert expected['anomaly_reason'].str.contains("High GeoVelocity").any()
+    assert scored['anomaly_reason'].tolist() == expected['anomaly_reason'].tolist()
+    np.testing.assert_allclose(scored['anomaly_score'].to_numpy(), expected['anomaly_score'].to_numpy())
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomaly_scoring import compute_baselines
+from baseline_store import BaselineStore, load_or_build
+from conftest import END_TIME, make_logins
+
+
+def _switching_user():
+    # 20 desktop logins two months ago, then 5 on mobile in the last week
+    logins = make_logins(25, 1, seed=2).assign(
+        timestamp=[END_TIME - pd.Timedelta(days=60, hours=i) for i in range(20)]
+        + [END_TIME - pd.Timedelta(days=i) for i in range(5)],
+        device_type=["desktop"] * 20 + ["mobile"] * 5,
+    )
+    return logins.sort_values('timestamp', ignore_index=True)
+
+
+def test_bulk_and_per_event_updates_match_a_full_scan():
+    logins = make_logins(2000, 30, seed=4)
+    bulk = BaselineStore.build(logins)
+    per_event = BaselineStore()
+    for event in logins.to_dict("records"):
+        per_event.update(event)
+
+    expected = compute_baselines(logins)
+    pd.testing.assert_frame_equal(bulk.modes_frame(), expected, check_dtype=False, check_names=False)
+    pd.testing.assert_frame_equal(per_event.modes_frame(), expected, check_dtype=False, check_names=False)
+    assert bulk.total_logins == per_event.total_logins
+
+
+def test_decay_lets_recent_behaviour_take_over():
+    logins = _switching_user()
+    kept = BaselineStore.build(logins)
+    decayed = BaselineStore.build(logins, half_life_days=7)
+
+    assert kept.mode("U0000", 'device_type') == "desktop"
+    assert decayed.mode("U0000", 'device_type') == "mobile"
+    # Each desktop login is worth about 0.5 ** (60 / 7) of a login today
+    assert decayed.counts("U0000", 'device_type')['desktop'] == pytest.approx(20 * 0.5 ** (60 / 7), rel=0.05)
+    assert decayed.total_logins["U0000"] == 25
+
+
+def test_incremental_decayed_updates_match_a_build():
+    logins = make_logins(1500, 20, seed=6)
+    built = BaselineStore.build(logins, half_life_days=3)
+    updated = BaselineStore(half_life_days=3)
+    for part in np.array_split(np.arange(len(logins)), 4):
+        updated.update_frame(logins.iloc[part])
+
+    assert updated.modes == built.modes
+    for user in built.users():
+        for col, counter in built.counters[user].items():
+            assert updated.counters[user][col] == pytest.approx(counter)
+
+
+def test_saved_baselines_are_reused_for_their_version_only(tmp_path):
+    logins = _switching_user()
+    first = load_or_build(logins, "v1", path=str(tmp_path / "baselines"), half_life_days=7)
+    again = load_or_build(logins.iloc[:0], "v1", path=str(tmp_path / "baselines"))
+    assert again.version == "v1" and again.half_life_days == 7
+    assert again.modes == first.modes and again.total_logins == first.total_logins
+
+    rebuilt = load_or_build(logins.iloc[:20], "v2", path=str(tmp_path / "baselines"))
+    assert rebuilt.version == "v2" and rebuilt.mode("U0000", 'device_type') == "desktop"
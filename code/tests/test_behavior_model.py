@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from anomaly_scoring import RISK_HIGH, RISK_MEDIUM
+from behavior_model import BehaviorModel
+from conftest import END_TIME, make_logins
+
+
+def _habitual(n=40):
+    # User "H" alternates between desktop at 09:00 and mobile at 21:00, among 30 ordinary users
+    population = make_logins(2000, 30, seed=1)
+    day = np.arange(n)
+    user = population.iloc[:n].assign(
+        user_id="H",
+        timestamp=END_TIME - pd.Timedelta(days=n) + pd.to_timedelta(day, unit="D")
+        + pd.to_timedelta(np.where(day % 2, 21, 9), unit="h"),
+        device_type=np.where(day % 2, "mobile", "desktop"),
+        os_browser=np.where(day % 2, "Android/Chrome", "Windows/Chrome"),
+        city="Chicago", login_method="password", channel="app",
+    )
+    return pd.concat([population, user], ignore_index=True), user
+
+
+def test_both_habits_are_ordinary_and_a_new_device_is_not():
+    logins, user = _habitual()
+    model = BehaviorModel.build(logins)
+    score, reason = model.score(user, leave_one_out=True)
+    assert score.max() < RISK_MEDIUM and set(reason) == {""}
+
+    later = user.iloc[[0, 1]].assign(timestamp=[END_TIME + pd.Timedelta(hours=9)] * 2)
+    later['device_type'] = ["tablet", "desktop"]
+    later['os_browser'] = ["iOS/Safari", "Windows/Chrome"]
+    score, reason = model.score(later)
+    assert score[0] > RISK_HIGH and "Unlikely Device" in reason[0]
+    assert score[1] < RISK_MEDIUM and reason[1] == ""
+
+
+def test_login_hours_wrap_around_midnight():
+    logins, user = _habitual()
+    probe = user.iloc[[0] * 4].assign(timestamp=[END_TIME + pd.Timedelta(hours=h) for h in (9, 21, 23, 3)])
+    ratio = BehaviorModel.build(logins).likelihoods(probe)['login_hour']
+
+    # 23:00 is two hours from the 21:00 habit; 03:00 six hours from either
+    assert np.allclose(ratio[:2], 1.0, atol=0.01)
+    assert ratio[2] > 0.5 > 0.1 > ratio[3]
+
+
+def test_update_and_reload_match_a_build(tmp_path):
+    logins, _ = _habitual()
+    built = BehaviorModel.build(logins)
+    updated = BehaviorModel.build(logins.iloc[:1000]).update(logins.iloc[1000:])
+    assert updated.total_logins == built.total_logins == len(logins)
+    np.testing.assert_allclose(updated.score(logins)[0], built.score(logins)[0])
+
+    updated.version = "v1"
+    updated.save(str(tmp_path / "model.npz"))
+    reloaded = BehaviorModel.load(str(tmp_path / "model.npz"))
+    assert reloaded.version == "v1"
+    np.testing.assert_array_equal(reloaded.score(logins, leave_one_out=True)[0], updated.score(logins, leave_one_out=True)[0])
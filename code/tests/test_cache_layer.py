@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+import streamlit as st
+
+import cache_layer
+import log_store
+from conftest import make_logins
+from snapshot import publish
+from sync_pipeline import saved_state, sync_logins
+from synthetic_generator import generate_all
+
+MERGES = ["_merge_login_scores", "_merge_sessions", "_merge_transactions"]
+
+
+@pytest.fixture
+def full_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_store, "STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(cache_layer, "_synced", {})
+    monkeypatch.setattr(cache_layer, "_built", set())
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    generate_all(3000, 40, seed=5, chunk_size=1000, fraud_rate=0.01, burst_rate=0.005)
+    yield
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+
+def _sync(tmp_path):
+    # Later logins for a quarter of the users (U0001-U0009) and one new user (U0000)
+    upload = tmp_path / "upload.csv"
+    later = make_logins(300, 10, seed=3, span_days=1, end_time=pd.Timestamp.now(tz="UTC") + pd.Timedelta(days=1))
+    later.to_csv(upload, index=False)
+    return sync_logins(str(upload), **saved_state())
+
+
+def test_merged_state_matches_a_full_build(full_store, tmp_path, monkeypatch):
+    merges = []
+    for name in MERGES:
+        merge = getattr(cache_layer, name)
+        monkeypatch.setattr(cache_layer, name, lambda *args, name=name, merge=merge: merges.append(name) or merge(*args))
+    previous = publish()
+    for table in log_store.TABLES:
+        cache_layer.user_index(table, previous)
+    cache_layer.risk_leaderboard(None, previous)
+    result = _sync(tmp_path)
+    version = publish()
+    cache_layer.apply_sync(previous, version, result['scores'])
+
+    merged = {table: cache_layer.user_index(table, version).frame for table in log_store.TABLES}
+    board = cache_layer.risk_leaderboard(None, version)
+    assert result['added'] == 300 and sorted(merges) == sorted(MERGES)
+
+    cache_layer._synced.clear()
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    for table, frame in merged.items():
+        pd.testing.assert_frame_equal(frame, cache_layer.user_index(table, version).frame, check_exact=True)
+    pd.testing.assert_frame_equal(board, cache_layer.risk_leaderboard(None, version), check_exact=True)
+    assert sorted(merges) == sorted(MERGES)
+
+
+def test_views_build_only_what_they_read(full_store, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("logins were scored")
+
+    monkeypatch.setattr(cache_layer, "score_batch", fail)
+    version = publish()
+    users = cache_layer.user_ids(version)
+    first, last = cache_layer.time_span(version)
+
+    assert users == sorted(users) and len(users) == 40 and first < last
+    shared, cluster, keys = cache_layer.user_links(users[0], version)
+    assert users[0] in cluster and len(keys)
+    assert len(cache_layer.user_rows("feature", users[0], version))
+    assert cache_layer._built == set()
@@ -0,0 +1,30 @@
+import contextvars
+
+import instrumentation
+from instrumentation import span, timed
+
+
+@timed("view:test")
+def _rows(n):
+    """n empty rows"""
+    with span("inner"):
+        return [None] * n
+
+
+def test_timed_keeps_the_function_identity():
+    assert _rows.__name__ == "_rows"
+    assert _rows.__qualname__ == "_rows"
+    assert _rows.__module__ == __name__
+    assert _rows.__doc__ == "n empty rows"
+    assert _rows.__wrapped__(2) == [None, None]
+
+
+def test_timed_records_nested_spans_only_when_enabled():
+    def run(enabled):
+        run = instrumentation.begin_run(enabled=enabled)
+        _rows(3)
+        return [(r['span'], r['rows']) for r in instrumentation.records(run)]
+
+    # A fresh context each time, as every Streamlit session has
+    assert contextvars.copy_context().run(run, False) == []
+    assert contextvars.copy_context().run(run, True) == [("view:test/inner", None), ("view:test", 3)]
@@ -0,0 +1,69 @@
+import pandas as pd
+
+from conftest import END_TIME, make_logins
+from linkage_index import LinkageIndex, load_or_build
+
+RING = ["R1", "R2", "R3"]
+
+
+def _with_ring(n_logins=2000, n_users=100, ip_users=RING[:2]):
+    # Ordinary users, then in the last hour: R1 and R2 on one IP, R2 and R3 on one odd device
+    logins = make_logins(n_logins, n_users, seed=5)
+    ring = make_logins(len(ip_users) + 2, 1, seed=6).assign(
+        user_id=[*ip_users, "R2", "R3"],
+        timestamp=[END_TIME + pd.Timedelta(minutes=i) for i in range(len(ip_users) + 2)],
+        ip=["203.0.113.7"] * len(ip_users) + ["198.51.100.2", "198.51.100.3"],
+        os_browser=["Android/Chrome"] * len(ip_users) + ["Linux/Firefox"] * 2,
+        screen_resolution=["1080x2340"] * len(ip_users) + ["800x600"] * 2,
+    )
+    return pd.concat([logins, ring], ignore_index=True)
+
+
+def test_shared_ip_and_fingerprint_join_a_ring():
+    index = LinkageIndex.build(_with_ring())
+
+    assert index.cluster("R1") == index.cluster("R3") == RING
+    # Home IPs have one user each; the shared 192.168.1.1 and the stock devices are too common to link
+    assert index.cluster("U0000") == ["U0000"]
+    shared = index.shared_with("R2")
+    assert shared['user_id'].tolist() == ["R1", "R3"] and shared['same_cluster'].all()
+    assert set(index.keys_of("R2")['kind']) == {"ip", "fingerprint", "city"}
+
+    grown = index.new_clusters(pd.Timedelta(hours=1))
+    assert len(grown) == 1 and grown.loc[0, 'size'] == 3
+    assert index.new_clusters(pd.Timedelta(hours=1), now=END_TIME + pd.Timedelta(days=1)).empty
+
+
+def test_incremental_ingest_matches_a_build():
+    logins = _with_ring()
+    built = LinkageIndex.build(logins)
+    ingested = LinkageIndex()
+    for start in range(0, len(logins), 300):
+        ingested.ingest(logins.iloc[start:start + 300])
+
+    assert ingested.total_logins == built.total_logins == len(logins)
+    assert {user: ingested.cluster(user) for user in built.parent} == {user: built.cluster(user) for user in built.parent}
+    key = ['kind', 'key', 'user_id']
+    pd.testing.assert_frame_equal(
+        ingested.pairs().sort_values(key, ignore_index=True), built.pairs().sort_values(key, ignore_index=True),
+    )
+
+
+def test_a_key_shared_too_widely_stops_linking():
+    crowd = [f"C{i:02d}" for i in range(10)]
+    index = LinkageIndex.build(_with_ring(ip_users=RING[:2] + crowd))
+
+    # Twelve accounts on one address is over the limit for 110 users: R1 falls out of the ring
+    assert index.limit < 12
+    assert index.cluster("R1") == ["R1"] and index.cluster("R2") == ["R2", "R3"]
+
+
+def test_saved_index_is_reused_for_its_version_only(tmp_path):
+    logins = _with_ring()
+    path = str(tmp_path / "linkage.parquet")
+    first = load_or_build(logins, "v1", path)
+    again = load_or_build(logins.iloc[:0], "v1", path)
+    assert again.version == "v1" and again.cluster("R1") == RING and again.total_logins == first.total_logins
+
+    rebuilt = load_or_build(logins.iloc[:-2], "v2", path)
+    assert rebuilt.version == "v2" and rebuilt.cluster("R1") == ["R1", "R2"]
@@ -0,0 +1,47 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import log_store
+
+
+def _logins(timestamps):
+    n = len(timestamps)
+    return pd.DataFrame({
+        'user_id': [f"U{i % 3:04d}" for i in range(n)],
+        'timestamp': timestamps,
+        'device_type': "mobile",
+        'os_browser': "Android/Chrome",
+        'screen_resolution': "1080x2340",
+        'ip': "10.0.0.1",
+        'lat': 40.7128,
+        'lon': -74.0060,
+        'city': "New York",
+        'login_method': "password",
+        'channel': "app",
+    })
+
+
+def test_appending_parsed_rows_to_a_nanosecond_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_store, "STORE_DIR", str(tmp_path))
+    # In-memory data (e.g. generated) carries nanoseconds, including sub-microsecond digits
+    generated = pd.to_datetime([1737936000_123456789 + i * 3_600_000_000_000 for i in range(48)], utc=True)
+    log_store.write_table(_logins(generated), "login")
+    # A part written before the unit was pinned
+    legacy = log_store.prepare_frame(_logins(generated[:4]), "login").assign(timestamp=generated[:4].as_unit("ns"))
+    legacy_dir = os.path.join(log_store.table_path("login"), "day=2025-01-27")
+    pq.write_table(pa.Table.from_pandas(legacy, preserve_index=False), os.path.join(legacy_dir, "part-legacy.parquet"))
+    # Uploaded rows are parsed from ISO strings, on a day that already has parts and one that doesn't
+    log_store.append_table(_logins(["2025-01-27T01:30:00Z", "2025-01-26T23:00:00.5+00:00"]), "login")
+
+    for path in log_store.list_parts("login"):
+        if not path.endswith("part-legacy.parquet"):
+            assert pq.read_schema(path).field("timestamp").type == log_store.TIMESTAMP_TYPE
+
+    logins = log_store.load_table("login")
+    assert len(logins) == 48 + 4 + 2
+    assert logins['timestamp'].dtype == "datetime64[us, UTC]"
+    assert logins['timestamp'].min() == pd.Timestamp("2025-01-26T23:00:00.5", tz="UTC")
+    assert (logins['timestamp'] == pd.Timestamp("2025-01-27T00:00:00.123456", tz="UTC")).sum() == 2
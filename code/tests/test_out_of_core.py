@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import log_store
+import out_of_core
+from anomaly_scoring import score_batch
+from conftest import make_logins
+from log_store import load_table
+from time_index import as_utc
+
+WINDOWS = [(None, None), ("2025-01-24 06:00", "2025-01-28")]
+
+
+@pytest.fixture
+def tied_store(tmp_path, monkeypatch):
+    # Timestamps on a ten-minute grid: many logins share one, some of them for the same user
+    monkeypatch.setattr(log_store, "STORE_DIR", str(tmp_path / "store"))
+    logins = make_logins(3000, 40, seed=7)
+    log_store.write_table(logins.assign(timestamp=logins['timestamp'].dt.floor("10min")), "login")
+
+
+def _expected(start, end):
+    logins = load_table("login")
+    if start is not None:
+        logins = logins[(logins['timestamp'] >= as_utc(start)) & (logins['timestamp'] < as_utc(end))]
+    # Time order, equal timestamps in table order
+    return score_batch(logins).sort_values('timestamp', kind='stable', ignore_index=True)
+
+
+@pytest.mark.parametrize("window", WINDOWS)
+def test_chunked_scores_match_score_batch(tied_store, window):
+    start, end = window
+    # Small chunks, so users' logins straddle many chunk boundaries and the merge reads 21-row blocks
+    baselines = out_of_core.build_baselines(chunk_size=257, start=start, end=end)
+    chunks = list(out_of_core.score_chunks(baselines, chunk_size=257, start=start, end=end))
+    chunked = pd.concat(chunks, ignore_index=True)
+    expected = _expected(start, end)
+
+    assert all(len(chunk) == 257 for chunk in chunks[:-1]) and 0 < len(chunks[-1]) <= 257
+    assert expected['timestamp'].duplicated().sum() > 100
+    assert len(chunked) == len(expected)
+    for col in ('user_id', 'timestamp', 'lat', 'lon', 'device_type', 'anomaly_reason'):
+        assert chunked[col].astype(str).tolist() == expected[col].astype(str).tolist()
+    np.testing.assert_allclose(chunked['anomaly_score'].to_numpy(), expected['anomaly_score'].to_numpy())
+
+
+def test_chunks_are_time_ordered_with_one_row_blocks(tied_store):
+    # More runs than rows per chunk: the merge reads one row of each run at a time
+    chunks = list(out_of_core.login_chunks(chunk_size=40))
+    merged = pd.concat(chunks, ignore_index=True)
+    expected = load_table("login").sort_values('timestamp', kind='stable', ignore_index=True)
+    assert len(chunks) == 75
+    assert merged['timestamp'].tolist() == expected['timestamp'].tolist()
+    assert merged['user_id'].astype(str).tolist() == expected['user_id'].astype(str).tolist()
@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+
+import scoring_service
+from anomaly_scoring import RISK_MEDIUM, score_batch
+from baseline_store import BaselineStore
+from conftest import END_TIME, make_logins
+from schema import ips_to_uint32
+from scoring_service import ScoringService, replay_events
+
+
+def _history_and_events():
+    # Ten days of history, then one later login per user; addresses as stored, in uint32
+    history = make_logins(3000, 30, seed=8)
+    later = make_logins(300, 30, seed=9, span_days=1, end_time=END_TIME + pd.Timedelta(days=1))
+    later = later.drop_duplicates('user_id', ignore_index=True)
+    return history.assign(ip=ips_to_uint32(history['ip'])), later.assign(ip=ips_to_uint32(later['ip']))
+
+
+def test_warm_service_scores_like_the_batch_engine(tmp_path):
+    history, events = _history_and_events()
+    service = ScoringService(alerts_path=str(tmp_path / "alerts.jsonl"))
+    service.warm_start(history)
+    results = [service.process(event) for event in replay_events(events)]
+    service.close()
+
+    combined = pd.concat([history, events], ignore_index=True)
+    expected = score_batch(combined, baselines=BaselineStore.build(history).modes_frame()).iloc[len(history):]
+    expected = expected.sort_values('timestamp', kind='stable')
+    np.testing.assert_allclose([r['anomaly_score'] for r in results], expected['anomaly_score'])
+    assert [r['anomaly_reason'] for r in results] == expected['anomaly_reason'].tolist()
+
+    alerts = [json.loads(line) for line in open(tmp_path / "alerts.jsonl")]
+    assert len(alerts) == service.alerted == int((expected['anomaly_score'] > RISK_MEDIUM).sum())
+    assert all(alert['anomaly_score'] > RISK_MEDIUM for alert in alerts)
+
+
+def test_consumer_skips_bad_events_and_keeps_going():
+    _, events = _history_and_events()
+    good = [
+        json.dumps({**row, 'ip': int(row['ip']), 'timestamp': row['timestamp'].isoformat()})
+        for row in events.iloc[:3].to_dict("records")
+    ]
+    missing_city = json.loads(good[0])
+    del missing_city['city']
+    service = ScoringService(alerts_path=None)
+
+    async def run():
+        queue = asyncio.Queue()
+        for event in [good[0], "not json", missing_city, good[1], {'user_id': "U0001"}, good[2], None]:
+            queue.put_nowait(event)
+        await service.consume(queue)
+
+    asyncio.run(run())
+    assert (service.processed, service.rejected) == (3, 3)
+
+
+def test_latency_samples_stay_bounded(monkeypatch):
+    monkeypatch.setattr(scoring_service, "LATENCY_SAMPLES", 8)
+    history, _ = _history_and_events()
+    service = ScoringService(alerts_path=None)
+    for event in replay_events(history.iloc[:20]):
+        service.process(event)
+
+    stats = service.stats()
+    assert len(service.latencies_ns) == 8 and (service.latencies_ns > 0).all()
+    assert stats['processed'] == 20 and stats['latency_p99_us'] >= stats['latency_p50_us'] > 0
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from scoring_utils import robust_z
+from session_paths import MIN_SESSIONS, score_paths, transition_matrix
+
+USUAL = ["dashboard > transfer", "dashboard > offers"] * 16
+ODD = "support > settings > profile > offers > settings"
+
+
+def _sessions():
+    # A, a regular user with one odd session; B, the same odd session among too few to judge
+    return pd.DataFrame({
+        'user_id': ["A"] * (len(USUAL) + 1) + ["B"] * (MIN_SESSIONS - 1),
+        'pages_visited': [*USUAL, ODD, *USUAL[:MIN_SESSIONS - 2], ODD],
+    })
+
+
+def test_only_an_odd_path_with_enough_history_is_unusual():
+    sessions = _sessions()
+    scored = score_paths(sessions)
+
+    assert scored.index.equals(sessions.index)
+    assert scored['unusual_path'].tolist() == [False] * len(USUAL) + [True] + [False] * (MIN_SESSIONS - 1)
+    odd = scored.iloc[len(USUAL)]
+    assert odd['path_length'] == 5 and odd['unlikely_step'] == "(start) → support"
+    assert odd['path_loglik'] < scored['path_loglik'].iloc[:len(USUAL)].min()
+
+
+def test_transition_matrix_rows_are_distributions():
+    matrix = transition_matrix(_sessions())
+    totals = matrix.sum(axis=1)
+
+    assert np.allclose(totals[totals > 0], 1.0)
+    assert matrix.loc["(start)", "dashboard"] > matrix.loc["(start)", "support"] > 0
+    assert matrix.loc["dashboard", "transfer"] == matrix.loc["dashboard", "offers"]
+
+
+def test_robust_z_is_per_user_and_zero_without_spread():
+    users = np.array([0, 0, 0, 0, 0, 1, 1, 1])
+    values = np.array([1.0, 2.0, 3.0, 4.0, 100.0, 5.0, 5.0, 5.0])
+    z = robust_z(users, values)
+
+    # User 0: median 3, MAD 1
+    assert np.allclose(z[:5], 0.6745 * (values[:5] - 3.0))
+    assert (z[5:] == 0).all()
@@ -0,0 +1,8 @@
+import shard_scoring
+
+
+def test_sharded_output_is_identical_to_single_process(login_store, tmp_path):
+    sharded, single = tmp_path / "sharded.parquet", tmp_path / "single.parquet"
+    rows = shard_scoring.run(shards=4, workers=2, output=str(sharded), log=lambda message: None)
+    assert rows == shard_scoring.run_single(output=str(single))
+    assert sharded.read_bytes() == single.read_bytes()
@@ -0,0 +1,55 @@
+import os
+
+import pandas as pd
+import pytest
+
+import log_store
+from conftest import END_TIME, make_logins
+from log_store import TABLES, append_table, load_table
+from snapshot import KEEP_SNAPSHOTS, current_version, manifest, publish, read_table, snapshot_path, snapshot_root
+from synthetic_generator import generate_all
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_store, "STORE_DIR", str(tmp_path / "store"))
+    generate_all(400, 20, chunk_size=200)
+
+
+def _inode(version, table):
+    return os.stat(os.path.join(snapshot_path(version), f"{table}.arrow")).st_ino
+
+
+def test_snapshot_reads_back_the_store(store):
+    version = publish()
+    assert current_version() == version
+    for table in TABLES:
+        df = read_table(table, version)
+        assert manifest(version)[table]["rows"] == len(df)
+        pd.testing.assert_frame_equal(df, load_table(table), check_categorical=False)
+    # Memory-mapped: numeric columns are read-only views, not copies
+    assert not read_table("login", version)['lat'].to_numpy().flags.writeable
+
+
+def test_publish_carries_unchanged_tables_over(store):
+    first = publish()
+    assert publish() == first
+
+    append_table(make_logins(30, 5, seed=1, end_time=END_TIME + pd.Timedelta(days=400)), "login")
+    second = publish()
+    assert second != first and current_version() == second
+    assert manifest(second)["login"]["rows"] == manifest(first)["login"]["rows"] + 30
+    assert _inode(second, "login") != _inode(first, "login")
+    for table in TABLES[1:]:
+        assert manifest(second)[table] == manifest(first)[table]
+        assert _inode(second, table) == _inode(first, table)
+
+
+def test_old_snapshots_are_pruned(store):
+    versions = [publish()]
+    for i in range(KEEP_SNAPSHOTS + 1):
+        append_table(make_logins(5, 2, seed=i, end_time=END_TIME + pd.Timedelta(days=400 + i)), "login")
+        versions.append(publish())
+
+    kept = sorted(entry.name for entry in os.scandir(snapshot_root()) if entry.is_dir())
+    assert versions[-1] in kept and len(kept) == KEEP_SNAPSHOTS
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import sync_pipeline
+from anomaly_scoring import score_batch
+from baseline_store import BaselineStore
+from behavior_model import BehaviorModel
+from conftest import make_logins
+from linkage_index import LinkageIndex
+from log_store import load_table, table_version
+from risk_aggregates import RiskAggregates
+
+
+def _saved_state():
+    history = load_table("login")
+    version = table_version("login")
+    baselines = BaselineStore.build(history)
+    states = {
+        'baselines': baselines,
+        'aggregates': RiskAggregates.build(score_batch(history, baselines=baselines.modes_frame())),
+        'linkage': LinkageIndex.build(history),
+        'model': BehaviorModel.build(history),
+    }
+    for state in states.values():
+        state.version = version
+        state.save()
+    return states
+
+
+def _loaded_state():
+    return {
+        'baselines': BaselineStore.load(), 'aggregates': RiskAggregates.load(),
+        'linkage': LinkageIndex.load(), 'model': BehaviorModel.load(),
+    }
+
+
+def _assert_state_matches_a_rebuild(states):
+    expected = _saved_state()
+    for state in states.values():
+        assert state.version == table_version("login")
+    pd.testing.assert_frame_equal(states['baselines'].modes_frame().sort_index(), expected['baselines'].modes_frame().sort_index())
+    pd.testing.assert_frame_equal(states['aggregates'].daily.reset_index(drop=True), expected['aggregates'].daily)
+    pairs = ['kind', 'key', 'user_id']
+    pd.testing.assert_frame_equal(
+        states['linkage'].pairs().sort_values(pairs, ignore_index=True), expected['linkage'].pairs().sort_values(pairs, ignore_index=True),
+    )
+    logins = load_table("login")
+    np.testing.assert_allclose(states['model'].score(logins)[0], expected['model'].score(logins)[0])
+
+
+@pytest.fixture
+def upload(login_store, tmp_path):
+    # Later logins for existing and new users, five rows already in the store and three invalid ones
+    later = make_logins(200, 50, seed=11, span_days=2, end_time=pd.Timestamp("2025-02-02", tz="UTC"))
+    stored = make_logins(3000, 40, seed=7).iloc[:5]
+    rows = pd.concat([later, stored, later.iloc[:3].assign(lat=120.0)], ignore_index=True)
+    path = tmp_path / "upload.csv"
+    rows.to_csv(path, index=False)
+    return str(path)
+
+
+def test_sync_twice_is_idempotent(upload):
+    _saved_state()
+    first = sync_pipeline.sync_logins(upload, **_loaded_state())
+    version = table_version("login")
+    rows = len(load_table("login"))
+
+    second = sync_pipeline.sync_logins(upload, **_loaded_state())
+
+    assert first['added'] == 200 and first['duplicates'] == 5 and first['rejected'] == 3 and first['rebuilt'] == []
+    assert second['added'] == 0 and second['duplicates'] == 205 and second['rebuilt'] == []
+    assert table_version("login") == version and len(load_table("login")) == rows == 3000 + 200
+    _assert_state_matches_a_rebuild(_loaded_state())
+
+
+def test_retry_after_a_failed_sync_catches_up(upload, monkeypatch):
+    _saved_state()
+
+    def fail(users, baselines):
+        raise RuntimeError("rescoring failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(sync_pipeline, "rescore_users", fail)
+        with pytest.raises(RuntimeError):
+            sync_pipeline.sync_logins(upload, **_loaded_state())
+    # The rows are stored, the rollup and the model are not
+    assert len(load_table("login")) == 3200
+    assert RiskAggregates.load().version != table_version("login")
+
+    retry = sync_pipeline.sync_logins(upload, **_loaded_state())
+
+    assert retry['added'] == 0 and retry['duplicates'] == 205
+    assert sorted(retry['rebuilt']) == ['aggregates', 'model']
+    _assert_state_matches_a_rebuild(_loaded_state())
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from transaction_risk import WINDOWS, window_stats
+
+
+@pytest.mark.parametrize("window", list(WINDOWS.values()))
+def test_window_stats_matches_brute_force(window):
+    rng = np.random.default_rng(3)
+    n = 600
+    users = rng.integers(0, 6, n)
+    # A two-day span in coarse steps, so there are exact-boundary gaps and equal timestamps
+    seconds = 1_700_000_000 + rng.integers(0, 48 * 60, n) * 60
+    order = np.lexsort((seconds, users))
+    users, seconds = users[order], seconds[order]
+    amounts = rng.gamma(2.0, 500.0, n)
+
+    counts, sums = window_stats(users, seconds, amounts, window)
+
+    width = window.total_seconds()
+    expected_counts = np.zeros(n, dtype=np.int64)
+    expected_sums = np.zeros(n)
+    for i in range(n):
+        # This row and the same user's earlier rows within (t - window, t]
+        for j in range(i + 1):
+            if users[j] == users[i] and seconds[j] > seconds[i] - width:
+                expected_counts[i] += 1
+                expected_sums[i] += amounts[j]
+
+    np.testing.assert_array_equal(counts, expected_counts)
+    np.testing.assert_allclose(sums, expected_sums)
+
+
+def test_window_stats_empty():
+    counts, sums = window_stats(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), pd.Timedelta(hours=1))
+    assert len(counts) == 0 and len(sums) == 0